@@ -0,0 +1,212 @@
+"""
+模拟热点路径的基准测试
+
+在按城市、船只、商品数量和天数缩放的随机世界上测量：
+- update_prices：城市价格和质量分布更新（世界市场模式下为一次矩阵更新）
+- find_best_trade：每艘船在港口寻找最佳交易
+- route_conditions：航线状态随机变化
+- random_events：城市事件和海盗事件
+- 完整的 TradeSimulation.update，换算为每秒模拟天数
+以及完整运行时的内存峰值。结果可保存为 JSON 基线，之后用 --compare 对比并标出退化。
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench --scale small medium --output baseline.json
+    python -m benchmarks.bench --scale small medium --compare baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from src.simulation.core import TradeSimulation
+from src.simulation.trading import _destination_candidates, _find_best_trade
+from src.simulation.update import trigger_random_events
+from src.synthetic import synthetic_world
+
+# 预设规模
+SCALES = {
+    "small": dict(cities=8, ships=8, goods=15, days=90),
+    "medium": dict(cities=40, ships=80, goods=40, days=60),
+    "large": dict(cities=150, ships=400, goods=80, days=30),
+}
+
+# 运行模式 -> TradeSimulation 参数
+MODES = {
+    "dict": {},
+    "world": {"world_market": True},
+    "fleet": {"world_market": True, "fleet": True},
+    "batch": {"world_market": True, "fleet": True, "batch_trading": True},
+    "strategy": {"world_market": True, "fleet": True, "strategy": "greedy"},
+}
+
+
+def build(params: Dict, mode: str, seed: int) -> TradeSimulation:
+    """生成世界并完成船只初始化（之后即可逐日 update）"""
+    cities, ships = synthetic_world(params["cities"], params["ships"], params["goods"], seed=seed)
+    simulation = TradeSimulation(cities, ships, seed=seed, **MODES[mode])
+    simulation._sync_day()
+    simulation._init_ships()
+    return simulation
+
+
+def _median_time(fn: Callable[[], None], repeat: int) -> float:
+    """多次执行取中位数耗时（秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def measure_phases(simulation: TradeSimulation, repeat: int) -> Dict[str, float]:
+    """各热点阶段单次调用的耗时"""
+    cities = list(simulation.cities.values())
+    ships = list(simulation.ships.values())
+
+    def update_prices():
+        if simulation.market is not None:
+            simulation.market.step()
+            return
+        for city in cities:
+            city.update_prices()
+            city.update_quality_distribution()
+
+    candidates = {city.name: _destination_candidates(simulation, city) for city in cities}
+
+    def find_best_trade():
+        for i, ship in enumerate(ships):
+            city = cities[i % len(cities)]
+            _find_best_trade(simulation, ship, city, candidates[city.name])
+
+    return {
+        "update_prices": _median_time(update_prices, repeat),
+        "find_best_trade": _median_time(find_best_trade, repeat),
+        "route_conditions": _median_time(simulation.trade_map.update_route_conditions, repeat),
+        "random_events": _median_time(lambda: trigger_random_events(simulation), repeat),
+    }
+
+
+def run_case(params: Dict, mode: str, seed: int, repeat: int) -> Dict:
+    """测量一个规模和模式组合"""
+    days = params["days"]
+    rates = []
+    for _ in range(repeat):
+        simulation = build(params, mode, seed)
+        start = time.perf_counter()
+        for _ in range(days):
+            simulation.update()
+        rates.append(days / (time.perf_counter() - start))
+    phases = measure_phases(simulation, repeat)
+
+    # 内存峰值单独测量（tracemalloc 会拖慢运行，不与计时混在一起）
+    tracemalloc.start()
+    simulation = build(params, mode, seed)
+    for _ in range(days):
+        simulation.update()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "params": dict(params, mode=mode, seed=seed),
+        "days_per_sec": statistics.median(rates),
+        "phases": phases,
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    与基线对比，返回退化说明
+    每秒天数下降、阶段耗时或内存峰值上升超过 threshold（比例）记为退化
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        checks = [("days_per_sec", result["days_per_sec"], base["days_per_sec"], False),
+                  ("peak_memory_mb", result["peak_memory_mb"], base["peak_memory_mb"], True)]
+        checks += [(f"phases.{phase}", value, base["phases"][phase], True)
+                   for phase, value in result["phases"].items() if phase in base["phases"]]
+        for metric, value, reference, lower_is_better in checks:
+            if reference <= 0:
+                continue
+            change = value / reference - 1
+            worse = change > threshold if lower_is_better else change < -threshold
+            if worse:
+                regressions.append(f"{name} {metric}: {reference:.6g} -> {value:.6g} ({change:+.1%})")
+    return regressions
+
+
+def _print_result(name: str, result: Dict):
+    phases = "  ".join(f"{phase}={seconds * 1000:.2f}ms" for phase, seconds in result["phases"].items())
+    print(f"{name:16} {result['days_per_sec']:10.1f} 天/秒  峰值 {result['peak_memory_mb']:8.1f}MB  {phases}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="TradeWinds 基准测试")
+    parser.add_argument("--scale", nargs="+", choices=sorted(SCALES), default=["small", "medium"],
+                        help="预设规模（可多选）")
+    parser.add_argument("--mode", nargs="+", choices=sorted(MODES), default=["dict"], help="运行模式（可多选）")
+    parser.add_argument("--cities", type=int, help="自定义规模：城市数（与 --ships、--goods、--days 一起使用）")
+    parser.add_argument("--ships", type=int, help="自定义规模：船只数")
+    parser.add_argument("--goods", type=int, help="自定义规模：商品数")
+    parser.add_argument("--days", type=int, help="自定义规模：天数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取中位数")
+    parser.add_argument("--seed", type=int, default=0, help="生成世界和模拟的随机种子")
+    parser.add_argument("--output", help="把结果保存为 JSON 基线文件")
+    parser.add_argument("--compare", help="与该 JSON 基线对比")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定退化的变化比例（默认0.10）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    scales = {name: SCALES[name] for name in args.scale}
+    custom = (args.cities, args.ships, args.goods, args.days)
+    if any(value is not None for value in custom):
+        defaults = SCALES["small"]
+        scales = {"custom": dict(cities=args.cities or defaults["cities"], ships=args.ships or defaults["ships"],
+                                 goods=args.goods or defaults["goods"], days=args.days or defaults["days"])}
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    for scale, params in scales.items():
+        for mode in args.mode:
+            name = f"{scale}/{mode}"
+            report["results"][name] = result = run_case(params, mode, args.seed, args.repeat)
+            _print_result(name, result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项退化（阈值 {args.threshold:.0%}）:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n与基线相比没有超过 {args.threshold:.0%} 的退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,108 +1,69 @@
-import random
-import matplotlib.pyplot as plt
-import matplotlib as mpl
+import argparse
+import json
 import os
+import random
+import sys
+from functools import partial
 
-from src.city import City
-from src.ship import Ship
+from src.scenario import DEFAULT_CACHE_DIR, load_scenario
 from src.simulation import TradeSimulation
+from src.simulation.strategy import STRATEGIES
+# 实时服务（asyncio）、性能分析和输出目标只在用到时导入，不拖慢普通运行的启动
 
-# 配置matplotlib支持中文显示
-plt.rcParams['font.sans-serif'] = ['SimHei']  # 用来正常显示中文标签
-plt.rcParams['axes.unicode_minus'] = False    # 用来正常显示负号
 
-# 示例使用
-if __name__ == "__main__":
-    # 创建输出目录（如果不存在）
-    os.makedirs("outputs/images", exist_ok=True)
-    
-    # 定义商品
-    goods = [
-        "香料", "丝绸", "宝石", "铁矿", "粮食", 
-        "瓷器", "茶叶", "香木", "药材", "珍珠",
-        "玉石", "琥珀", "香水", "葡萄酒", "羊毛"
-    ]
-    
-    # 城市特产描述
-    city_specialties = {
-        "里斯本": ["葡萄酒", "羊毛", "铁矿"],
-        "威尼斯": ["丝绸", "香水", "玻璃制品"],
-        "君士坦丁堡": ["香料", "丝绸", "瓷器"],
-        "亚历山大": ["香料", "药材", "宝石"],
-        "热那亚": ["葡萄酒", "丝绸", "铁矿"],
-        "巴塞罗那": ["葡萄酒", "香水", "羊毛"],
-        "亚丁": ["香料", "香木", "珍珠"]
-    }
-    
-    # 创建城市
-    cities = [
-        City("里斯本", 
-             {"香料": 50, "丝绸": 100, "宝石": 500, "铁矿": 20, "粮食": 5,
-              "瓷器": 300, "茶叶": 40, "香木": 80, "药材": 150, "珍珠": 400,
-              "玉石": 450, "琥珀": 200, "香水": 120, "葡萄酒": 30, "羊毛": 15},
-             {"香料": 10, "铁矿": 50, "粮食": 200, "葡萄酒": 80, "羊毛": 100},
-             {"丝绸": 15, "宝石": 5, "铁矿": 30, "粮食": 180, "香水": 20}),
-        
-        City("威尼斯", 
-             {"香料": 60, "丝绸": 80, "宝石": 450, "铁矿": 30, "粮食": 8,
-              "瓷器": 350, "茶叶": 35, "香木": 70, "药材": 160, "珍珠": 450,
-              "玉石": 500, "琥珀": 220, "香水": 100, "葡萄酒": 25, "羊毛": 20},
-             {"丝绸": 20, "宝石": 8, "香水": 25, "葡萄酒": 90},
-             {"香料": 12, "丝绸": 18, "宝石": 10, "铁矿": 25, "粮食": 150, "香木": 15}),
-        
-        City("君士坦丁堡", 
-             {"香料": 40, "丝绸": 120, "宝石": 400, "铁矿": 25, "粮食": 6,
-              "瓷器": 400, "茶叶": 45, "香木": 60, "药材": 140, "珍珠": 420,
-              "玉石": 480, "琥珀": 180, "香水": 110, "葡萄酒": 35, "羊毛": 18},
-             {"香料": 15, "丝绸": 15, "粮食": 180, "茶叶": 30, "药材": 25},
-             {"香料": 8, "丝绸": 20, "宝石": 7, "铁矿": 40, "粮食": 200, "珍珠": 10}),
-             
-        City("亚历山大", 
-             {"香料": 45, "丝绸": 110, "宝石": 420, "铁矿": 28, "粮食": 7,
-              "瓷器": 380, "茶叶": 50, "香木": 75, "药材": 130, "珍珠": 380,
-              "玉石": 470, "琥珀": 190, "香水": 95, "葡萄酒": 40, "羊毛": 22},
-             {"香料": 20, "药材": 30, "香水": 30},
-             {"丝绸": 25, "宝石": 12, "铁矿": 35, "粮食": 170, "琥珀": 15}),
-             
-        City("热那亚", 
-             {"香料": 55, "丝绸": 90, "宝石": 480, "铁矿": 22, "粮食": 9,
-              "瓷器": 320, "茶叶": 38, "香木": 85, "药材": 145, "珍珠": 430,
-              "玉石": 460, "琥珀": 210, "香水": 105, "葡萄酒": 20, "羊毛": 16},
-             {"葡萄酒": 70, "羊毛": 90, "铁矿": 45},
-             {"香料": 14, "丝绸": 22, "宝石": 9, "铁矿": 20, "瓷器": 15}),
-             
-        City("巴塞罗那", 
-             {"香料": 58, "丝绸": 95, "宝石": 460, "铁矿": 26, "粮食": 10,
-              "瓷器": 360, "茶叶": 42, "香木": 78, "药材": 155, "珍珠": 410,
-              "玉石": 490, "琥珀": 205, "香水": 115, "葡萄酒": 28, "羊毛": 12},
-             {"葡萄酒": 85, "香水": 35},
-             {"香料": 16, "丝绸": 17, "宝石": 8, "粮食": 160, "香木": 18, "羊毛": 80}),
-             
-        City("亚丁", 
-             {"香料": 35, "丝绸": 130, "宝石": 390, "铁矿": 32, "粮食": 12,
-              "瓷器": 370, "茶叶": 32, "香木": 90, "药材": 125, "珍珠": 440,
-              "玉石": 510, "琥珀": 195, "香水": 125, "葡萄酒": 45, "羊毛": 25},
-             {"香料": 25, "香木": 35, "珍珠": 15},
-             {"茶叶": 20, "宝石": 6, "粮食": 190, "瓷器": 18, "药材": 28}),
-    ]
-    
-    # 设置各城市特产
-    for city in cities:
-        if city.name in city_specialties:
-            # 强制设置城市特产
-            city.specialty_goods = set(city_specialties[city.name])
-    
-    # 创建船只
-    ships = [
-        Ship("海蛇号", capacity=100, speed=3),
-        Ship("海狮号", capacity=150, speed=2),
-        Ship("黄金鹿号", capacity=120, speed=4),
-        Ship("北极星号", capacity=200, speed=2),
-        Ship("龙骑士号", capacity=180, speed=3),
-        Ship("风暴使者号", capacity=130, speed=5),
-        Ship("宝藏号", capacity=250, speed=1),
-    ]
-    
+# 内置场景所在目录，--scenario 可以是其中的场景名或任意场景文件路径
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+
+
+def scenario_path(name: str) -> str:
+    """场景名或路径对应的场景文件"""
+    if os.path.exists(name):
+        return name
+    for extension in (".toml", ".json"):
+        path = os.path.join(SCENARIO_DIR, name + extension)
+        if os.path.exists(path):
+            return path
+    raise SystemExit(f"找不到场景: {name}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="TradeWinds 中世纪地中海贸易模拟")
+    parser.add_argument("--scenario", default="mediterranean",
+                        help="场景名（scenarios 目录中的文件）或 JSON/TOML 场景文件路径")
+    parser.add_argument("--no-scenario-cache", action="store_true", help="不使用编译后的场景缓存")
+    parser.add_argument("--days", type=int, default=365, help="模拟天数（默认365）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，设置后结果可复现")
+    parser.add_argument("--event-driven", action="store_true", help="使用离散事件调度器运行")
+    parser.add_argument("--world-market", action="store_true", help="所有城市使用一个世界市场矩阵")
+    parser.add_argument("--fleet", action="store_true", help="船只状态使用船队数组")
+    parser.add_argument("--batch-trading", action="store_true",
+                        help="集中交易：同一港口当天的买单一次撮合，库存不足时按需求等比例分配")
+    parser.add_argument("--cargo-planner", action="store_true",
+                        help="多商品装货规划：在资金和舱位限制下选出利润最高的目的地和整船货物")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default=None,
+                        help="批量交易策略：每天停靠的船只一次决策（greedy 与默认规则相同）")
+    parser.add_argument("--no-plots", action="store_true", help="不绘制图表（不导入 matplotlib）")
+    parser.add_argument("--output-dir", default="outputs/images", help="图表保存目录")
+    parser.add_argument("--output-format", choices=("png", "svg", "pdf"), default="png", help="图表文件格式")
+    parser.add_argument("--plot-workers", type=int, default=None, help="绘图进程数，默认CPU核数，0表示不使用进程池")
+    parser.add_argument("--force-plots", action="store_true", help="忽略缓存，重新绘制全部图表")
+    parser.add_argument("--report", choices=("text", "json", "none"), default="text",
+                        help="结果输出方式：文本报告、JSON 摘要或不输出")
+    parser.add_argument("--stream", action="append", default=[], metavar="FORMAT:PATH",
+                        help="运行过程中把每天的价格、库存、船只位置和资金写出，格式为 jsonl/csv/npy，可重复使用，"
+                             "例如 --stream jsonl:run.jsonl --stream npy:outputs/chunks")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="实时服务：边运行边向 SSE（/events）和 WebSocket（/ws）客户端推送每天的增量")
+    parser.add_argument("--tick", type=float, default=0.0,
+                        help="实时服务中每个模拟日至少间隔的秒数（默认0，尽快运行）")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="性能分析：记录各阶段耗时和调用次数，并把 cProfile 结果和火焰图折叠栈写到该目录")
+    return parser.parse_args(argv)
+
+
+def print_setup(cities, ships):
+    """打印船只质量偏好和城市特产"""
     # 打印船只质量偏好
     print("====== 船只质量偏好 ======")
     for ship in ships:
@@ -113,11 +74,10 @@ if __name__ == "__main__":
     for city in cities:
         specialty_list = list(city.specialty_goods)
         print(f"{city.name}: {', '.join(specialty_list)}")
-    
-    # 创建并运行模拟
-    simulation = TradeSimulation(cities, ships)
-    simulation.run_simulation(days=365)  # 模拟一年
-    
+
+
+def print_report(simulation, goods):
+    """打印事件日志、货币系统信息和商品质量分布"""
     # 打印事件日志
     print("\n====== 模拟期间发生的随机事件 ======")
     simulation.print_event_log()
@@ -153,7 +113,7 @@ if __name__ == "__main__":
     
     # 打印商品质量分布
     print("\n====== 商品质量分布 ======")
-    for city in cities:
+    for city in simulation.cities.values():
         print(f"\n{city.name}:")
         for good in goods:
             qualities = city.get_available_qualities(good)
@@ -162,49 +122,114 @@ if __name__ == "__main__":
                 for quality, amount in qualities.items():
                     print(f"{quality}({amount:.1f}) ", end="")
                 print()
-    
-    # 绘制结果
-    print("\n========== 绘制模拟结果 ==========")
-
-    # 为多个城市绘制价格历史
-    key_cities = ["里斯本", "威尼斯", "君士坦丁堡", "亚历山大", "热那亚"]
-    for city_name in key_cities:
-        if city_name in simulation.cities:
-            simulation.plot_city_prices(city_name)
-            plt.tight_layout()
-            plt.savefig(f"outputs/images/city_prices_{city_name}.png")
-            plt.close()
-            print(f"- 已保存{city_name}的价格历史图表")
-
-    # 为所有船只绘制资金历史
-    for ship_name in simulation.ships:
-        simulation.plot_ship_gold(ship_name)
-        plt.tight_layout()
-        plt.savefig(f"outputs/images/ship_gold_{ship_name}.png")
-        plt.close()
-        print(f"- 已保存{ship_name}的资金历史图表")
-
-    # 绘制贸易地图
-    simulation.plot_map()
-    plt.tight_layout()
-    plt.savefig("outputs/images/trade_map.png")
-    plt.close()
-    print("- 已保存贸易地图")
-
-    # 绘制货币系统历史数据
-    simulation.plot_currency_history()
-    plt.tight_layout()
-    plt.savefig("outputs/images/currency_supply.png")
-    plt.close()
-    plt.tight_layout()
-    plt.savefig("outputs/images/global_inflation.png") 
-    plt.close()
-    plt.tight_layout()
-    plt.savefig("outputs/images/city_currency_values.png")
-    plt.close()
-    print("- 已保存货币系统相关图表")
-
-    print("\n所有图表已保存到 outputs/images 目录。")
-
-    # 显示所有图表（可选）
-    # plt.show() 
\ No newline at end of file
+
+
+def summary(simulation) -> dict:
+    """模拟结果摘要，用于 JSON 输出"""
+    return {
+        "day": simulation.day,
+        "currency_supply": float(simulation.currency_supply),
+        "global_inflation_rate": float(simulation.global_inflation_rate),
+        "events": len(simulation.event_log),
+        "cities": {
+            name: {
+                "inflation_rate": float(city.inflation_rate),
+                "currency_value": float(city.currency_value),
+                "prices": {good: float(price) for good, price in city.current_prices.items()},
+            }
+            for name, city in simulation.cities.items()
+        },
+        "ships": {
+            name: {"gold": float(ship.gold), "location": ship.current_city.name if ship.current_city else None}
+            for name, ship in simulation.ships.items()
+        },
+    }
+
+
+# 默认绘制价格历史的城市（场景中没有这些城市时绘制全部城市）
+KEY_CITIES = ["里斯本", "威尼斯", "君士坦丁堡", "亚历山大", "热那亚"]
+
+
+def save_plots(simulation, output_dir: str, image_format: str = "png", verbose: bool = True,
+               workers: int = None, use_cache: bool = True):
+    """绘制并保存全部图表：在进程池中并行绘制，数据未变化的图表跳过"""
+    from src.simulation.rendering import chart_jobs, render_charts
+
+    log = print if verbose else (lambda *args, **kwargs: None)
+    key_cities = [name for name in KEY_CITIES if name in simulation.cities] or list(simulation.cities)
+    jobs = chart_jobs(simulation, cities=key_cities)
+    rendered = render_charts(jobs, output_dir, image_format, workers=workers, use_cache=use_cache)
+
+    labels = {"city_prices": "{}的价格历史图表", "ship_gold": "{}的资金历史图表", "trade_map": "贸易地图",
+              "currency_supply": "货币供应量图表", "global_inflation": "全局通货膨胀率图表",
+              "city_currency_values": "各城市货币价值图表"}
+    for job in jobs:
+        subject = job.data.get("city_name") or job.data.get("ship_name")
+        status = "已保存" if rendered[job.name] else "数据未变化，跳过"
+        log(f"- {status}{labels[job.kind].format(subject)}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    scenario = load_scenario(scenario_path(args.scenario),
+                             cache_dir=None if args.no_scenario_cache else DEFAULT_CACHE_DIR)
+    goods = scenario.goods
+    cities, ships = scenario.build()
+    text = args.report == "text"
+    if text:
+        print_setup(cities, ships)
+
+    # 创建并运行模拟
+    simulation = TradeSimulation(cities, ships, trade_map=scenario.trade_map(), events=scenario.events(),
+                                 world_market=args.world_market, fleet=args.fleet, seed=args.seed,
+                                 batch_trading=args.batch_trading, cargo_planner=args.cargo_planner,
+                                 strategy=args.strategy)
+    sinks = []
+    if args.stream:
+        from src.simulation.streaming import make_sink
+        try:
+            sinks = [make_sink(spec) for spec in args.stream]
+        except ValueError as error:
+            raise SystemExit(str(error))
+    run = partial(simulation.run_simulation, days=args.days, event_driven=args.event_driven, sinks=sinks)
+    if args.serve:
+        if sinks:
+            raise SystemExit("--serve 不能与 --stream 同时使用")
+        if args.profile:
+            # 实时服务在工作线程中推进模拟，cProfile 只能看到主线程的事件循环
+            raise SystemExit("--serve 不能与 --profile 同时使用")
+        host, _, port = args.serve.rpartition(":")
+        if not port.isdigit():
+            raise SystemExit(f"无法识别的服务地址 {args.serve!r}，格式应为 [HOST:]PORT")
+        from src.simulation.server import run_server
+        run = partial(run_server, simulation, args.days, host=host or "127.0.0.1", port=int(port), tick=args.tick,
+                      event_driven=args.event_driven,
+                      on_ready=lambda address: print(f"实时服务：http://{address[0]}:{address[1]}/events 或 "
+                                                     f"ws://{address[0]}:{address[1]}/ws", file=sys.stderr))
+    if args.profile:
+        from src.simulation.profiling import profile_run
+        profiler = profile_run(run, args.profile, simulation)
+        if args.report != "none":
+            print(profiler.format_report(), file=sys.stderr)
+    else:
+        run()
+
+    if text:
+        print_report(simulation, goods)
+    elif args.report == "json":
+        json.dump(summary(simulation), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+    if not args.no_plots:
+        if text:
+            print("\n========== 绘制模拟结果 ==========")
+        save_plots(simulation, args.output_dir, args.output_format, verbose=text,
+                   workers=args.plot_workers, use_cache=not args.force_plots)
+        if text:
+            print(f"\n所有图表已保存到 {args.output_dir} 目录。")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 import random
-from typing import Dict, Tuple
+from typing import Dict, Set, Tuple
 from collections import defaultdict
+from functools import partial
 import numpy as np
 
+from .history import DEFAULT_HISTORY_DAYS, RingBuffer
+from .market import CityMarket, HistoryView
+from .rng import CITY_INFLATION, CITY_CURRENCY, CITY_JITTER, roll_uniform, uniform
+
 # 商品质量等级常量
 QUALITY_LEVELS = {
     "粗糙": 0.7,   # 价格降低30%
@@ -12,41 +17,116 @@ QUALITY_LEVELS = {
 }
 
 class City:
-    def __init__(self, name: str, base_prices: Dict[str, float], production: Dict[str, float], consumption: Dict[str, float]):
+    def __init__(self, name: str, base_prices: Dict[str, float], production: Dict[str, float], consumption: Dict[str, float],
+                 vectorized: bool = False, history_days: int = DEFAULT_HISTORY_DAYS):
         """
         初始化一个城市
         :param name: 城市名称
         :param base_prices: 商品基础价格字典 {商品名: 基础价格}
         :param production: 商品生产量字典 {商品名: 日产量}
         :param consumption: 商品消费量字典 {商品名: 日消费量}
+        :param vectorized: 是否使用数组市场引擎（商品很多时更快）
+        :param history_days: 价格、库存、通货膨胀率和货币价值历史的保留天数
         """
         self.name = name
         self.base_prices = base_prices
-        self.current_prices = base_prices.copy()
-        # 商品质量存储 {商品名: {质量等级: 数量}}
-        self.inventory_by_quality = defaultdict(lambda: defaultdict(float))
-        # 仍然保留总库存以便于兼容现有代码
-        self.inventory = defaultdict(float)  
         self.production = production
         self.consumption = consumption
-        self.price_history = {good: [] for good in base_prices}
-        self.inventory_history = {good: [] for good in base_prices}
+        # 数组市场引擎，启用后价格和库存字典都是引擎数组的视图
+        self.market = CityMarket(base_prices, production, consumption, history_days) if vectorized else None
+        # 价格索引（由模拟设置），价格变化时需要通知
+        self.price_index = None
+        # 按日预抽的随机数流（由设置了种子的模拟设置），为None时使用全局 random
+        self.draws = None
+        
+        if self.market is None:
+            self.current_prices = base_prices.copy()
+            # 商品质量存储 {商品名: {质量等级: 数量}}
+            self.inventory_by_quality = defaultdict(partial(defaultdict, float))
+            # 仍然保留总库存以便于兼容现有代码
+            self.inventory = defaultdict(float)  
+            # 历史记录保存在环形缓冲区中，每天一行，列顺序与 base_prices 一致
+            history_index = {good: i for i, good in enumerate(base_prices)}
+            self._price_rows = RingBuffer(history_days, (len(base_prices),))
+            self._inventory_rows = RingBuffer(history_days, (len(base_prices),))
+            self.price_history = HistoryView(self._price_rows, history_index, list(base_prices))
+            self.inventory_history = HistoryView(self._inventory_rows, history_index, list(base_prices))
+            self.inflation_history = RingBuffer(history_days)  # 记录通货膨胀率历史
+            self.currency_value_history = RingBuffer(history_days)  # 货币价值历史
+            self.currency_value_history.append(1.0)
+        else:
+            self._bind_market_views()
         
         # 城市特产和擅长的商品质量
         self.specialty_goods = self._generate_specialties(list(base_prices.keys()))
         
         # 通货膨胀相关属性
         self.inflation_rate = 0.0  # 初始通货膨胀率
-        self.inflation_history = []  # 记录通货膨胀率历史
         
         # 货币价值相关属性
         self.currency_name = f"{name}币"  # 城市货币名称
         self.currency_value = 1.0  # 初始货币价值（相对于标准货币）
-        self.currency_value_history = [1.0]  # 货币价值历史
         
         # 初始化库存为7天的产量
-        for good, amount in production.items():
-            self._add_inventory_with_quality(good, amount * 7)
+        if self.market is not None:
+            self.market.produce(days=7)
+        else:
+            for good, amount in production.items():
+                self._add_inventory_with_quality(good, amount * 7)
+    
+    @property
+    def specialty_goods(self) -> Set[str]:
+        """城市特产商品"""
+        return self._specialty_goods
+    
+    @specialty_goods.setter
+    def specialty_goods(self, goods: Set[str]):
+        self._specialty_goods = goods
+        if self.market is not None:
+            self.market.set_specialties(goods)
+    
+    @property
+    def inflation_rate(self) -> float:
+        """通货膨胀率"""
+        if self.market is not None:
+            return float(self.market.inflation[0])
+        return self._inflation_rate
+    
+    @inflation_rate.setter
+    def inflation_rate(self, value: float):
+        if self.market is not None:
+            self.market.inflation[0] = value
+        else:
+            self._inflation_rate = value
+    
+    @property
+    def currency_value(self) -> float:
+        """货币价值（相对于标准货币）"""
+        if self.market is not None:
+            return float(self.market.currency[0])
+        return self._currency_value
+    
+    @currency_value.setter
+    def currency_value(self, value: float):
+        if self.market is not None:
+            self.market.currency[0] = value
+        else:
+            self._currency_value = value
+    
+    def attach_market(self, market: CityMarket):
+        """改用给定的市场引擎（例如 WorldMarket 中的一行），字典属性随之成为引擎数组的视图"""
+        self.market = market
+        self._bind_market_views()
+    
+    def _bind_market_views(self):
+        """把价格、库存和历史属性绑定为市场引擎的视图"""
+        self.current_prices = self.market.prices_view()
+        self.inventory_by_quality = self.market.stock_view()
+        self.inventory = self.market.inventory_view()
+        self.price_history = self.market.price_history_view()
+        self.inventory_history = self.market.inventory_history_view()
+        self.inflation_history = self.market.inflation_history
+        self.currency_value_history = self.market.currency_history
     
     def _generate_specialties(self, goods_list):
         """为城市生成特产商品，这些商品质量会更高"""
@@ -84,6 +164,15 @@ class City:
     
     def update(self):
         """每日更新城市经济状态"""
+        if self.market is not None:
+            self.market.update_quality_distribution()
+            self.market.update_inflation()
+            self.market.update_currency_value()
+            self.market.update_prices(inflation_rate=self.inflation_rate)
+            self.market.record_history()
+            self._prices_changed()
+            return
+            
         # 更新库存
         for good, amount in self.production.items():
             self._add_inventory_with_quality(good, amount)
@@ -98,7 +187,8 @@ class City:
         self._update_currency_value()
         
         # 根据供需关系调整价格
-        for good in self.base_prices:
+        jitter = self._price_jitter()
+        for good, price_change in zip(self.base_prices, jitter):
             # 避免除零错误，确保消费量至少为一个很小的值
             effective_consumption = self.consumption.get(good, 0.1)
             if effective_consumption <= 0:
@@ -112,7 +202,6 @@ class City:
             else:
                 supply_ratio = current_inventory / base_demand
                 
-            price_change = random.uniform(0.95, 1.05)  # 随机波动
             # S型调整函数对极低或极高的 supply_ratio 可能过于敏感，增加保护
             sigmoid_input = np.clip((supply_ratio - 1) * 2, -10, 10) # 限制输入范围
             price_adjustment = 1.0 / (1 + np.exp(-sigmoid_input)) 
@@ -121,8 +210,8 @@ class City:
             inflation_factor = 1.0 + self.inflation_rate
             
             self.current_prices[good] = max(0.1, self.base_prices[good] * price_change * price_adjustment * inflation_factor)
-            self.price_history[good].append(self.current_prices[good])
-            self.inventory_history[good].append(self.inventory.get(good, 0))
+        self._append_history()
+        self._prices_changed()
     
     def _consume_inventory(self, good: str, amount: float):
         """按质量顺序消耗库存（先消耗低质量）"""
@@ -221,8 +310,14 @@ class City:
             
     def update_prices(self):
         """每日更新商品价格"""
+        if self.market is not None:
+            self.market.update_prices()
+            self._prices_changed()
+            return
+            
         # 根据供需关系调整价格
-        for good in self.base_prices:
+        jitter = self._price_jitter()
+        for good, price_change in zip(self.base_prices, jitter):
             # 避免除零错误，确保消费量至少为一个很小的值
             effective_consumption = self.consumption.get(good, 0.1)
             if effective_consumption <= 0:
@@ -236,7 +331,6 @@ class City:
             else:
                 supply_ratio = current_inventory / base_demand
                 
-            price_change = random.uniform(0.95, 1.05)  # 随机波动
             # S型调整函数对极低或极高的 supply_ratio 可能过于敏感，增加保护
             sigmoid_input = np.clip((supply_ratio - 1) * 2, -10, 10)  # 限制输入范围
             price_adjustment = 1.0 / (1 + np.exp(-sigmoid_input)) 
@@ -246,9 +340,26 @@ class City:
             min_price = self.base_prices[good] * 0.5
             max_price = self.base_prices[good] * 2.0
             self.current_prices[good] = max(min_price, min(new_price, max_price))
+        self._prices_changed()
+    
+    def _price_jitter(self):
+        """当日各商品价格的随机波动系数（按 base_prices 顺序）"""
+        if self.draws is None:
+            return [random.uniform(0.95, 1.05) for _ in self.base_prices]
+        count = len(self.base_prices)
+        return uniform(self.draws.row()[CITY_JITTER:CITY_JITTER + count], 0.95, 1.05).tolist()
+    
+    def _prices_changed(self):
+        """整体调价后通知价格索引"""
+        if self.price_index is not None:
+            self.price_index.invalidate(self.name)
     
     def update_quality_distribution(self):
         """更新商品质量分布"""
+        if self.market is not None:
+            self.market.update_quality_distribution()
+            return
+            
         # 每日生产新商品
         for good, amount in self.production.items():
             self._add_inventory_with_quality(good, amount)
@@ -259,24 +370,38 @@ class City:
     
     def record_price_history(self):
         """记录价格历史"""
-        for good in self.base_prices:
-            self.price_history[good].append(self.current_prices[good])
-            self.inventory_history[good].append(self.inventory.get(good, 0))
+        if self.market is not None:
+            self.market.record_history()
+            return
             
-            # 保持历史记录在合理范围内
-            if len(self.price_history[good]) > 365:  # 保留一年的数据
-                self.price_history[good].pop(0)
-                self.inventory_history[good].pop(0)
+        self._append_history()
+    
+    def _append_history(self):
+        """把当日价格和库存作为一行写入环形缓冲区（超出保留天数时自动覆盖最旧的记录）"""
+        self._price_rows.append([self.current_prices[good] for good in self.base_prices])
+        self._inventory_rows.append([self.inventory.get(good, 0) for good in self.base_prices])
     
     def modify_price_multiplier(self, good: str, multiplier: float):
         """修改商品价格乘数，用于事件效果"""
         if good in self.current_prices:
-            self.current_prices[good] = self.current_prices[good] * multiplier 
+            self.current_prices[good] = self.current_prices[good] * multiplier
+            if self.price_index is not None:
+                self.price_index.update(self.name, good, self.current_prices[good])
+    
+    def update_currency(self):
+        """每日更新通货膨胀率和货币价值"""
+        if self.market is not None:
+            self.market.update_inflation()
+            self.market.update_currency_value()
+            return
+            
+        self._update_inflation()
+        self._update_currency_value()
     
     def _update_inflation(self):
         """更新城市的通货膨胀率"""
         # 基础通货膨胀变化，范围在 -0.002 到 0.005 之间
-        inflation_change = random.uniform(-0.002, 0.005)
+        inflation_change = roll_uniform(self, CITY_INFLATION, -0.002, 0.005)
         
         # 库存因素：总库存与消费需求比例影响通货膨胀
         total_inventory = sum(self.inventory.values())
@@ -292,10 +417,6 @@ class City:
         # 更新通货膨胀率，确保在合理范围内 (-0.05 到 0.1)
         self.inflation_rate = max(-0.05, min(0.1, self.inflation_rate + inflation_change))
         self.inflation_history.append(self.inflation_rate)
-        
-        # 保持历史记录在合理范围内
-        if len(self.inflation_history) > 365:  # 保留一年的数据
-            self.inflation_history.pop(0) 
     
     def _update_currency_value(self):
         """更新城市货币价值"""
@@ -316,16 +437,12 @@ class City:
             value_change += specialty_factor
         
         # 应用随机波动
-        random_factor = random.uniform(-0.002, 0.002)
+        random_factor = roll_uniform(self, CITY_CURRENCY, -0.002, 0.002)
         value_change += random_factor
         
         # 更新货币价值，确保在合理范围内（0.5-2.0）
         self.currency_value = max(0.5, min(2.0, self.currency_value * (1 + value_change)))
         self.currency_value_history.append(self.currency_value)
-        
-        # 保持历史记录在合理范围内
-        if len(self.currency_value_history) > 365:  # 保留一年的数据
-            self.currency_value_history.pop(0)
             
     def get_exchange_rate(self, other_city: 'City') -> float:
         """获取与另一个城市的货币兑换率"""
@@ -11,7 +11,6 @@ class CityEvent(RandomEvent):
         if city:
             goods_to_affect = self.affected_goods or list(city.current_prices.keys())
             for good in goods_to_affect:
-                if good in city.current_prices:
-                    city.current_prices[good] *= self.price_modifier
+                city.modify_price_multiplier(good, self.price_modifier)
             return True
         return False 
\ No newline at end of file
@@ -0,0 +1,167 @@
+import random
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .city import City
+    from .ship import Ship
+
+# 船只数值属性及其数组类型
+FLEET_FIELDS = (
+    ("gold", np.float64),
+    ("capacity", np.float64),
+    ("speed", np.float64),
+    ("days_in_transit", np.int32),
+    ("travel_time", np.float64),
+    ("in_transit", np.bool_),
+    ("sailing_skill", np.float64),
+    ("trading_skill", np.float64),
+    ("used_capacity", np.float64),
+)
+
+# 技能上限和每次提升量，与 Ship.improve_skill 一致
+MAX_SKILL = 2.0
+SKILL_STEP = 0.05
+
+
+class Fleet:
+    """
+    船队状态数组
+
+    把所有船只的资金、容量、速度、位置、目的地、航行进度、技能和已用舱位
+    保存为按船只排列的并行数组，航行推进、到港判断和技能提升各是一次数组运算。
+    Ship 对象加入船队后，这些属性都读写船队数组中自己的那一格。
+    """
+
+    def __init__(self, ships: List['Ship'], cities: List['City'], rng: Optional[np.random.Generator] = None):
+        """
+        :param ships: 船只列表，按顺序对应数组下标，当前状态会被迁移到数组中
+        :param cities: 城市列表，位置和目的地保存为其中的下标（-1表示无）
+        :param rng: 技能提升使用的随机数生成器，默认由全局 random 派生种子
+        """
+        self.ships = list(ships)
+        self.cities = list(cities)
+        self.city_index: Dict[str, int] = {city.name: i for i, city in enumerate(self.cities)}
+        self.rng = rng or np.random.default_rng(random.getrandbits(64))
+
+        n = len(self.ships)
+        for name, dtype in FLEET_FIELDS:
+            setattr(self, name, np.zeros(n, dtype=dtype))
+        self.location = np.full(n, -1, dtype=np.int32)
+        self.destination = np.full(n, -1, dtype=np.int32)
+
+        for slot, ship in enumerate(self.ships):
+            ship.attach_fleet(self, slot)
+
+    def __len__(self) -> int:
+        return len(self.ships)
+
+    # ---- 城市编号 ----
+
+    def city_id(self, city) -> int:
+        """城市对象或城市名对应的下标，未知城市追加到末尾"""
+        if city is None:
+            return -1
+        name = city if isinstance(city, str) else city.name
+        row = self.city_index.get(name)
+        if row is None:
+            if isinstance(city, str):
+                raise KeyError(f"未知城市: {city}")
+            row = self.city_index[name] = len(self.cities)
+            self.cities.append(city)
+        return row
+
+    def city(self, row: int) -> Optional['City']:
+        return self.cities[row] if row >= 0 else None
+
+    # ---- 批量推进 ----
+
+    def docked(self) -> np.ndarray:
+        """停靠在港口（有所在城市且不在航行中）的船只下标"""
+        return np.flatnonzero(~self.in_transit & (self.location >= 0))
+
+    def advance_transit(self) -> np.ndarray:
+        """
+        所有航行中的船只前进一天，到港的船只移到目的地
+        :return: 今天到港的船只下标
+        """
+        moving = self.in_transit
+        self.days_in_transit += moving
+        arrived = np.flatnonzero(moving & (self.days_in_transit >= self.travel_time))
+        self.location[arrived] = self.destination[arrived]
+        self.destination[arrived] = -1
+        self.days_in_transit[arrived] = 0
+        self.travel_time[arrived] = 0
+        self.in_transit[arrived] = False
+        return arrived
+
+    def roll_skill_ups(self, rows: np.ndarray, chance: float = 0.1,
+                       rolls: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        给到港船只随机提升技能：每艘以 chance 的概率提升，航海和贸易各占一半
+        :param rolls: 各船预抽的 (是否提升, 提升哪项) 均匀随机数 (len(rows), 2)，默认用 rng 抽样
+        :return: (提升航海技能的下标, 提升贸易技能的下标)
+        """
+        if rolls is None:
+            lucky = rows[self.rng.random(len(rows)) < chance]
+            sailing = self.rng.random(len(lucky)) < 0.5
+        else:
+            hit = rolls[:, 0] < chance
+            lucky = rows[hit]
+            sailing = rolls[hit, 1] < 0.5
+        sailing_rows = lucky[sailing]
+        trading_rows = lucky[~sailing]
+        self.sailing_skill[sailing_rows] = np.minimum(MAX_SKILL, self.sailing_skill[sailing_rows] + SKILL_STEP)
+        self.trading_skill[trading_rows] = np.minimum(MAX_SKILL, self.trading_skill[trading_rows] + SKILL_STEP)
+        return sailing_rows, trading_rows
+
+
+class FleetField:
+    """
+    Ship 上的数值属性：未加入船队时保存在实例字典中，加入后读写船队数组
+    """
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        self.private = "_" + name
+
+    def __get__(self, ship, owner=None):
+        if ship is None:
+            return self
+        fleet = ship.fleet
+        if fleet is None:
+            return ship.__dict__[self.private]
+        return getattr(fleet, self.name)[ship.slot].item()
+
+    def __set__(self, ship, value):
+        fleet = ship.fleet
+        if fleet is None:
+            ship.__dict__[self.private] = value
+        else:
+            getattr(fleet, self.name)[ship.slot] = value
+
+
+class FleetCityField:
+    """Ship 上的城市属性（所在城市、目的地），加入船队后保存为城市下标"""
+
+    def __init__(self, array_name: str):
+        self.array_name = array_name
+
+    def __set_name__(self, owner, name: str):
+        self.private = "_" + name
+
+    def __get__(self, ship, owner=None):
+        if ship is None:
+            return self
+        fleet = ship.fleet
+        if fleet is None:
+            return ship.__dict__[self.private]
+        return fleet.city(int(getattr(fleet, self.array_name)[ship.slot]))
+
+    def __set__(self, ship, city):
+        fleet = ship.fleet
+        if fleet is None:
+            ship.__dict__[self.private] = city
+        else:
+            getattr(fleet, self.array_name)[ship.slot] = fleet.city_id(city)
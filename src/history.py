@@ -0,0 +1,78 @@
+from typing import Tuple
+
+import numpy as np
+
+# 默认保留一年的历史数据
+DEFAULT_HISTORY_DAYS = 365
+
+
+class RingBuffer:
+    """
+    固定容量的环形历史缓冲区
+
+    预先分配两倍容量的数组，每条记录同时写入 i 和 i+capacity 两个位置，
+    这样按时间顺序的历史总是一段连续内存，view() 无需复制即可返回。
+    追加是 O(1)，超出容量时自动覆盖最旧的记录。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_HISTORY_DAYS, shape: Tuple[int, ...] = (), dtype=float):
+        """
+        :param capacity: 最多保留的记录条数
+        :param shape: 每条记录的形状，()表示标量
+        :param dtype: 数据类型
+        """
+        if capacity <= 0:
+            raise ValueError("历史容量必须为正数")
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity,) + tuple(shape), dtype=dtype)
+        self._next = 0   # 下一条记录写入的位置
+        self._count = 0  # 当前记录条数
+
+    def append(self, value):
+        """追加一条记录"""
+        self._data[self._next] = value
+        self._data[self._next + self.capacity] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def view(self) -> np.ndarray:
+        """按时间顺序（从旧到新）的只读视图，不复制数据"""
+        start = (self._next - self._count) % self.capacity
+        view = self._data[start:start + self._count]
+        view.flags.writeable = False
+        return view
+
+    def get_state(self) -> Tuple[np.ndarray, int, int]:
+        """(底层数组, 下一条写入位置, 记录条数)，用于保存检查点"""
+        return self._data, self._next, self._count
+
+    def set_state(self, data: np.ndarray, next_index: int, count: int):
+        """恢复 get_state 的结果，data 直接作为底层数组（不复制）"""
+        self._data = data
+        self.capacity = len(data) // 2
+        self._next = next_index
+        self._count = count
+
+    def clear(self):
+        """清空全部记录"""
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        return self.view()[i]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __array__(self, dtype=None, copy=None):
+        view = self.view()
+        if dtype is not None or copy:
+            return np.array(view, dtype=dtype)
+        return view
+
+    def __repr__(self) -> str:
+        return f"RingBuffer({self._count}/{self.capacity})"
@@ -0,0 +1,290 @@
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .market import QUALITY_ORDER, QUALITY_INDEX
+
+# 记录类型
+KIND_BUY = 0
+KIND_SELL = 1
+KIND_ROUTE = 2
+KIND_GOLD = 3
+KIND_NAMES = ("buy", "sell", "route", "gold")
+
+# 列名和类型
+COLUMNS = (
+    ("day", np.int32),
+    ("ship", np.int32),
+    ("kind", np.int8),
+    ("good", np.int32),
+    ("quality", np.int8),
+    ("amount", np.float64),
+    ("price", np.float64),
+    ("from_city", np.int32),
+    ("to_city", np.int32),
+)
+
+
+class TradeLedger:
+    """
+    只追加的列式交易账本
+
+    所有船只共享一个账本，每条买入、卖出、航线和资金记录占一行，
+    各列是类型固定的 NumPy 数组（容量不足时翻倍扩展）。船名、商品名和城市名
+    以整数编号保存。船只的 trade_history、gold_history 等都是按需从账本导出的视图。
+    航线记录的 amount 列为预计航行天数、price 列为航线成本；资金记录的 amount 列为当时的金币数。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        :param capacity: 初始容量（行数）
+        """
+        self.day = 0  # 当前日期，由模拟每天更新
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.ship_names: List[str] = []
+        self.good_names: List[str] = []
+        self.city_names: List[str] = []
+        self._ship_ids: Dict[str, int] = {}
+        self._good_ids: Dict[str, int] = {}
+        self._city_ids: Dict[str, int] = {}
+        # 每艘船每种记录的条数和航线总成本
+        self._counts: Dict[tuple, int] = {}
+        self._route_cost_totals: Dict[int, float] = {}
+        # 每艘船资金记录的行号，资金历史按行号直接取值，不必扫描整个账本
+        self._gold_rows: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ---- 编号 ----
+
+    @staticmethod
+    def _intern(names: List[str], ids: Dict[str, int], name: Optional[str]) -> int:
+        if name is None:
+            return -1
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    def ship_id(self, name: str) -> int:
+        return self._intern(self.ship_names, self._ship_ids, name)
+
+    def good_id(self, name: Optional[str]) -> int:
+        return self._intern(self.good_names, self._good_ids, name)
+
+    def city_id(self, name: Optional[str]) -> int:
+        return self._intern(self.city_names, self._city_ids, name)
+
+    # ---- 写入 ----
+
+    def _append(self, ship: str, kind: int, good: int = -1, quality: int = -1, amount: float = 0.0,
+                price: float = 0.0, from_city: int = -1, to_city: int = -1, day: Optional[int] = None) -> int:
+        if self._size == len(self._columns["day"]):
+            for name, column in self._columns.items():
+                grown = np.zeros(2 * len(column), dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                self._columns[name] = grown
+        ship_id = self.ship_id(ship)
+        row = self._size
+        columns = self._columns
+        columns["day"][row] = self.day if day is None else day
+        columns["ship"][row] = ship_id
+        columns["kind"][row] = kind
+        columns["good"][row] = good
+        columns["quality"][row] = quality
+        columns["amount"][row] = amount
+        columns["price"][row] = price
+        columns["from_city"][row] = from_city
+        columns["to_city"][row] = to_city
+        self._size += 1
+        key = (ship_id, kind)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        if kind == KIND_ROUTE:
+            self._route_cost_totals[ship_id] = self._route_cost_totals.get(ship_id, 0.0) + price
+        elif kind == KIND_GOLD:
+            self._gold_rows.setdefault(ship_id, []).append(row)
+        return row
+
+    def record_trade(self, ship: str, kind: int, good: str, quality: str, amount: float,
+                     price: float, location: Optional[str]):
+        """记录一笔买入或卖出"""
+        self._append(ship, kind, self.good_id(good), QUALITY_INDEX.get(quality, -1),
+                     amount, price, self.city_id(location))
+
+    def record_route(self, ship: str, from_city: str, to_city: str, estimated_days: float, cost: float):
+        """记录一次出航（预计天数和航线成本）"""
+        self._append(ship, KIND_ROUTE, amount=estimated_days, price=cost,
+                     from_city=self.city_id(from_city), to_city=self.city_id(to_city))
+
+    def record_gold(self, ship: str, gold: float):
+        """记录船只当前资金"""
+        self._append(ship, KIND_GOLD, amount=gold)
+
+    def copy_ship_records(self, other: 'TradeLedger', ship: str):
+        """把另一个账本中某艘船的全部记录按原顺序复制过来"""
+        for row in other.rows(ship):
+            self._append(
+                ship, int(other._columns["kind"][row]),
+                self.good_id(other._name(other.good_names, other._columns["good"][row])),
+                int(other._columns["quality"][row]),
+                float(other._columns["amount"][row]),
+                float(other._columns["price"][row]),
+                self.city_id(other._name(other.city_names, other._columns["from_city"][row])),
+                self.city_id(other._name(other.city_names, other._columns["to_city"][row])),
+                day=int(other._columns["day"][row]),
+            )
+
+    # ---- 查询 ----
+
+    def column(self, name: str) -> np.ndarray:
+        """整列数据（只读视图）"""
+        view = self._columns[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def rows(self, ship: Optional[str] = None, kinds=None) -> np.ndarray:
+        """满足条件的行号"""
+        mask = np.ones(self._size, dtype=bool)
+        if ship is not None:
+            if ship not in self._ship_ids:
+                return np.zeros(0, dtype=np.intp)
+            mask &= self._columns["ship"][:self._size] == self._ship_ids[ship]
+        if kinds is not None:
+            mask &= np.isin(self._columns["kind"][:self._size], kinds)
+        return np.flatnonzero(mask)
+
+    def count(self, ship: str, kind: int) -> int:
+        """某艘船某种记录的条数"""
+        return self._counts.get((self._ship_ids.get(ship, -1), kind), 0)
+
+    def total_route_cost(self, ship: str) -> float:
+        """某艘船的历史总航线成本"""
+        return self._route_cost_totals.get(self._ship_ids.get(ship, -1), 0.0)
+
+    def gold_rows(self, ship: str) -> List[int]:
+        """某艘船资金记录的行号（按记录顺序，调用方不应修改）"""
+        return self._gold_rows.get(self._ship_ids.get(ship, -1), [])
+
+    def gold_series(self, ship: str) -> np.ndarray:
+        """某艘船的资金历史"""
+        return self._columns["amount"][np.array(self.gold_rows(ship), dtype=np.intp)]
+
+    def gold_at(self, ship: str, i):
+        """某艘船的第 i 条资金记录（i 可以是切片）"""
+        rows = self.gold_rows(ship)[i]
+        if isinstance(i, slice):
+            return self._columns["amount"][np.array(rows, dtype=np.intp)]
+        return self._columns["amount"][rows]
+
+    @staticmethod
+    def _name(names: List[str], i) -> Optional[str]:
+        return names[i] if i >= 0 else None
+
+    def trade_history(self, ship: str) -> List[Dict]:
+        """导出某艘船的交易和航线记录（与旧版 trade_history 的字典格式相同）"""
+        columns = self._columns
+        history = []
+        for row in self.rows(ship, (KIND_BUY, KIND_SELL, KIND_ROUTE)):
+            kind = columns["kind"][row]
+            if kind == KIND_ROUTE:
+                history.append({
+                    "type": "route",
+                    "from": self._name(self.city_names, columns["from_city"][row]),
+                    "to": self._name(self.city_names, columns["to_city"][row]),
+                    "estimated_days": float(columns["amount"][row]),
+                    "cost": float(columns["price"][row])
+                })
+            else:
+                history.append({
+                    "type": KIND_NAMES[kind],
+                    "good": self._name(self.good_names, columns["good"][row]),
+                    "quality": QUALITY_ORDER[columns["quality"][row]] if columns["quality"][row] >= 0 else None,
+                    "amount": float(columns["amount"][row]),
+                    "price": float(columns["price"][row]),
+                    "location": self._name(self.city_names, columns["from_city"][row]) or "Unknown"
+                })
+        return history
+
+    def route_costs(self, ship: str) -> List[Dict]:
+        """导出某艘船的航线成本记录"""
+        columns = self._columns
+        return [
+            {
+                'from': self._name(self.city_names, columns["from_city"][row]),
+                'to': self._name(self.city_names, columns["to_city"][row]),
+                'cost': float(columns["price"][row]),
+                'day': int(columns["day"][row])
+            }
+            for row in self.rows(ship, KIND_ROUTE)
+        ]
+
+    # ---- 存取 ----
+
+    def save(self, path: str):
+        """一次写入 .npz 文件"""
+        np.savez(
+            path,
+            **{name: column[:self._size] for name, column in self._columns.items()},
+            ship_names=np.array(self.ship_names, dtype=str),
+            good_names=np.array(self.good_names, dtype=str),
+            city_names=np.array(self.city_names, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'TradeLedger':
+        """从 .npz 文件读取账本"""
+        with np.load(path) as data:
+            size = len(data["day"])
+            ledger = cls(max(size, 1))
+            for name, _ in COLUMNS:
+                ledger._columns[name][:size] = data[name]
+            ledger._size = size
+            for names, ids, key in ((ledger.ship_names, ledger._ship_ids, "ship_names"),
+                                    (ledger.good_names, ledger._good_ids, "good_names"),
+                                    (ledger.city_names, ledger._city_ids, "city_names")):
+                for name in data[key].tolist():
+                    cls._intern(names, ids, name)
+        ledger._rebuild_totals()
+        return ledger
+
+    def _rebuild_totals(self):
+        """由列数据重新统计每艘船每种记录的条数、航线总成本和资金记录行号（读取文件后调用）"""
+        size = self._size
+        kinds = self._columns["kind"][:size].astype(np.int64)
+        ships = self._columns["ship"][:size].astype(np.int64)
+        keys, counts = np.unique(ships * len(KIND_NAMES) + kinds, return_counts=True)
+        self._counts = {(int(key) // len(KIND_NAMES), int(key) % len(KIND_NAMES)): int(count)
+                        for key, count in zip(keys, counts)}
+        route = kinds == KIND_ROUTE
+        costs = np.bincount(ships[route], weights=self._columns["price"][:size][route],
+                            minlength=len(self.ship_names))
+        self._route_cost_totals = {i: float(c) for i, c in enumerate(costs) if c}
+        gold = np.flatnonzero(kinds == KIND_GOLD)
+        self._gold_rows = {}
+        for ship_id, row in zip(ships[gold].tolist(), gold.tolist()):
+            self._gold_rows.setdefault(ship_id, []).append(row)
+
+
+class GoldHistory(Sequence):
+    """船只资金历史：账本中该船资金记录的视图，append 写入账本"""
+
+    def __init__(self, ship: 'object'):
+        self._ship = ship
+
+    def append(self, gold: float):
+        self._ship.ledger.record_gold(self._ship.name, gold)
+
+    def __len__(self) -> int:
+        return self._ship.ledger.count(self._ship.name, KIND_GOLD)
+
+    def __getitem__(self, i):
+        return self._ship.ledger.gold_at(self._ship.name, i)
+
+    def __iter__(self):
+        return iter(self._ship.ledger.gold_series(self._ship.name))
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self._ship.ledger.gold_series(self._ship.name), dtype=dtype)
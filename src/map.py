@@ -1,127 +1,509 @@
+import heapq
 import random
 import math
-from typing import Dict, List, Tuple
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .spatial import SpatialGrid, _components
+
+# 航线状态的三个指标
+CONDITION_KEYS = ('危险度', '风向优势', '海况')
+# 没有单独设置状态的航线使用的默认值
+DEFAULT_CONDITIONS = {'危险度': 0.0, '风向优势': 0.5, '海况': 0.2}
+# 缓存的航行时间/成本表和最短路径树数量上限，超过后全部丢弃
+MAX_CACHED_TABLES = 256
+MAX_CACHED_PATHS = 1024
+
+# 航线数组：距离和三个状态指标，每条有向航线一个元素
+_EDGE_ARRAYS = ('edge_distance', 'danger', 'wind', 'sea')
 
 class TradeMap:
-    """管理城市之间的地理关系、距离和航线"""
+    """
+    管理城市之间的地理关系、距离和航线
+
+    城市用整数编号，航线按出发城市以 CSR 形式保存（indptr/indices），每条有向航线的
+    距离和状态是与 indices 对齐的数组。既可以用 generate_distances 生成完全图，
+    也可以用 add_route 只连接相邻港口构成稀疏图。两城市间没有直达航线时，
+    按航行时间、成本或距离用 Dijkstra 算法经中间港口计算最短航程。
+    distances 和 route_conditions 是航线数组上的字典视图，兼容原来的 {(city_a, city_b): ...} 用法。
+    按船速和船只大小缓存每条航线的航行时间和成本，以及每个出发城市的最短路径树；
+    航线状态变化时 epoch 加一，缓存随之失效。
+    """
     
     def __init__(self):
-        # 城市间距离表 {(city_a, city_b): distance}
-        self.distances = {}
-        # 航线状态 {(city_a, city_b): {'危险度': float, '风向优势': float, '海况': float}}
-        self.route_conditions = {}
+        self.city_names: List[str] = []
+        self.city_index: Dict[str, int] = {}
         # 城市坐标 {city_name: (x, y)}
         self.city_coords = {}
+        # CSR 邻接结构：城市 i 的航线为 indices[indptr[i]:indptr[i+1]]（按目的城市编号排序）
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64)
+        # 航线距离和状态
+        self.edge_distance = np.zeros(0)
+        self.danger = np.zeros(0)
+        self.wind = np.zeros(0)
+        self.sea = np.zeros(0)
+        # 待合并的新航线
+        self._pending = []
+        # 航线状态版本号，每次变化加一
+        self.epoch = 0
+        self._tables = {}
+        self._paths = {}
+        self._adjacency = None
+        self._reach = None  # 双向航线图中各城市所在连通分量，航线结构变化后重算
+        self._spatial = None
+        self.rng = None  # 航线状态随机变化使用，首次使用时由全局 random 派生种子
+        
+    @property
+    def distances(self) -> 'DistanceView':
+        """城市间距离表 {(city_a, city_b): distance}，只包含直达航线"""
+        return DistanceView(self)
+    
+    @property
+    def route_conditions(self) -> 'RouteConditionsView':
+        """航线状态 {(city_a, city_b): {'危险度': float, '风向优势': float, '海况': float}}"""
+        return RouteConditionsView(self)
+    
+    @property
+    def num_routes(self) -> int:
+        """有向航线数量"""
+        self._ensure_graph()
+        return len(self.indices)
         
     def add_city(self, city_name: str, x: float, y: float):
         """添加城市到地图并设定坐标"""
+        if city_name not in self.city_index:
+            self.city_index[city_name] = len(self.city_names)
+            self.city_names.append(city_name)
         self.city_coords[city_name] = (x, y)
+        self._spatial = None
+    
+    def city_id(self, city_name: str) -> int:
+        """城市编号，未知城市返回-1"""
+        return self.city_index.get(city_name, -1)
+    
+    def _rng(self) -> np.random.Generator:
+        if self.rng is None:
+            self.rng = np.random.default_rng(random.getrandbits(64))
+        return self.rng
+    
+    # ---- 空间查询 ----
+    
+    def spatial_index(self) -> SpatialGrid:
+        """城市坐标的网格索引（新增城市后重建）"""
+        if self._spatial is None:
+            self._spatial = SpatialGrid(self.coords())
+        return self._spatial
+    
+    def nearest_cities(self, city_name: str, k: int) -> List[str]:
+        """距离最近的 k 个其他城市（按直线距离从近到远）"""
+        i = self.city_index[city_name]
+        grid = self.spatial_index()
+        neighbors, _ = grid.knn(grid.coords[i], k, exclude=i)
+        return [self.city_names[j] for j in neighbors.tolist()]
+    
+    def cities_within(self, city_name: str, radius: float) -> List[str]:
+        """直线距离不超过 radius 的其他城市（从近到远）"""
+        i = self.city_index[city_name]
+        grid = self.spatial_index()
+        return [self.city_names[j] for j in grid.radius(grid.coords[i], radius).tolist() if j != i]
+    
+    # ---- 航线结构 ----
+    
+    def add_route(self, city_a: str, city_b: str, distance: Optional[float] = None,
+                  conditions: Optional[Dict[str, float]] = None, bidirectional: bool = True):
+        """
+        添加一条直达航线（已存在时覆盖）
+        :param distance: 航线距离，默认按坐标计算直线距离
+        :param conditions: 航线状态，缺少的指标使用默认值
+        :param bidirectional: 是否同时添加反方向航线
+        """
+        i, j = self.city_index[city_a], self.city_index[city_b]
+        if distance is None:
+            (x_a, y_a), (x_b, y_b) = self.city_coords[city_a], self.city_coords[city_b]
+            distance = math.sqrt((x_b - x_a)**2 + (y_b - y_a)**2)
+        values = dict(DEFAULT_CONDITIONS, **(conditions or {}))
+        row = (distance, values['危险度'], values['风向优势'], values['海况'])
+        self._pending.append(([i], [j]) + tuple([v] for v in row))
+        if bidirectional:
+            self._pending.append(([j], [i]) + tuple([v] for v in row))
+        self._conditions_changed()
+    
+    def add_routes(self, src: np.ndarray, dst: np.ndarray, distance: Optional[np.ndarray] = None,
+                   danger=None, wind=None, sea=None):
+        """
+        批量添加有向航线（按城市编号），适合由近邻图等方式一次生成稀疏航线网
+        :param distance: 各航线距离，默认按坐标计算
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if distance is None:
+            coords = self.coords()
+            distance = np.sqrt(((coords[dst] - coords[src])**2).sum(axis=1))
+        n = len(src)
+        fill = lambda values, key: np.broadcast_to(
+            DEFAULT_CONDITIONS[key] if values is None else values, (n,)).astype(float)
+        self._pending.append((src, dst, np.asarray(distance, dtype=float), fill(danger, '危险度'),
+                              fill(wind, '风向优势'), fill(sea, '海况')))
+        self._conditions_changed()
+    
+    def remove_route(self, city_a: str, city_b: str):
+        """删除一条有向航线"""
+        ids = self._route_ids(city_a, city_b)
+        if ids is None:
+            raise KeyError((city_a, city_b))
+        keep = np.ones(len(self.indices), dtype=bool)
+        keep[self._edge(*ids)] = False
+        src = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        self._build(src[keep], self.indices[keep],
+                    *(getattr(self, name)[keep] for name in _EDGE_ARRAYS))
+        self._conditions_changed()
+    
+    def coords(self) -> np.ndarray:
+        """按城市编号排列的坐标数组 (城市数, 2)"""
+        return np.array([self.city_coords[name] for name in self.city_names], dtype=float).reshape(-1, 2)
+    
+    def _ensure_graph(self):
+        """合并新添加的航线，并在新增城市后扩展 indptr"""
+        n = len(self.city_names)
+        if not self._pending and len(self.indptr) == n + 1:
+            return
+        src = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        parts = [(src, self.indices) + tuple(getattr(self, name) for name in _EDGE_ARRAYS)]
+        parts.extend(self._pending)
+        self._pending = []
+        columns = [np.concatenate([np.asarray(part[k]) for part in parts]) for k in range(6)]
+        self._build(columns[0].astype(np.int64), columns[1].astype(np.int64), *columns[2:])
+    
+    def _build(self, src, dst, distance, danger, wind, sea):
+        """由有向航线列表重建 CSR 结构，重复的航线保留最后添加的一条"""
+        n = len(self.city_names)
+        key = src * max(n, 1) + dst
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        last = np.append(key[1:] != key[:-1], True) if len(key) else np.zeros(0, dtype=bool)
+        order = order[last]
+        self.indices = dst[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src[order], minlength=n), out=self.indptr[1:])
+        for name, values in zip(_EDGE_ARRAYS, (distance, danger, wind, sea)):
+            setattr(self, name, np.asarray(values, dtype=float)[order])
+        self._adjacency = None
+        self._reach = None
+    
+    def _edge(self, i: int, j: int) -> int:
+        """航线 i→j 在航线数组中的下标，不存在时返回-1"""
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        pos = lo + int(np.searchsorted(self.indices[lo:hi], j))
+        if pos < hi and self.indices[pos] == j:
+            return pos
+        return -1
+    
+    def _route_ids(self, city_a: str, city_b: str) -> Optional[Tuple[int, int]]:
+        """两城市之间有直达航线时返回 (编号a, 编号b)"""
+        self._ensure_graph()
+        i = self.city_index.get(city_a)
+        j = self.city_index.get(city_b)
+        if i is None or j is None or self._edge(i, j) < 0:
+            return None
+        return i, j
+    
+    def reachable_cities(self, city_name: str, destinations: List[str]) -> List[str]:
+        """
+        destinations 中从 city_name 出发经一段或多段航线可以到达的城市（保持原顺序）
+        每条航线都有反方向航线时按连通分量判断，否则按最短距离是否有限判断
+        """
+        self._ensure_graph()
+        if self._reach is None:
+            n = len(self.city_names)
+            src = np.repeat(np.arange(n), np.diff(self.indptr))
+            forward = np.sort(src * n + self.indices)
+            symmetric = np.array_equal(forward, np.sort(self.indices * n + src))
+            if not symmetric:
+                self._reach = False
+            else:
+                labels = _components(n, src, self.indices)
+                self._reach = True if not labels.any() else labels  # True 表示整个图连通
+        reach = self._reach
+        if reach is True:
+            return destinations
+        i = self.city_index[city_name]
+        if reach is False:
+            dist = self._tree(i, ('distance',))[0]
+            return [name for name in destinations if np.isfinite(dist[self.city_index[name]])]
+        return [name for name in destinations if reach[self.city_index[name]] == reach[i]]
+    
+    def has_route(self, city_a: str, city_b: str) -> bool:
+        """两城市之间是否有直达航线"""
+        return self._route_ids(city_a, city_b) is not None
         
     def generate_distances(self):
-        """根据坐标生成城市间距离"""
-        city_names = list(self.city_coords.keys())
+        """根据坐标生成城市间距离（完全图，每对城市都有直达航线）"""
+        coords = self.coords()
+        n = len(coords)
+        # 使用欧几里得距离
+        dx = coords[None, :, 0] - coords[:, None, 0]
+        dy = coords[None, :, 1] - coords[:, None, 1]
+        distance = np.sqrt(dx**2 + dy**2)
+        danger = np.zeros((n, n))
+        wind = np.zeros((n, n))
+        sea = np.zeros((n, n))
         
-        for i, city_a in enumerate(city_names):
-            for city_b in city_names[i+1:]:
-                x_a, y_a = self.city_coords[city_a]
-                x_b, y_b = self.city_coords[city_b]
-                
-                # 使用欧几里得距离
-                distance = math.sqrt((x_b - x_a)**2 + (y_b - y_a)**2)
-                
-                # 添加距离（双向）
-                self.distances[(city_a, city_b)] = distance
-                self.distances[(city_b, city_a)] = distance
-                
-                # 初始化航线状态
-                # 风向优势：0为逆风，1为顺风；海况：0为平静，1为风暴
-                ab_route = {
-                    '危险度': random.uniform(0.1, 0.5),  # 0-1 之间，越高越危险（海盗、暗礁等）
-                    '风向优势': random.uniform(0.3, 0.8),  # 0-1 之间，越高风向越有利
-                    '海况': random.uniform(0.1, 0.4)   # 0-1 之间，越高海况越恶劣
-                }
-                self.route_conditions[(city_a, city_b)] = ab_route
-                
-                # 相反方向的航线可能有不同的风向优势
-                ba_route = ab_route.copy()
-                ba_route['风向优势'] = random.uniform(0.2, 0.7)  # 不同方向风向不同
-                self.route_conditions[(city_b, city_a)] = ba_route
+        # 初始化航线状态
+        # 风向优势：0为逆风，1为顺风；海况：0为平静，1为风暴
+        if self.rng is not None:
+            # 指定了随机数生成器时整体抽样
+            a, b = np.triu_indices(n, 1)
+            danger[a, b] = danger[b, a] = self.rng.uniform(0.1, 0.5, len(a))
+            wind[a, b] = self.rng.uniform(0.3, 0.8, len(a))
+            sea[a, b] = sea[b, a] = self.rng.uniform(0.1, 0.4, len(a))
+            wind[b, a] = self.rng.uniform(0.2, 0.7, len(a))
+        else:
+            # 逐对抽样，保持与全局随机种子对应的地图不变
+            for a in range(n):
+                for b in range(a + 1, n):
+                    danger[a, b] = danger[b, a] = random.uniform(0.1, 0.5)  # 越高越危险（海盗、暗礁等）
+                    wind[a, b] = random.uniform(0.3, 0.8)  # 越高风向越有利
+                    sea[a, b] = sea[b, a] = random.uniform(0.1, 0.4)  # 越高海况越恶劣
+                    # 相反方向的航线可能有不同的风向优势
+                    wind[b, a] = random.uniform(0.2, 0.7)
+        
+        src, dst = np.nonzero(~np.eye(n, dtype=bool))
+        self._pending = []
+        self._build(src, dst, distance[src, dst], danger[src, dst], wind[src, dst], sea[src, dst])
+        self._conditions_changed()
+    
+    def generate_knn_routes(self, k: int = 6):
+        """
+        只连接相邻港口：每个城市与最近的 k 个城市之间建立双向航线（稀疏图）；
+        近邻图不连通时在分量之间补上最短的航线，保证任意两个港口之间都可达。
+        航线状态的抽样范围与 generate_distances 相同
+        """
+        n = len(self.city_names)
+        grid = self.spatial_index()
+        src, dst = grid.connect(*grid.knn_graph(k))
+        # 每对城市共用危险度和海况，两个方向的风向优势分别抽样
+        pair_keys, pair = np.unique(np.minimum(src, dst) * n + np.maximum(src, dst), return_inverse=True)
+        rng = self._rng()
+        pairs = len(pair_keys)
+        danger = rng.uniform(0.1, 0.5, pairs)
+        sea = rng.uniform(0.1, 0.4, pairs)
+        wind_forward = rng.uniform(0.3, 0.8, pairs)
+        wind_backward = rng.uniform(0.2, 0.7, pairs)
+        wind = np.where(src < dst, wind_forward[pair], wind_backward[pair])
+        coords = grid.coords
+        distance = np.sqrt(((coords[dst] - coords[src])**2).sum(axis=1))
+        self._pending = []
+        self._build(src, dst, distance, danger[pair], wind, sea[pair])
+        self._conditions_changed()
     
     def get_distance(self, city_a: str, city_b: str) -> float:
-        """获取两城市间的距离"""
-        if (city_a, city_b) in self.distances:
-            return self.distances[(city_a, city_b)]
-        return float('inf')  # 如果没有直接连接，返回无穷大
+        """获取两城市间的距离，没有直达航线时为经中间港口的最短距离"""
+        ids = self._route_ids(city_a, city_b)
+        if ids is None:
+            return self._path_total(city_a, city_b, ('distance',))
+        return float(self.edge_distance[self._edge(*ids)])
+    
+    # ---- 航行时间和成本表 ----
+    
+    def travel_time_table(self, ship_speed: float) -> np.ndarray:
+        """
+        给定船速时每条航线的航行时间（天，只读），与 indices 对齐
+        """
+        self._ensure_graph()
+        key = ('time', ship_speed)
+        table = self._tables.get(key)
+        if table is None:
+            # 风向影响速度：顺风加速，逆风减速（0.5-1.5的因子）；海况恶劣减慢速度
+            effective_speed = ship_speed * (0.5 + self.wind) * (1 - self.sea)
+            with np.errstate(divide='ignore'):
+                # 基础时间 = 距离/速度，四舍五入到0.5天，至少需要1天
+                table = self._store(key, np.maximum(1, np.round(self.edge_distance / effective_speed * 2) / 2))
+        return table
+    
+    def route_cost_table(self, ship_size: float) -> np.ndarray:
+        """
+        给定船只大小时每条航线的成本（只读），与 indices 对齐
+        """
+        self._ensure_graph()
+        key = ('cost', ship_size)
+        table = self._tables.get(key)
+        if table is None:
+            distance = self.edge_distance
+            # 基础成本与距离成正比
+            base_cost = distance * 2.0
+            # 港口费用（与船只大小成正比）
+            port_fee = 10 + ship_size * 5
+            # 船员工资、补给成本与距离和船只大小成正比
+            crew_wage = distance * 0.5 * ship_size
+            supplies_cost = distance * 0.8 * ship_size
+            # 航线危险度增加成本（保险、额外护卫等）
+            danger_cost = base_cost * self.danger
+            table = self._store(key, base_cost + port_fee + crew_wage + supplies_cost + danger_cost)
+        return table
+    
+    def _store(self, key, table: np.ndarray) -> np.ndarray:
+        if len(self._tables) >= MAX_CACHED_TABLES:
+            self._tables.clear()
+        table.flags.writeable = False
+        self._tables[key] = table
+        return table
+    
+    def _conditions_changed(self):
+        """航线状态或结构变化后调用，使缓存的表和最短路径树失效"""
+        self.epoch += 1
+        self._tables.clear()
+        self._paths.clear()
     
     def calculate_travel_time(self, city_a: str, city_b: str, ship_speed: float) -> float:
-        """计算船只航行所需时间（天）"""
-        distance = self.get_distance(city_a, city_b)
-        if distance == float('inf'):
-            return float('inf')
-            
-        # 获取航线状态
-        route = self.route_conditions.get((city_a, city_b), {'风向优势': 0.5, '海况': 0.2})
-        wind_advantage = route['风向优势']
-        sea_condition = route['海况']
-        
-        # 风向影响速度：顺风加速，逆风减速
-        wind_factor = 0.5 + wind_advantage  # 0.5-1.5的因子
-        
-        # 海况恶劣减慢速度
-        sea_factor = 1 - sea_condition  # 0.6-0.9的因子
-        
-        # 有效速度 = 基础速度 * 风向因子 * 海况因子
-        effective_speed = ship_speed * wind_factor * sea_factor
-        
-        # 基础时间 = 距离/速度，四舍五入到0.5天
-        travel_time = round(distance / effective_speed * 2) / 2
-        return max(1, travel_time)  # 至少需要1天
+        """计算船只航行所需时间（天），没有直达航线时经中间港口"""
+        ids = self._route_ids(city_a, city_b)
+        if ids is None:
+            return self._path_total(city_a, city_b, ('time', ship_speed))
+        return float(self.travel_time_table(ship_speed)[self._edge(*ids)])
     
     def calculate_route_cost(self, city_a: str, city_b: str, ship_size: float) -> float:
         """
-        计算航线成本（船员工资、补给、港口费用等）
+        计算航线成本（船员工资、补给、港口费用等），没有直达航线时为各段之和
         :param ship_size: 船只大小因子（影响成本）
         """
-        distance = self.get_distance(city_a, city_b)
-        if distance == float('inf'):
-            return float('inf')
-            
-        # 基础成本与距离成正比
-        base_cost = distance * 2.0
-        
-        # 港口费用（与船只大小成正比）
-        port_fee = 10 + ship_size * 5
-        
-        # 船员工资（与距离和船只大小成正比）
-        crew_wage = distance * 0.5 * ship_size
-        
-        # 补给成本（食物、水等，与距离和船只大小成正比）
-        supplies_cost = distance * 0.8 * ship_size
-        
-        # 航线危险度增加成本（保险、额外护卫等）
-        route = self.route_conditions.get((city_a, city_b), {'危险度': 0.0})
-        danger_factor = route['危险度']
-        danger_cost = base_cost * danger_factor
-        
-        return base_cost + port_fee + crew_wage + supplies_cost + danger_cost
+        ids = self._route_ids(city_a, city_b)
+        if ids is None:
+            return self._path_total(city_a, city_b, ('cost', ship_size))
+        return float(self.route_cost_table(ship_size)[self._edge(*ids)])
+    
+    def route_costs_from(self, city_a: str, destinations: List[str], ship_size: float) -> np.ndarray:
+        """
+        从一个城市到多个目的地的航线成本（一次数组查询），没有直达航线的目的地为最短路径各段之和
+        :return: 与 destinations 对齐的成本数组
+        """
+        return self._values_from(city_a, destinations, ('cost', ship_size), self.route_cost_table(ship_size))
+    
+    def travel_times_from(self, city_a: str, destinations: List[str], ship_speed: float) -> np.ndarray:
+        """从一个城市到多个目的地的航行时间（天），参数和返回值同 route_costs_from"""
+        return self._values_from(city_a, destinations, ('time', ship_speed), self.travel_time_table(ship_speed))
+    
+    def _values_from(self, city_a: str, destinations: List[str], key: Tuple, table: np.ndarray) -> np.ndarray:
+        """按航线表查出 city_a 到各目的地的值，没有直达航线的按最短路径计算"""
+        i = self.city_index[city_a]
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        targets = np.array([self.city_index.get(name, -1) for name in destinations], dtype=np.int64)
+        neighbors = self.indices[lo:hi]
+        pos = np.zeros(len(targets), dtype=np.int64)
+        direct = np.zeros(len(targets), dtype=bool)
+        if hi > lo:
+            pos = np.minimum(np.searchsorted(neighbors, targets), hi - lo - 1)
+            direct = neighbors[pos] == targets
+        values = np.empty(len(targets))
+        values[direct] = table[lo + pos[direct]]
+        for k in np.flatnonzero(~direct).tolist():
+            values[k] = self._path_total(city_a, destinations[k], key)
+        return values
     
     def update_route_conditions(self):
         """更新航线状态（随机变化）"""
-        for route in self.route_conditions:
-            # 危险度变化（±10%）
-            danger = self.route_conditions[route]['危险度']
-            danger_change = random.uniform(-0.1, 0.1)
-            self.route_conditions[route]['危险度'] = max(0.1, min(0.9, danger + danger_change))
-            
-            # 风向优势变化（±20%）
-            wind = self.route_conditions[route]['风向优势']
-            wind_change = random.uniform(-0.2, 0.2)
-            self.route_conditions[route]['风向优势'] = max(0.1, min(0.9, wind + wind_change))
-            
-            # 海况变化（±15%）
-            sea = self.route_conditions[route]['海况']
-            sea_change = random.uniform(-0.15, 0.15)
-            self.route_conditions[route]['海况'] = max(0.05, min(0.8, sea + sea_change))
+        self._ensure_graph()
+        rng = self._rng()
+        n = len(self.indices)
+        # 危险度变化（±10%）
+        self.danger = np.clip(self.danger + rng.uniform(-0.1, 0.1, n), 0.1, 0.9)
+        # 风向优势变化（±20%）
+        self.wind = np.clip(self.wind + rng.uniform(-0.2, 0.2, n), 0.1, 0.9)
+        # 海况变化（±15%）
+        self.sea = np.clip(self.sea + rng.uniform(-0.15, 0.15, n), 0.05, 0.8)
+        self._conditions_changed()
+    
+    # ---- 多段航线 ----
+    
+    def _metric_weights(self, metric: Tuple) -> np.ndarray:
+        if metric[0] == 'time':
+            return self.travel_time_table(metric[1])
+        if metric[0] == 'cost':
+            return self.route_cost_table(metric[1])
+        self._ensure_graph()
+        return self.edge_distance
+    
+    @staticmethod
+    def _metric_key(metric: str, ship_speed: float, ship_size: float) -> Tuple:
+        if metric == 'time':
+            return ('time', ship_speed)
+        if metric == 'cost':
+            return ('cost', ship_size)
+        if metric == 'distance':
+            return ('distance',)
+        raise ValueError(f"未知的航线度量: {metric}")
+    
+    def shortest_path_tree(self, source: str, metric: str = 'time', ship_speed: float = 1.0,
+                           ship_size: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        从一个城市出发到所有城市的最短航程（Dijkstra），按出发城市和度量缓存
+        :param metric: 'time'（航行时间）、'cost'（航线成本）或 'distance'（距离）
+        :return: (各城市的最短航程, 各城市在最短路径上的前一个城市编号)，不可达为 inf / -1
+        """
+        return self._tree(self.city_index[source], self._metric_key(metric, ship_speed, ship_size))
+    
+    def find_route(self, city_a: str, city_b: str, metric: str = 'time', ship_speed: float = 1.0,
+                   ship_size: float = 1.0) -> Tuple[List[str], float]:
+        """
+        两城市间的最短多段航线
+        :return: (途经城市列表（含起点和终点）, 总航程)，不可达时为 ([], inf)
+        """
+        key = self._metric_key(metric, ship_speed, ship_size)
+        i, j = self.city_index[city_a], self.city_index[city_b]
+        dist, pred = self._tree(i, key)
+        if not np.isfinite(dist[j]):
+            return [], float('inf')
+        path = [j]
+        while path[-1] != i:
+            path.append(int(pred[path[-1]]))
+        return [self.city_names[k] for k in reversed(path)], float(dist[j])
+    
+    def _path_total(self, city_a: str, city_b: str, key: Tuple) -> float:
+        i = self.city_index.get(city_a)
+        j = self.city_index.get(city_b)
+        if i is None or j is None or i == j:
+            return float('inf')
+        return float(self._tree(i, key)[0][j])
+    
+    def _tree(self, source: int, key: Tuple) -> Tuple[np.ndarray, np.ndarray]:
+        cached = self._paths.get((key, source))
+        if cached is None:
+            weights = self._metric_weights(key)
+            cached = self._dijkstra(source, weights)
+            if len(self._paths) >= MAX_CACHED_PATHS:
+                self._paths.clear()
+            self._paths[(key, source)] = cached
+        return cached
+    
+    def _dijkstra(self, source: int, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self._adjacency is None:
+            self._adjacency = (self.indptr.tolist(), self.indices.tolist())
+        indptr, indices = self._adjacency
+        weights = weights.tolist()
+        n = len(self.city_names)
+        dist = [math.inf] * n
+        pred = [-1] * n
+        done = [False] * n
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if done[u]:
+                continue
+            done[u] = True
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, v))
+        result = (np.array(dist), np.array(pred, dtype=np.int64))
+        for array in result:
+            array.flags.writeable = False
+        return result
     
     def get_route_description(self, city_a: str, city_b: str) -> str:
         """获取航线状态的文字描述"""
@@ -185,4 +567,115 @@ class TradeMap:
             }))
             added_routes.add((city_a, city_b))
             
-        return routes 
\ No newline at end of file
+        return routes 
+
+
+
+class DistanceView(MutableMapping):
+    """直达航线距离的字典视图 {(city_a, city_b): distance}"""
+
+    def __init__(self, trade_map: TradeMap):
+        self._map = trade_map
+
+    def _edge(self, key) -> int:
+        city_a, city_b = key
+        ids = self._map._route_ids(city_a, city_b)
+        if ids is None:
+            raise KeyError(key)
+        return self._map._edge(*ids)
+
+    def __getitem__(self, key) -> float:
+        return float(self._map.edge_distance[self._edge(key)])
+
+    def __setitem__(self, key, distance: float):
+        trade_map = self._map
+        city_a, city_b = key
+        for name in (city_a, city_b):
+            if name not in trade_map.city_index:
+                trade_map.add_city(name, *trade_map.city_coords.get(name, (0.0, 0.0)))
+        ids = trade_map._route_ids(city_a, city_b)
+        if ids is None:
+            # 新航线使用默认状态
+            trade_map.add_route(city_a, city_b, distance, bidirectional=False)
+        else:
+            trade_map.edge_distance[trade_map._edge(*ids)] = distance
+            trade_map._conditions_changed()
+
+    def __delitem__(self, key):
+        self._map.remove_route(*key)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        trade_map = self._map
+        trade_map._ensure_graph()
+        names = trade_map.city_names
+        src = np.repeat(np.arange(len(names)), np.diff(trade_map.indptr))
+        for i, j in zip(src.tolist(), trade_map.indices.tolist()):
+            yield names[i], names[j]
+
+    def __len__(self) -> int:
+        return self._map.num_routes
+
+
+class RouteConditionsView(MutableMapping):
+    """航线状态的字典视图 {(city_a, city_b): RouteView}"""
+
+    def __init__(self, trade_map: TradeMap):
+        self._map = trade_map
+
+    def __getitem__(self, key) -> 'RouteView':
+        city_a, city_b = key
+        ids = self._map._route_ids(city_a, city_b)
+        if ids is None:
+            raise KeyError(key)
+        return RouteView(self._map, *ids)
+
+    def __setitem__(self, key, conditions: Dict[str, float]):
+        route = self[key]
+        for name, value in conditions.items():
+            route[name] = value
+
+    def __delitem__(self, key):
+        raise TypeError("请通过 distances 删除航线")
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(DistanceView(self._map))
+
+    def __len__(self) -> int:
+        return self._map.num_routes
+
+
+class RouteView(MutableMapping):
+    """单条航线状态 {'危险度', '风向优势', '海况'}，写入会使缓存失效"""
+
+    _arrays = dict(zip(CONDITION_KEYS, ('danger', 'wind', 'sea')))
+
+    def __init__(self, trade_map: TradeMap, i: int, j: int):
+        self._map = trade_map
+        self._i = i
+        self._j = j
+
+    def _position(self) -> int:
+        self._map._ensure_graph()
+        return self._map._edge(self._i, self._j)
+
+    def __getitem__(self, key: str) -> float:
+        return float(getattr(self._map, self._arrays[key])[self._position()])
+
+    def __setitem__(self, key: str, value: float):
+        getattr(self._map, self._arrays[key])[self._position()] = value
+        self._map._conditions_changed()
+
+    def __delitem__(self, key: str):
+        raise TypeError("航线状态的指标不能删除")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CONDITION_KEYS)
+
+    def __len__(self) -> int:
+        return len(CONDITION_KEYS)
+
+    def copy(self) -> Dict[str, float]:
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
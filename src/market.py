@@ -0,0 +1,506 @@
+import random
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .history import DEFAULT_HISTORY_DAYS, RingBuffer
+from .rng import CITY_INFLATION, CITY_CURRENCY, CITY_JITTER, uniform
+
+if TYPE_CHECKING:
+    from .city import City
+
+# 质量等级顺序（从低到高），与 City 中的消费顺序一致
+QUALITY_ORDER = ("粗糙", "普通", "精良", "极品")
+QUALITY_INDEX = {quality: i for i, quality in enumerate(QUALITY_ORDER)}
+
+# 新产出商品的质量权重：第0行为普通商品，第1行为城市特产
+QUALITY_WEIGHTS = np.array([
+    [0.3, 0.5, 0.15, 0.05],
+    [0.1, 0.3, 0.4, 0.2],
+])
+QUALITY_WEIGHTS /= QUALITY_WEIGHTS.sum(axis=1, keepdims=True)
+
+
+# ---- 市场运算（最后一维为商品，前面可以有任意城市维度） ----
+
+def _demand(consumption: np.ndarray) -> np.ndarray:
+    """7天需求量：没有消费量或消费量不为正的商品按0.1计算"""
+    return np.where(consumption > 0, consumption, 0.1) * 7
+
+
+def _produce(stock, total, production, specialty, days=1.0):
+    """按质量权重加入若干天的产量"""
+    amount = np.where(production > 0, production, 0.0) * days
+    stock += amount[..., None] * QUALITY_WEIGHTS[specialty.astype(np.intp)]
+    total += amount
+
+
+def _consume(stock, total, consumption):
+    """按质量从低到高消耗一天的消费量"""
+    amount = np.where(consumption > 0, consumption, 0.0)
+    taken = np.minimum(np.cumsum(stock, axis=-1), amount[..., None])
+    stock[..., 0] -= taken[..., 0]
+    stock[..., 1:] -= np.diff(taken, axis=-1)
+    np.maximum(total - amount, 0, out=total)
+
+
+def _adjust_prices(price, base_price, total, demand, price_change, inflation_rate=None):
+    """S型供需调整价格"""
+    supply_ratio = np.where(total > 0, total / demand, 0.01)
+    sigmoid_input = np.clip((supply_ratio - 1) * 2, -10, 10)
+    price_adjustment = 1.0 / (1 + np.exp(-sigmoid_input))
+    new_price = base_price * price_change * price_adjustment
+    if inflation_rate is None:
+        np.clip(new_price, base_price * 0.5, base_price * 2.0, out=price)
+    else:
+        np.maximum(new_price * (1.0 + np.asarray(inflation_rate)[..., None]), 0.1, out=price)
+
+
+def _advance_inflation(inflation, total, consumption, inflation_change):
+    """通货膨胀率随机变化，库存越少通货膨胀越高，范围 -0.05 到 0.1"""
+    total_inventory = np.atleast_1d(total.sum(axis=-1))
+    total_consumption = np.atleast_1d(consumption.sum(axis=-1)) * 7
+    valid = (total_consumption > 0) & (total_inventory > 0)
+    inventory_ratio = np.divide(total_inventory, total_consumption,
+                                out=np.ones_like(total_inventory), where=valid)
+    inflation_change = inflation_change + np.where(valid & (inventory_ratio < 0.8), 0.002, 0.0)
+    inflation_change -= np.where(valid & (inventory_ratio > 1.5), 0.001, 0.0)
+    np.clip(inflation + inflation_change, -0.05, 0.1, out=inflation)
+
+
+def _advance_currency(currency, inflation, total, specialty, random_factor):
+    """货币价值受通货膨胀、库存和特产影响，范围 0.5-2.0"""
+    value_change = -inflation * 0.5
+    total_inventory = total.sum(axis=-1)
+    value_change += np.where(total_inventory > 0, np.minimum(0.001, 0.0001 * total_inventory / 1000), 0.0)
+    specialty_inventory = np.where(specialty, total, 0.0).sum(axis=-1)
+    value_change += np.where(specialty_inventory > 0, np.minimum(0.002, 0.0002 * specialty_inventory / 100), 0.0)
+    value_change += random_factor
+    np.clip(currency * (1 + value_change), 0.5, 2.0, out=currency)
+
+
+def _goods_order(base_prices: Dict[str, float], production: Dict[str, float],
+                 consumption: Dict[str, float]) -> List[str]:
+    """有价格的商品在前，只出现在产销表里的商品排在后面"""
+    goods = list(base_prices)
+    seen = set(goods)
+    for good in list(production) + list(consumption):
+        if good not in seen:
+            goods.append(good)
+            seen.add(good)
+    return goods
+
+
+class CityMarket:
+    """
+    城市市场的数组引擎
+
+    以 商品×质量 的库存矩阵和价格、产量、消费量向量保存城市经济状态，
+    每日的生产、消费、价格调整和历史记录都是少量整体数组运算。
+    属于 WorldMarket 时，所有数组都是世界矩阵中该城市那一行的视图。
+    """
+
+    def __init__(self, base_prices: Dict[str, float], production: Dict[str, float],
+                 consumption: Dict[str, float], history_days: int = DEFAULT_HISTORY_DAYS,
+                 rng: Optional[np.random.Generator] = None):
+        """
+        :param base_prices: 商品基础价格字典 {商品名: 基础价格}
+        :param production: 商品生产量字典 {商品名: 日产量}
+        :param consumption: 商品消费量字典 {商品名: 日消费量}
+        :param history_days: 保留的历史天数
+        :param rng: 随机数生成器，默认由全局 random 派生种子
+        """
+        self.goods = _goods_order(base_prices, production, consumption)
+        self.priced_goods = self.goods[:len(base_prices)]
+        self.index = {good: i for i, good in enumerate(self.goods)}
+        self.world = None
+        self.row = None
+
+        n = len(self.goods)
+        self.base_price = np.zeros(n)
+        self.price = np.zeros(n)
+        self.production = np.zeros(n)
+        self.consumption = np.zeros(n)
+        self.demand = np.zeros(n)
+        self.stock = np.zeros((n, len(QUALITY_ORDER)))  # 商品×质量库存
+        self.total = np.zeros(n)                         # 总库存
+        self.specialty = np.zeros(n, dtype=bool)
+        self.inflation = np.zeros(1)                     # 通货膨胀率
+        self.currency = np.ones(1)                       # 货币价值
+
+        for good, price in base_prices.items():
+            self.base_price[self.index[good]] = price
+        for good, amount in production.items():
+            self.production[self.index[good]] = amount
+        for good, amount in consumption.items():
+            self.consumption[self.index[good]] = amount
+        self.price[:] = self.base_price
+        self.demand[:] = _demand(self.consumption)
+
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+        self.draws = None  # 按日预抽的随机数流（由 City 设置），设置后代替 rng
+        self.history_days = history_days
+        self._price_rows = RingBuffer(history_days, (n,))
+        self._inventory_rows = RingBuffer(history_days, (n,))
+        self.inflation_history = RingBuffer(history_days)
+        self.currency_history = RingBuffer(history_days)
+        self.currency_history.append(1.0)
+
+    @classmethod
+    def world_row(cls, world: 'WorldMarket', row: int, city: 'City') -> 'CityMarket':
+        """创建 WorldMarket 中某一行的城市视图"""
+        market = cls.__new__(cls)
+        market.goods = _goods_order(city.base_prices, city.production, city.consumption)
+        market.priced_goods = market.goods[:len(city.base_prices)]
+        market.index = world.index
+        market.world = world
+        market.row = row
+        for name in ("base_price", "price", "production", "consumption", "demand",
+                     "stock", "total", "specialty"):
+            setattr(market, name, getattr(world, name)[row])
+        market.inflation = world.inflation[row:row + 1]
+        market.currency = world.currency[row:row + 1]
+        market.rng = world.rng
+        market.draws = None
+        market.history_days = world.history_days
+        market.inflation_history = SeriesView(world._inflation_rows, row)
+        market.currency_history = SeriesView(world._currency_rows, row)
+        return market
+
+    def set_specialties(self, goods: Iterable[str]):
+        """设置城市特产（影响新产出商品的质量分布）"""
+        self.specialty[:] = False
+        for good in goods:
+            if good in self.index:
+                self.specialty[self.index[good]] = True
+
+    def produce(self, days: float = 1.0):
+        """按质量权重加入若干天的产量"""
+        _produce(self.stock, self.total, self.production, self.specialty, days)
+
+    def consume(self):
+        """按质量从低到高消耗一天的消费量"""
+        _consume(self.stock, self.total, self.consumption)
+
+    def update_quality_distribution(self):
+        """每日生产和消费"""
+        self.produce()
+        self.consume()
+
+    def update_prices(self, inflation_rate: Optional[float] = None):
+        """
+        根据供需关系整体调整价格
+        :param inflation_rate: 为None时价格保持在基础价格的0.5-2倍之间，
+                               否则按通货膨胀率放大价格（对应 City.update）
+        """
+        if self.draws is None:
+            price_change = self.rng.uniform(0.95, 1.05, self.price.shape)
+        else:
+            # 只有定价商品有波动系数，其余商品不参与定价
+            price_change = np.ones(self.price.shape)
+            count = len(self.priced_goods)
+            price_change[:count] = uniform(self.draws.row()[CITY_JITTER:CITY_JITTER + count], 0.95, 1.05)
+        _adjust_prices(self.price, self.base_price, self.total, self.demand, price_change, inflation_rate)
+
+    def _uniform(self, slot: int, low: float, high: float) -> np.ndarray:
+        """通货膨胀率、货币价值的随机变化（形状为 (1,)）"""
+        if self.draws is None:
+            return self.rng.uniform(low, high, 1)
+        return uniform(self.draws.row()[slot:slot + 1], low, high)
+
+    def update_inflation(self):
+        """更新通货膨胀率"""
+        _advance_inflation(self.inflation, self.total, self.consumption,
+                           self._uniform(CITY_INFLATION, -0.002, 0.005))
+
+    def update_currency_value(self):
+        """更新货币价值"""
+        _advance_currency(self.currency, self.inflation, self.total, self.specialty,
+                          self._uniform(CITY_CURRENCY, -0.002, 0.002))
+
+    def record_history(self):
+        """记录当日价格、库存、通货膨胀率和货币价值（世界模式下由 WorldMarket 统一记录）"""
+        if self.world is not None:
+            return
+        self._price_rows.append(self.price)
+        self._inventory_rows.append(self.total)
+        self.inflation_history.append(self.inflation[0])
+        self.currency_history.append(self.currency[0])
+
+    def step(self):
+        """按模拟顺序推进一天：价格、生产消费、货币、历史记录"""
+        self.update_prices()
+        self.update_quality_distribution()
+        self.update_inflation()
+        self.update_currency_value()
+        self.record_history()
+
+    # ---- 兼容字典接口的视图 ----
+
+    def prices_view(self) -> 'VectorView':
+        return VectorView(self.price, self.index, self.priced_goods)
+
+    def inventory_view(self) -> 'VectorView':
+        return VectorView(self.total, self.index, self.goods)
+
+    def stock_view(self) -> 'StockView':
+        return StockView(self.stock, self.index, self.goods)
+
+    def price_history_view(self) -> 'HistoryView':
+        if self.world is not None:
+            return HistoryView(self.world._price_rows, self.index, self.priced_goods, self.row)
+        return HistoryView(self._price_rows, self.index, self.priced_goods)
+
+    def inventory_history_view(self) -> 'HistoryView':
+        if self.world is not None:
+            return HistoryView(self.world._inventory_rows, self.index, self.priced_goods, self.row)
+        return HistoryView(self._inventory_rows, self.index, self.priced_goods)
+
+
+class WorldMarket:
+    """
+    世界市场矩阵
+
+    把所有城市的价格、库存保存为 (城市×商品) 矩阵，通货膨胀率和货币价值保存为
+    (城市,) 向量，一次 step 调用推进全部城市。各城市的 City 对象成为矩阵行的视图。
+    """
+
+    def __init__(self, cities: List['City'], history_days: int = DEFAULT_HISTORY_DAYS,
+                 rng: Optional[np.random.Generator] = None):
+        """
+        :param cities: 城市列表，按顺序对应矩阵的行，当前状态会被迁移到矩阵中
+        :param history_days: 保留的历史天数
+        :param rng: 随机数生成器，默认由全局 random 派生种子
+        """
+        self.city_names = [city.name for city in cities]
+        self.goods = []
+        seen = set()
+        for city in cities:
+            for good in _goods_order(city.base_prices, city.production, city.consumption):
+                if good not in seen:
+                    self.goods.append(good)
+                    seen.add(good)
+        self.index = {good: i for i, good in enumerate(self.goods)}
+
+        shape = (len(cities), len(self.goods))
+        self.base_price = np.zeros(shape)
+        self.price = np.zeros(shape)
+        self.production = np.zeros(shape)
+        self.consumption = np.zeros(shape)
+        self.stock = np.zeros(shape + (len(QUALITY_ORDER),))
+        self.total = np.zeros(shape)
+        self.specialty = np.zeros(shape, dtype=bool)
+        self.inflation = np.zeros(len(cities))
+        self.currency = np.ones(len(cities))
+
+        for row, city in enumerate(cities):
+            self._load_city(row, city)
+        self.demand = _demand(self.consumption)
+
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+        self.history_days = history_days
+        self._price_rows = RingBuffer(history_days, shape)
+        self._inventory_rows = RingBuffer(history_days, shape)
+        self._inflation_rows = RingBuffer(history_days, (len(cities),))
+        self._currency_rows = RingBuffer(history_days, (len(cities),))
+        self._currency_rows.append(self.currency)
+
+        # 把城市改为矩阵行的视图（接入前的历史记录不保留）
+        for row, city in enumerate(cities):
+            city.attach_market(CityMarket.world_row(self, row, city))
+
+    def _load_city(self, row: int, city: 'City'):
+        """把城市当前状态复制到矩阵第 row 行"""
+        for good, price in city.base_prices.items():
+            self.base_price[row, self.index[good]] = price
+        for good, price in city.current_prices.items():
+            self.price[row, self.index[good]] = price
+        for good, amount in city.production.items():
+            self.production[row, self.index[good]] = amount
+        for good, amount in city.consumption.items():
+            self.consumption[row, self.index[good]] = amount
+        for good, amount in city.inventory.items():
+            self.total[row, self.index[good]] = amount
+        for good, qualities in city.inventory_by_quality.items():
+            for quality, amount in qualities.items():
+                self.stock[row, self.index[good], QUALITY_INDEX[quality]] = amount
+        for good in city.specialty_goods:
+            if good in self.index:
+                self.specialty[row, self.index[good]] = True
+        self.inflation[row] = city.inflation_rate
+        self.currency[row] = city.currency_value
+
+    def update_prices(self):
+        """所有城市同时按供需调整价格"""
+        price_change = self.rng.uniform(0.95, 1.05, self.price.shape)
+        _adjust_prices(self.price, self.base_price, self.total, self.demand, price_change)
+
+    def update_quality_distribution(self):
+        """所有城市同时生产和消费"""
+        _produce(self.stock, self.total, self.production, self.specialty)
+        _consume(self.stock, self.total, self.consumption)
+
+    def update_currency(self):
+        """所有城市同时更新通货膨胀率和货币价值"""
+        _advance_inflation(self.inflation, self.total, self.consumption,
+                           self.rng.uniform(-0.002, 0.005, self.inflation.shape))
+        _advance_currency(self.currency, self.inflation, self.total, self.specialty,
+                          self.rng.uniform(-0.002, 0.002, self.currency.shape))
+
+    def blend_inflation(self, global_inflation_rate: float):
+        """城市通货膨胀率受全局影响，但保留各自特性"""
+        self.inflation *= 0.7
+        self.inflation += 0.3 * global_inflation_rate
+
+    def record_history(self):
+        """记录当日全部城市的价格、库存、通货膨胀率和货币价值"""
+        self._price_rows.append(self.price)
+        self._inventory_rows.append(self.total)
+        self._inflation_rows.append(self.inflation)
+        self._currency_rows.append(self.currency)
+
+    def step(self):
+        """推进一天：价格、生产消费、货币、历史记录"""
+        self.update_prices()
+        self.update_quality_distribution()
+        self.update_currency()
+        self.record_history()
+
+
+class VectorView(MutableMapping):
+    """以 {商品名: 数值} 字典的方式读写一维数组"""
+
+    def __init__(self, values: np.ndarray, index: Dict[str, int], keys: List[str]):
+        self._values = values
+        self._index = index
+        self._keys = keys
+        self._key_set = frozenset(keys)
+
+    def __getitem__(self, good: str) -> float:
+        if good not in self._key_set:
+            raise KeyError(good)
+        return float(self._values[self._index[good]])
+
+    def __setitem__(self, good: str, value: float):
+        if good not in self._key_set:
+            raise KeyError(good)
+        self._values[self._index[good]] = value
+
+    def __delitem__(self, good: str):
+        raise TypeError("数组视图不支持删除商品")
+
+    def __contains__(self, good) -> bool:
+        return good in self._key_set
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def copy(self) -> Dict[str, float]:
+        return dict(self.items())
+
+
+class QualityRowView(MutableMapping):
+    """以 {质量等级: 数量} 字典的方式读写库存矩阵的一行"""
+
+    def __init__(self, row: np.ndarray):
+        self._row = row
+
+    def __getitem__(self, quality: str) -> float:
+        return float(self._row[QUALITY_INDEX[quality]])
+
+    def __setitem__(self, quality: str, value: float):
+        self._row[QUALITY_INDEX[quality]] = value
+
+    def __delitem__(self, quality: str):
+        self._row[QUALITY_INDEX[quality]] = 0.0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(QUALITY_ORDER)
+
+    def __len__(self) -> int:
+        return len(QUALITY_ORDER)
+
+
+class StockView(Mapping):
+    """以 {商品名: {质量等级: 数量}} 嵌套字典的方式访问库存矩阵"""
+
+    def __init__(self, stock: np.ndarray, index: Dict[str, int], keys: List[str]):
+        self._stock = stock
+        self._index = index
+        self._keys = keys
+        self._key_set = frozenset(keys)
+
+    def __getitem__(self, good: str) -> QualityRowView:
+        if good not in self._key_set:
+            raise KeyError(good)
+        return QualityRowView(self._stock[self._index[good]])
+
+    def __contains__(self, good) -> bool:
+        return good in self._key_set
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class HistoryView(Mapping):
+    """
+    以 {商品名: 历史序列} 的方式访问环形缓冲区中按天记录的向量
+    返回的序列是缓冲区的零复制视图；row 不为None时取世界矩阵中该城市的一行
+    """
+
+    def __init__(self, buffer: RingBuffer, index: Dict[str, int], keys: List[str], row: Optional[int] = None):
+        self._buffer = buffer
+        self._index = index
+        self._keys = keys
+        self._key_set = frozenset(keys)
+        self._row = row
+
+    def matrix(self) -> np.ndarray:
+        """(天数×商品) 历史矩阵视图，列顺序与引擎的商品索引一致"""
+        view = self._buffer.view()
+        return view if self._row is None else view[:, self._row]
+
+    def __getitem__(self, good: str) -> np.ndarray:
+        if good not in self._key_set:
+            raise KeyError(good)
+        return self.matrix()[:, self._index[good]]
+
+    def items(self):
+        matrix = self.matrix()
+        return [(good, matrix[:, self._index[good]]) for good in self._keys]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class SeriesView(Sequence):
+    """世界矩阵按天记录的 (城市,) 向量中某个城市的序列（零复制视图）"""
+
+    def __init__(self, buffer: RingBuffer, row: int):
+        self._buffer = buffer
+        self._row = row
+
+    def view(self) -> np.ndarray:
+        return self._buffer.view()[:, self._row]
+
+    def __getitem__(self, i):
+        return self.view()[i]
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __array__(self, dtype=None, copy=None):
+        view = self.view()
+        if dtype is not None or copy:
+            return np.array(view, dtype=dtype)
+        return view
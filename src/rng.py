@@ -0,0 +1,140 @@
+import hashlib
+import random
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 城市每日随机数的布局（之后每个商品一个价格波动，按 base_prices 顺序）
+CITY_INFLATION = 0
+CITY_CURRENCY = 1
+CITY_EVENT_ROLL = 2
+CITY_EVENT_PICK = 3
+CITY_JITTER = 4
+
+# 船只每日随机数的布局
+SHIP_SKILL_ROLL = 0
+SHIP_SKILL_KIND = 1
+SHIP_WEATHER_ROLL = 2
+SHIP_WEATHER_PICK = 3
+SHIP_PIRATE_ROLL = 4
+SHIP_PIRATE_PICK = 5
+SHIP_DESTINATION = 6
+SHIP_START_CITY = 7
+SHIP_DRAWS = 8
+
+# 每个实体一次预先抽取的天数
+DEFAULT_BLOCK_DAYS = 64
+
+
+def _key_part(part: Union[int, str]) -> Tuple[int, ...]:
+    """
+    把流的名称或编号转换为 SeedSequence 的 spawn_key 片段
+    字符串取 128 位 blake2b 摘要拆成 4 个 32 位整数（与进程和 hash 种子无关，不同名称实际上不会碰撞）
+    """
+    if isinstance(part, str):
+        digest = hashlib.blake2b(part.encode("utf-8"), digest_size=16).digest()
+        return tuple(int.from_bytes(digest[i:i + 4], "little") for i in range(0, len(digest), 4))
+    return (int(part),)
+
+
+class RandomStreams:
+    """
+    分层随机数流
+
+    根种子派生出按名称区分的子流，例如 ("city", 城市名)、("ship", 船名)、("routes",)。
+    子流只由根种子和名称决定，与创建顺序、其他实体的数量和进程划分无关。
+    """
+
+    def __init__(self, seed: Union[int, np.random.SeedSequence, None] = None):
+        """
+        :param seed: 根种子，None 时由全局 random 派生
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(random.getrandbits(128) if seed is None else seed)
+        self.seed_sequence = seed
+        self.day = 0  # 当前模拟日期，由模拟同步，按日抽样的流据此取当天的随机数
+
+    def seed_for(self, *key: Union[int, str]) -> np.random.SeedSequence:
+        """名称对应的子种子"""
+        root = self.seed_sequence
+        return np.random.SeedSequence(root.entropy, spawn_key=tuple(root.spawn_key) + tuple(word for part in key for word in _key_part(part)))
+
+    def generator(self, *key: Union[int, str]) -> np.random.Generator:
+        """名称对应的独立随机数生成器"""
+        return np.random.Generator(np.random.PCG64(self.seed_for(*key)))
+
+    def daily(self, width: int, *key: Union[int, str], block_days: int = DEFAULT_BLOCK_DAYS) -> 'DailyDraws':
+        """名称对应的按日随机数流，每天 width 个 [0, 1) 均匀随机数"""
+        return DailyDraws(self, self.generator(*key), width, block_days)
+
+
+class DailyDraws:
+    """
+    某个实体按日预先抽取的随机数
+
+    每 block_days 天的随机数用一次调用抽成 (天数, width) 的矩阵，第 d 天总是使用第 d 行，
+    与当天是否、何时、以什么顺序读取无关；跳过的整块直接推进生成器状态而不实际抽样。
+    """
+
+    def __init__(self, streams: RandomStreams, generator: np.random.Generator, width: int,
+                 block_days: int = DEFAULT_BLOCK_DAYS):
+        self.streams = streams
+        self.generator = generator
+        self.width = width
+        self.block_days = block_days
+        self._block = None
+        self._block_start = -1
+        self._next_start = 0  # 生成器当前位置对应的日期
+
+    def row(self, day: Optional[int] = None) -> np.ndarray:
+        """第 day 天（默认当前日期）的随机数"""
+        if day is None:
+            day = self.streams.day
+        start = day - day % self.block_days
+        if start != self._block_start:
+            if start < self._next_start:
+                raise ValueError(f"第{day}天的随机数已被丢弃")
+            skipped = start - self._next_start
+            if skipped:
+                # 每个双精度随机数消耗生成器的一个输出
+                self.generator.bit_generator.advance(skipped * self.width)
+            self._block = self.generator.random((self.block_days, self.width))
+            self._block_start = start
+            self._next_start = start + self.block_days
+        return self._block[day - start]
+
+
+def uniform(u, low: float, high: float):
+    """把 [0, 1) 均匀随机数映射到 [low, high)"""
+    return low + (high - low) * u
+
+
+def roll(entity, slot: int) -> float:
+    """实体当天第 slot 个随机数；实体没有随机数流时使用全局 random"""
+    draws = entity.draws
+    if draws is None:
+        return random.random()
+    return float(draws.row()[slot])
+
+
+def roll_uniform(entity, slot: int, low: float, high: float) -> float:
+    """同 roll，映射到 [low, high)"""
+    draws = entity.draws
+    if draws is None:
+        return random.uniform(low, high)
+    return uniform(float(draws.row()[slot]), low, high)
+
+
+def roll_index(entity, slot: int, n: int) -> int:
+    """同 roll，映射为 [0, n) 的整数"""
+    draws = entity.draws
+    if draws is None:
+        return random.randrange(n)
+    return min(int(draws.row()[slot] * n), n - 1)
+
+
+def roll_choice(entity, slot: int, options: Sequence):
+    """同 roll，从 options 中选一项"""
+    if entity.draws is None:
+        return random.choice(options)
+    return options[roll_index(entity, slot, len(options))]
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import os
+import tomllib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .city import City
+from .ship import Ship
+from .map import TradeMap
+from .events import WeatherEvent, PirateEvent, CityEvent
+
+# 编译结果的格式版本，修改编译逻辑后加一，旧缓存自动失效
+SCENARIO_FORMAT = 2
+
+# 默认缓存目录，可用环境变量 TRADEWINDS_CACHE 覆盖
+DEFAULT_CACHE_DIR = os.environ.get(
+    "TRADEWINDS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "tradewinds", "scenarios"))
+
+# 事件目录中每类事件的字段（顺序与事件类的构造参数一致）及可选字段
+EVENT_FIELDS = {
+    "weather": (WeatherEvent, ("name", "description", "speed_modifier", "duration"), ()),
+    "pirate": (PirateEvent, ("name", "description", "steal_percent"), ()),
+    "city": (CityEvent, ("name", "description", "price_modifier"), ("affected_goods",)),
+}
+
+# 每个城市按原顺序保存为 (indptr, 商品编号, 数值) 的三个字典
+_CITY_TABLES = ("base_prices", "production", "consumption")
+
+# 场景文件、城市和船只中允许出现的键
+_SCENARIO_KEYS = ("name", "goods", "cities", "ships", "events")
+_CITY_KEYS = ("name",) + _CITY_TABLES + ("specialties", "x", "y")
+_SHIP_KEYS = ("name", "capacity", "speed")
+
+
+def read_scenario(path: str) -> Dict:
+    """读取 JSON 或 TOML 场景文件（按扩展名区分）"""
+    with open(path, "rb") as f:
+        content = f.read()
+    return _parse(path, content)
+
+
+def _parse(path: str, content: bytes) -> Dict:
+    if path.endswith(".toml"):
+        return tomllib.loads(content.decode("utf-8"))
+    if path.endswith(".json"):
+        return json.loads(content.decode("utf-8"))
+    raise ValueError(f"不支持的场景文件格式: {path}（需要 .json 或 .toml）")
+
+
+def build_events(specs: Dict[str, List[Dict]]) -> Dict[str, list]:
+    """由事件描述 {类型: [{字段: 值}]} 创建事件对象"""
+    catalogs = {}
+    for kind, events in specs.items():
+        event_class, required, optional = EVENT_FIELDS[kind]
+        catalogs[kind] = [event_class(*(spec[field] for field in required),
+                                      *(spec[field] for field in optional if field in spec))
+                          for spec in events]
+    return catalogs
+
+
+def event_specs(catalogs: Dict[str, list]) -> Dict[str, List[Dict]]:
+    """build_events 的逆操作：把事件对象转换为可写入文件的描述"""
+    return {kind: [{field: getattr(event, field) for field in EVENT_FIELDS[kind][1] + EVENT_FIELDS[kind][2]}
+                   for event in events]
+            for kind, events in catalogs.items()}
+
+
+def _check(condition: bool, where: str, message: str):
+    if not condition:
+        raise ValueError(f"场景{where}: {message}")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_strings(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+# 事件字段的取值检查：字段 -> (检查函数, 错误信息)
+_EVENT_CHECKS = {
+    "name": (lambda value: isinstance(value, str) and value, "必须是非空字符串"),
+    "description": (lambda value: isinstance(value, str), "必须是字符串"),
+    "speed_modifier": (lambda value: _is_number(value) and value > 0, "必须是正数"),
+    "duration": (lambda value: isinstance(value, int) and not isinstance(value, bool) and value > 0,
+                 "必须是正整数（天数）"),
+    "steal_percent": (lambda value: _is_number(value) and 0 <= value <= 1, "必须是 0 到 1 之间的数"),
+    "price_modifier": (lambda value: _is_number(value) and value > 0, "必须是正数"),
+    "affected_goods": (_is_strings, "必须是字符串列表"),
+}
+
+
+def _check_keys(table: Dict, allowed: Tuple[str, ...], where: str):
+    unknown = [key for key in table if key not in allowed]
+    _check(not unknown, where, f"未知字段 {', '.join(unknown)}（可选: {', '.join(allowed)}）")
+
+
+def _check_goods(goods, known: set, source: str, where: str):
+    unknown = [good for good in goods if good not in known]
+    _check(not unknown, where, f"未知商品 {', '.join(unknown)}（不在{source}中）")
+
+
+def validate_scenario(data: Dict):
+    """检查场景数据的结构和取值，发现问题时抛出 ValueError 并指出位置"""
+    _check(isinstance(data, dict), "", "顶层必须是表/对象")
+    _check_keys(data, _SCENARIO_KEYS, "")
+    _check(isinstance(data.get("name", ""), str), ".name", "必须是字符串")
+    goods = data.get("goods", [])
+    _check(_is_strings(goods), ".goods", "必须是字符串列表")
+
+    cities = data.get("cities")
+    _check(isinstance(cities, list) and cities, ".cities", "至少需要一个城市")
+    for i, city in enumerate(cities):
+        _check(isinstance(city, dict), f".cities[{i}]", "必须是表/对象")
+        _check(isinstance(city.get("base_prices", {}), dict), f".cities[{i}].base_prices", "必须是 {商品: 数值} 表")
+    # 已知商品：给出 goods 列表时以它为准，否则为所有城市定价的商品
+    known = set(goods) if goods else {good for city in cities for good in city.get("base_prices", {})}
+    source = " goods 列表" if goods else "任何城市的 base_prices "
+    names = set()
+    for i, city in enumerate(cities):
+        where = f".cities[{i}]"
+        _check_keys(city, _CITY_KEYS, where)
+        name = city.get("name")
+        _check(isinstance(name, str) and name, where + ".name", "必须是非空字符串")
+        _check(name not in names, where + ".name", f"城市名重复: {name}")
+        names.add(name)
+        for table in _CITY_TABLES:
+            values = city.get(table, {})
+            _check(isinstance(values, dict), f"{where}.{table}", "必须是 {商品: 数值} 表")
+            for good, value in values.items():
+                _check(_is_number(value) and value >= 0, f"{where}.{table}.{good}", "必须是非负数")
+            _check_goods(values, known, source, f"{where}.{table}")
+        _check(city.get("base_prices"), where + ".base_prices", "至少需要一种商品价格")
+        specialties = city.get("specialties", [])
+        _check(_is_strings(specialties), where + ".specialties", "必须是字符串列表")
+        _check_goods(specialties, known, source, where + ".specialties")
+        has_x, has_y = "x" in city, "y" in city
+        _check(has_x == has_y, where, "坐标 x 和 y 必须同时给出")
+        if has_x:
+            _check(_is_number(city["x"]) and _is_number(city["y"]), where, "坐标必须是数值")
+
+    ships = data.get("ships", [])
+    _check(isinstance(ships, list), ".ships", "必须是列表")
+    names = set()
+    for i, ship in enumerate(ships):
+        where = f".ships[{i}]"
+        _check(isinstance(ship, dict), where, "必须是表/对象")
+        _check_keys(ship, _SHIP_KEYS, where)
+        name = ship.get("name")
+        _check(isinstance(name, str) and name, where + ".name", "必须是非空字符串")
+        _check(name not in names, where + ".name", f"船名重复: {name}")
+        names.add(name)
+        for field in ("capacity", "speed"):
+            _check(_is_number(ship.get(field)) and ship[field] > 0, f"{where}.{field}", "必须是正数")
+
+    events = data.get("events", {})
+    _check(isinstance(events, dict), ".events", "必须是表/对象")
+    for kind, catalog in events.items():
+        _check(kind in EVENT_FIELDS, f".events.{kind}", f"未知的事件类型，可选: {', '.join(EVENT_FIELDS)}")
+        _check(isinstance(catalog, list) and catalog, f".events.{kind}", "必须是非空列表")
+        _, required, optional = EVENT_FIELDS[kind]
+        for i, event in enumerate(catalog):
+            where = f".events.{kind}[{i}]"
+            _check(isinstance(event, dict), where, "必须是表/对象")
+            missing = [field for field in required if field not in event]
+            _check(not missing, where, f"缺少字段 {', '.join(missing)}")
+            unknown = [field for field in event if field not in required + optional]
+            _check(not unknown, where, f"未知字段 {', '.join(unknown)}")
+            for field, value in event.items():
+                valid, message = _EVENT_CHECKS[field]
+                _check(valid(value), f"{where}.{field}", message)
+            if "affected_goods" in event:
+                _check_goods(event["affected_goods"], known, source, where + ".affected_goods")
+
+
+class CompiledScenario:
+    """
+    编译后的场景
+
+    名称保存为列表，城市的价格、产量、消费量和特产保存为按城市分段的数组
+    （indptr[i]:indptr[i+1] 是第 i 个城市的条目，保持文件中的顺序），
+    船只参数和城市坐标保存为数组。可以保存为 .npz 文件，也可以 pickle 后传给工作进程；
+    调用对象本身返回新建的 (城市列表, 船只列表)，可直接作为 EnsembleRunner 的 scenario。
+    """
+
+    def __init__(self, name: str, goods: List[str], all_goods: List[str], city_names: List[str],
+                 ship_names: List[str], arrays: Dict[str, np.ndarray], events: Dict[str, List[Dict]]):
+        """
+        :param goods: 场景声明的商品列表
+        :param all_goods: 商品编号对应的名称（声明的商品在前，之后是其他地方出现的商品）
+        """
+        self.name = name
+        self.goods = goods
+        self.all_goods = all_goods
+        self.city_names = city_names
+        self.ship_names = ship_names
+        self.arrays = arrays
+        self.event_specs = events
+
+    # ---- 构建 ----
+
+    def _city_table(self, table: str, i: int) -> Dict[str, float]:
+        indptr = self.arrays[table + "/indptr"]
+        lo, hi = indptr[i], indptr[i + 1]
+        return dict(zip((self.all_goods[g] for g in self.arrays[table + "/goods"][lo:hi].tolist()),
+                        self.arrays[table + "/values"][lo:hi].tolist()))
+
+    def build(self, vectorized: bool = False) -> Tuple[List[City], List[Ship]]:
+        """
+        新建城市和船只
+        :param vectorized: 城市是否使用数组市场引擎
+        """
+        arrays = self.arrays
+        cities = []
+        indptr = arrays["specialties/indptr"]
+        specialty_goods = arrays["specialties/goods"].tolist()
+        for i, name in enumerate(self.city_names):
+            city = City(name, *(self._city_table(table, i) for table in _CITY_TABLES), vectorized=vectorized)
+            if arrays["specialties/given"][i]:
+                city.specialty_goods = {self.all_goods[g] for g in specialty_goods[indptr[i]:indptr[i + 1]]}
+            cities.append(city)
+        ships = [Ship(name, capacity=capacity, speed=speed)
+                 for name, capacity, speed in zip(self.ship_names, arrays["ships/capacity"].tolist(),
+                                                  arrays["ships/speed"].tolist())]
+        return cities, ships
+
+    def __call__(self) -> Tuple[List[City], List[Ship]]:
+        return self.build()
+
+    def events(self) -> Dict[str, list]:
+        """场景定义的事件目录 {类型: 事件对象列表}，未定义的类型使用模拟的默认目录"""
+        return build_events(self.event_specs)
+
+    def trade_map(self, route_neighbors: Optional[int] = None) -> Optional[TradeMap]:
+        """按场景坐标生成贸易地图，场景没有坐标时返回None（由模拟自动布局）"""
+        coords = self.arrays.get("cities/coords")
+        if coords is None:
+            return None
+        trade_map = TradeMap()
+        for name, (x, y) in zip(self.city_names, coords.tolist()):
+            trade_map.add_city(name, x, y)
+        if route_neighbors is not None:
+            trade_map.generate_knn_routes(route_neighbors)
+        else:
+            trade_map.generate_distances()
+        return trade_map
+
+    def simulation(self, vectorized: bool = False, **kwargs):
+        """
+        用场景新建一个模拟
+        :param kwargs: 传给 TradeSimulation 的其他参数
+        """
+        from .simulation.core import TradeSimulation
+        cities, ships = self.build(vectorized)
+        if "trade_map" not in kwargs:
+            kwargs["trade_map"] = self.trade_map(kwargs.get("route_neighbors"))
+        return TradeSimulation(cities, ships, events=self.events(), **kwargs)
+
+    # ---- 存取 ----
+
+    def save(self, path: str):
+        """保存为 .npz（名称和事件放在头信息中，不需要 pickle）"""
+        header = {"format": SCENARIO_FORMAT, "name": self.name, "goods": self.goods, "all_goods": self.all_goods,
+                  "city_names": self.city_names, "ship_names": self.ship_names, "events": self.event_specs}
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, header=np.array(json.dumps(header, ensure_ascii=False)), **self.arrays)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledScenario':
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data["header"]))
+            arrays = {key: data[key] for key in data.files if key != "header"}
+        if header.get("format") != SCENARIO_FORMAT:
+            raise ValueError(f"编译场景的格式版本不符: {path}")
+        return cls(header["name"], header["goods"], header["all_goods"], header["city_names"],
+                   header["ship_names"], arrays, header["events"])
+
+
+def compile_scenario(data: Dict) -> CompiledScenario:
+    """检查并编译场景数据"""
+    validate_scenario(data)
+    goods = list(data.get("goods", []))
+    all_goods = list(dict.fromkeys(goods))
+    ids = {good: i for i, good in enumerate(all_goods)}
+
+    def good_id(good: str) -> int:
+        if good not in ids:
+            ids[good] = len(all_goods)
+            all_goods.append(good)
+        return ids[good]
+
+    cities = data["cities"]
+    arrays = {}
+    for table in _CITY_TABLES:
+        entries = [city.get(table, {}) for city in cities]
+        arrays[table + "/indptr"] = np.cumsum([0] + [len(e) for e in entries]).astype(np.int64)
+        arrays[table + "/goods"] = np.array([good_id(g) for e in entries for g in e], dtype=np.int32)
+        arrays[table + "/values"] = np.array([v for e in entries for v in e.values()], dtype=float)
+    specialties = [city.get("specialties", []) for city in cities]
+    arrays["specialties/indptr"] = np.cumsum([0] + [len(s) for s in specialties]).astype(np.int64)
+    arrays["specialties/goods"] = np.array([good_id(g) for s in specialties for g in s], dtype=np.int32)
+    arrays["specialties/given"] = np.array(["specialties" in city for city in cities], dtype=bool)
+    if all("x" in city for city in cities):
+        arrays["cities/coords"] = np.array([(city["x"], city["y"]) for city in cities], dtype=float)
+    ships = data.get("ships", [])
+    arrays["ships/capacity"] = np.array([ship["capacity"] for ship in ships], dtype=float)
+    arrays["ships/speed"] = np.array([ship["speed"] for ship in ships], dtype=float)
+
+    return CompiledScenario(data.get("name", ""), goods, all_goods, [city["name"] for city in cities],
+                            [ship["name"] for ship in ships], arrays, data.get("events", {}))
+
+
+def scenario_hash(content: bytes) -> str:
+    """场景文件内容和编译格式版本的哈希，作为缓存键"""
+    return hashlib.sha256(b"tradewinds-scenario-%d\0" % SCENARIO_FORMAT + content).hexdigest()
+
+
+def load_scenario(path: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> CompiledScenario:
+    """
+    读取并编译场景文件
+    编译结果按文件内容的哈希缓存在 cache_dir 中，内容不变时直接读取缓存，跳过解析和检查
+    :param cache_dir: 缓存目录，None表示不使用缓存
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, scenario_hash(content) + ".npz")
+        if os.path.exists(cache_path):
+            try:
+                return CompiledScenario.load(cache_path)
+            except (OSError, ValueError, KeyError):
+                pass  # 缓存损坏或版本不符时重新编译
+    scenario = compile_scenario(_parse(path, content))
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        scenario.save(cache_path)
+    return scenario
+
+
+def write_scenario(data: Dict, path: str):
+    """把场景数据写成 JSON 文件（TOML 只支持读取）"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
@@ -1,11 +1,28 @@
+import math
 from typing import Dict, Tuple, List, Optional
 # 从 .city 导入 City 以进行类型提示，避免循环导入
 from typing import TYPE_CHECKING
+
+from .ledger import TradeLedger, GoldHistory, KIND_BUY, KIND_SELL
+from .fleet import FLEET_FIELDS, FleetField, FleetCityField
 if TYPE_CHECKING:
     from .city import City
     from .map import TradeMap
+    from .fleet import Fleet
 
 class Ship:
+    # 数值状态和位置在加入船队后保存在 Fleet 的数组中
+    gold = FleetField()
+    capacity = FleetField()
+    speed = FleetField()
+    days_in_transit = FleetField()
+    travel_time = FleetField()
+    in_transit = FleetField()
+    sailing_skill = FleetField()
+    trading_skill = FleetField()
+    current_city = FleetCityField("location")
+    destination = FleetCityField("destination")
+
     def __init__(self, name: str, capacity: float, speed: float):
         """
         初始化一艘船
@@ -14,6 +31,8 @@ class Ship:
         :param speed: 航行速度(基础城市间移动速度，受风向和海况影响)
         """
         self.name = name
+        self.fleet = None  # type: 'Fleet | None'
+        self.slot = -1     # 在船队数组中的下标
         self.capacity = capacity
         self.speed = speed
         # 修改货物存储结构为 {商品名: {质量等级: 数量}}
@@ -24,10 +43,11 @@ class Ship:
         self.days_in_transit = 0
         self.travel_time = 0      # 当前航程总需时间
         self.gold = 1000          # 初始资金
-        self.trade_history = []
-        self.gold_history = []
-        self.route_costs = []     # 航线成本历史
+        # 交易、航线和资金记录写入账本（加入模拟后改为共享账本）
+        self.ledger = TradeLedger(capacity=64)
+        self.gold_history = GoldHistory(self)
         self.in_transit = False   # 是否在航行状态
+        self.draws = None         # 按日预抽的随机数流（由设置了种子的模拟设置）
         # 增加质量偏好，有些船只偏好高质量，有些偏好低价
         self.quality_preference = "价格" if name.endswith(("号", "Lion")) else "质量"
         
@@ -49,8 +69,7 @@ class Ship:
         :return: 实际装载数量
         """
         # 检查总载货量
-        total_amount = sum(sum(qualities.values()) for qualities in self.cargo_by_quality.values())
-        available_space = self.capacity - total_amount
+        available_space = self.capacity - self.used_capacity
         actual_amount = min(amount, available_space)
         
         if actual_amount <= 0:
@@ -69,20 +88,14 @@ class Ship:
             
         # 更新总数量
         self.cargo[good] += actual_amount
+        self._add_used_capacity(actual_amount)
         
         # 计算成本
         cost = actual_amount * price
         self.gold -= cost
         
         # 记录交易
-        self.trade_history.append({
-            "type": "buy",
-            "good": good,
-            "quality": quality,
-            "amount": actual_amount,
-            "price": price,
-            "location": self.current_city.name if self.current_city else "Unknown"
-        })
+        self.ledger.record_trade(self.name, KIND_BUY, good, quality, actual_amount, price, self._location())
         
         return actual_amount
     
@@ -107,18 +120,12 @@ class Ship:
                 self.gold += revenue
                 
                 # 记录交易
-                self.trade_history.append({
-                    "type": "sell",
-                    "good": good,
-                    "quality": quality,
-                    "amount": amount,
-                    "price": price,
-                    "location": self.current_city.name if self.current_city else "Unknown"
-                })
+                self.ledger.record_trade(self.name, KIND_SELL, good, quality, amount, price, self._location())
                 
                 # 更新库存
                 self.cargo[good] -= amount
                 self.cargo_by_quality[good][quality] = 0
+                self._add_used_capacity(-amount)
                 
                 return revenue
         else:
@@ -130,63 +137,52 @@ class Ship:
                     total_revenue += revenue
                     
                     # 记录交易
-                    self.trade_history.append({
-                        "type": "sell",
-                        "good": good,
-                        "quality": q,
-                        "amount": amount,
-                        "price": price,
-                        "location": self.current_city.name if self.current_city else "Unknown"
-                    })
+                    self.ledger.record_trade(self.name, KIND_SELL, good, q, amount, price, self._location())
                     
                     # 更新库存
                     self.cargo_by_quality[good][q] = 0
+                    self._add_used_capacity(-amount)
             
             # 重置总量
             self.cargo[good] = 0
             
             return total_revenue
     
-    def set_route(self, current_city: 'City', destination: 'City', trade_map: 'TradeMap'):
+    def set_route(self, current_city: 'City', destination: 'City', trade_map: 'TradeMap',
+                  travel_time: Optional[float] = None) -> bool:
         """
         设置航线并计算航行时间和成本
         :param trade_map: 贸易地图，用于计算航行时间和成本
+        :param travel_time: 调用方已算好的航行时间（如计入天气影响），为None时按地图计算
+        :return: 目的地经航线不可达（航行时间或成本为无穷大）时不改变船只状态，返回False
         """
-        self.current_city = current_city
-        self.destination = destination
-        self.days_in_transit = 0
-        self.in_transit = True  # 设置为航行状态
-        
         # 计算航行时间
-        travel_time = trade_map.calculate_travel_time(
-            current_city.name, destination.name, self.speed * self.sailing_skill
-        )
-        self.travel_time = travel_time
+        if travel_time is None:
+            travel_time = trade_map.calculate_travel_time(
+                current_city.name, destination.name, self.speed * self.sailing_skill
+            )
         
-        # 计算并扣除航线成本
+        # 计算航线成本
         route_cost = trade_map.calculate_route_cost(
             current_city.name, destination.name, self.size
         )
+        if not (math.isfinite(travel_time) and math.isfinite(route_cost)):
+            return False
+        
+        self.current_city = current_city
+        self.destination = destination
+        self.days_in_transit = 0
+        self.in_transit = True  # 设置为航行状态
+        self.travel_time = travel_time
         
         # 交易技巧降低成本
         route_cost = route_cost / self.trading_skill
         
         self.gold -= route_cost
-        self.route_costs.append({
-            'from': current_city.name,
-            'to': destination.name,
-            'cost': route_cost,
-            'day': 0  # 将在update时更新为实际日期
-        })
         
-        # 记录航行信息
-        self.trade_history.append({
-            "type": "route",
-            "from": current_city.name,
-            "to": destination.name,
-            "estimated_days": travel_time,
-            "cost": route_cost
-        })
+        # 记录航行信息（出发日期由账本记录）
+        self.ledger.record_route(self.name, current_city.name, destination.name, travel_time, route_cost)
+        return True
     
     def update(self) -> bool:
         """
@@ -199,10 +195,6 @@ class Ship:
         
         self.days_in_transit += 1
         
-        # 更新最近一次航行成本记录的天数
-        if self.route_costs:
-            self.route_costs[-1]['day'] += 1
-        
         if self.days_in_transit >= self.travel_time:
             self.current_city = self.destination
             self.destination = None
@@ -238,7 +230,7 @@ class Ship:
             "name": self.name,
             "gold": self.gold,
             "capacity": self.capacity,
-            "used_capacity": sum(sum(qualities.values()) for qualities in self.cargo_by_quality.values()),
+            "used_capacity": self.used_capacity,
             "speed": self.speed,
             "crew": self.crew_count,
             "location": self.current_city.name if self.current_city else "在海上",
@@ -250,4 +242,46 @@ class Ship:
     
     def get_total_route_costs(self) -> float:
         """获取历史总航线成本"""
-        return sum(record['cost'] for record in self.route_costs) 
\ No newline at end of file
+        return self.ledger.total_route_cost(self.name)
+    
+    @property
+    def trade_history(self) -> List[Dict]:
+        """交易和航线记录（从账本导出）"""
+        return self.ledger.trade_history(self.name)
+    
+    @property
+    def route_costs(self) -> List[Dict]:
+        """航线成本历史（从账本导出）"""
+        return self.ledger.route_costs(self.name)
+    
+    def attach_ledger(self, ledger: TradeLedger):
+        """改用共享账本，已有的记录一并迁移"""
+        if ledger is self.ledger:
+            return
+        ledger.copy_ship_records(self.ledger, self.name)
+        self.ledger = ledger
+    
+    @property
+    def used_capacity(self) -> float:
+        """已用舱位"""
+        if self.fleet is None:
+            return sum(sum(qualities.values()) for qualities in self.cargo_by_quality.values())
+        return self.fleet.used_capacity[self.slot].item()
+    
+    def _add_used_capacity(self, amount: float):
+        if self.fleet is not None:
+            self.fleet.used_capacity[self.slot] += amount
+    
+    def attach_fleet(self, fleet: 'Fleet', slot: int):
+        """加入船队，当前状态迁移到船队数组的第 slot 格"""
+        values = {name: getattr(self, name) for name, _ in FLEET_FIELDS}
+        current_city, destination = self.current_city, self.destination
+        self.fleet = fleet
+        self.slot = slot
+        for name, value in values.items():
+            getattr(fleet, name)[slot] = value
+        self.current_city = current_city
+        self.destination = destination
+    
+    def _location(self) -> Optional[str]:
+        return self.current_city.name if self.current_city else None
\ No newline at end of file
@@ -0,0 +1,160 @@
+from collections import namedtuple
+from typing import Dict, List
+
+import numpy as np
+
+from ..market import QUALITY_INDEX, QUALITY_ORDER
+from ..rng import SHIP_DESTINATION, roll_choice
+from .cargo import _read_stock, plan_cargo
+from . import trading
+from .trading import _destination_candidates
+
+# 一张买单：船只、商品、质量、数量（已按资金和舱位限制）和单价
+BuyOrder = namedtuple("BuyOrder", "ship good quality amount price")
+
+
+def batch_trade(simulation, ships):
+    """
+    集中交易：停靠的船只按所在城市分组，每个城市当天一次撮合
+    所有船只基于同一份价格和库存做决策，买入超过库存时按各自的需求量等比例分配，
+    而不是由处理顺序在前的船只先买走
+    """
+    ports: Dict[str, List] = {}
+    for ship in ships:
+        if ship.current_city:
+            ports.setdefault(ship.current_city.name, []).append(ship)
+    for city_name, group in ports.items():
+        clear_port(simulation, simulation.cities[city_name], group)
+
+
+def clear_port(simulation, city, ships) -> List[float]:
+    """
+    一个城市当天的集中撮合
+    1. 各船只按交易前的价格和库存选定商品、质量和目的地（启用装货规划时在卖出后规划多种商品）
+    2. 卖出全部货物（城市按当前价格收购，货物按质量加入库存）
+    3. 买单按 商品×质量 汇总，与库存一次撮合：需求不超过库存的全部成交，超过的等比例成交
+    4. 成交的船只前往目的地，没有成交的随机选择下一个城市
+    :return: 各船只的买入成交量
+    """
+    other_cities = _destination_candidates(simulation, city)
+    if not other_cities:  # 如果只有一个城市
+        return [0.0] * len(ships)
+    decisions = None
+    if not simulation.cargo_planner:
+        # 经模块调用，性能分析对 trading._find_best_trade 的计数包装才能生效
+        decisions = [trading._find_best_trade(simulation, ship, city, other_cities) for ship in ships]
+
+    # 卖单：城市收购全部货物
+    sold = []
+    for ship in ships:
+        for good, qualities in ship.cargo_by_quality.items():
+            sold.extend((good, quality, amount) for quality, amount in qualities.items() if amount > 0)
+        has_cargo_sold = False
+        for good in list(ship.cargo.keys()):
+            if ship.cargo[good] > 0:
+                ship.unload_cargo(good, city.current_prices[good])
+                has_cargo_sold = True
+        if has_cargo_sold:
+            ship.gold_history.append(ship.gold)
+
+    # 买单：每艘船一张，使用装货规划时每艘船按计划可以有多张
+    orders = []
+    destinations = []
+    for ship, decision in zip(ships, decisions or [None] * len(ships)):
+        destination, ship_orders = _buy_orders(simulation, ship, city, other_cities, decision)
+        destinations.append(destination)
+        orders.extend(ship_orders)
+
+    fills = _match(city, sold, orders)
+
+    filled = {}
+    for order, fill in zip(orders, fills.tolist()):
+        if fill <= 0:
+            continue
+        loaded_amount = order.ship.load_cargo(order.good, fill, order.price, order.quality)
+        if loaded_amount > 0:
+            filled[order.ship.name] = filled.get(order.ship.name, 0.0) + loaded_amount
+    for ship, destination in zip(ships, destinations):
+        if ship.name in filled:
+            # 记录资金历史
+            ship.gold_history.append(ship.gold)
+            if ship.set_route(city, destination, simulation.trade_map):
+                continue
+        # 没有成交或目的地不可达时随机选择下一个城市
+        next_city_name = roll_choice(ship, SHIP_DESTINATION, other_cities)
+        ship.set_route(city, simulation.cities[next_city_name], simulation.trade_map)
+    return [filled.get(ship.name, 0.0) for ship in ships]
+
+
+def _buy_orders(simulation, ship, city, other_cities, decision):
+    """
+    船只的买单和目的地
+    :param decision: _find_best_trade 的结果；为None时使用装货规划
+    :return: (目的地城市, [BuyOrder])
+    """
+    if decision is None:
+        plan = plan_cargo(simulation, ship, city, other_cities)
+        if plan is None:
+            return None, []
+        return plan.destination, [BuyOrder(ship, good, quality, amount, price)
+                                  for good, quality, amount, price in plan.items]
+    best_buy, best_destination, best_quality = decision
+    if not (best_buy and best_destination):
+        return None, []
+    price = city.get_quality_price(best_buy, best_quality)
+    if price <= 0:
+        return None, []
+    # 用50%的资金，不超过空余舱位
+    amount = min(ship.gold * 0.5 / price, ship.capacity - ship.used_capacity)
+    return best_destination, [BuyOrder(ship, best_buy, best_quality, amount, price)] if amount > 0 else []
+
+
+def _match(city, sold, orders: List[BuyOrder]) -> np.ndarray:
+    """
+    把卖出的货物加入库存，再按 商品×质量 撮合全部买单
+    :param sold: [(商品, 质量, 数量)]
+    :return: 各买单的成交量
+    """
+    goods = list(dict.fromkeys([good for good, _, _ in sold] + [order.good for order in orders]))
+    if not goods:
+        return np.zeros(0)
+    good_index = {good: i for i, good in enumerate(goods)}
+    cells = len(goods) * len(QUALITY_ORDER)
+
+    change = np.zeros(cells)
+    if sold:
+        sold_keys = np.array([good_index[good] * len(QUALITY_ORDER) + QUALITY_INDEX[quality]
+                              for good, quality, _ in sold])
+        change += np.bincount(sold_keys, weights=[amount for _, _, amount in sold], minlength=cells)
+
+    fills = np.zeros(len(orders))
+    if orders:
+        supply = _read_stock(city, goods).ravel() + change
+        keys = np.array([good_index[order.good] * len(QUALITY_ORDER) + QUALITY_INDEX[order.quality]
+                         for order in orders])
+        amounts = np.array([order.amount for order in orders])
+        demand = np.bincount(keys, weights=amounts, minlength=cells)
+        # 各格的成交比例：库存充足时全部成交，不足时按需求等比例分配
+        ratio = np.divide(np.maximum(supply, 0.0), demand, out=np.ones(cells), where=demand > 0)
+        ratio = np.minimum(ratio, 1.0)
+        fills = amounts * ratio[keys]
+        change -= demand * ratio
+
+    _apply_stock_change(city, goods, change.reshape(len(goods), len(QUALITY_ORDER)))
+    return fills
+
+
+def _apply_stock_change(city, goods: List[str], change: np.ndarray):
+    """把 商品×质量 的库存变化写回城市，同时更新总库存"""
+    if city.market is not None:
+        market = city.market
+        rows = np.array([market.index[good] for good in goods])
+        market.stock[rows] = np.maximum(market.stock[rows] + change, 0.0)
+        market.total[rows] = market.stock[rows].sum(axis=1)
+        return
+    for good, row in zip(goods, change.tolist()):
+        qualities = city.inventory_by_quality[good]
+        for quality, amount in zip(QUALITY_ORDER, row):
+            if amount:
+                qualities[quality] = max(0.0, qualities[quality] + amount)
+        city.inventory[good] = max(0.0, city.inventory[good] + sum(row))
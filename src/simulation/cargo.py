@@ -0,0 +1,115 @@
+from collections import namedtuple
+from typing import List, Optional
+
+import numpy as np
+
+from ..city import QUALITY_LEVELS
+from ..market import QUALITY_ORDER
+
+# 装货计划：目的地城市、各项 (商品, 质量, 数量, 单价) 和扣除航线成本后的预期利润
+CargoPlan = namedtuple("CargoPlan", "destination items margin")
+
+# 各质量等级的价格倍率，顺序同 QUALITY_ORDER
+QUALITY_FACTORS = np.array([QUALITY_LEVELS[quality] for quality in QUALITY_ORDER])
+
+
+def plan_cargo(simulation, ship, city, other_cities: List[str], budget_share: float = 0.9,
+               max_destinations: int = 4) -> Optional[CargoPlan]:
+    """
+    为停靠的船只规划多商品装货：在资金和舱位两个限制下，对所有 (商品, 质量) 一次做分数背包贪心，
+    选出每航行一天预期利润（扣除航线成本）最高的目的地和装货清单
+    预期卖价按目的地的当前价格计算（卸货时不区分质量，与 _find_best_trade 的假设一致）。
+    :param budget_share: 用于买货的资金比例（先扣除前往该目的地的航线成本）
+    :param max_destinations: 按单件最高利润率预选的目的地数量
+    :return: 没有有利可图的装货方案时返回None
+    """
+    index = simulation.price_index
+    sell = index.price_rows(other_cities)
+    row = index.city_index[city.name]
+    cols = np.flatnonzero(index.listed[row])
+    if not len(cols) or not len(other_cities):
+        return None
+    base = index.prices[row, cols]
+    goods = [index.goods[col] for col in cols]
+    sell = sell[:, cols]
+    sell[np.isnan(sell)] = -np.inf  # 目的地不交易的商品
+
+    # 预选目的地：单件普通质量商品的最高利润率
+    best_ratio = (sell / base).max(axis=1)
+    if len(other_cities) > max_destinations:
+        chosen = np.argpartition(-best_ratio, max_destinations - 1)[:max_destinations]
+    else:
+        chosen = np.arange(len(other_cities))
+    chosen = chosen[best_ratio[chosen] * (1 / QUALITY_FACTORS.min()) > 1]
+    if not len(chosen):
+        return None
+
+    prices = (base[:, None] * QUALITY_FACTORS).ravel()                          # 商品×质量
+    available = np.maximum(_read_stock(city, goods), 0.0).ravel()
+    margins = sell[chosen][:, :, None] - prices.reshape(len(goods), -1)[None]
+    margins = margins.reshape(len(chosen), -1)                                   # 目的地×(商品×质量)
+    amounts = np.where((margins > 0) & (available > 0), available, 0.0)
+
+    space = ship.capacity - ship.used_capacity
+    if space <= 0:
+        return None
+    destinations = [other_cities[i] for i in chosen.tolist()]
+    trade_map = simulation.trade_map
+    route_costs = trade_map.route_costs_from(city.name, destinations, ship.size) / ship.trading_skill
+    travel_times = trade_map.travel_times_from(city.name, destinations, ship.speed * ship.sailing_skill)
+    budgets = np.maximum(ship.gold * budget_share - route_costs, 0.0)
+
+    # 按"利润 / 折算资源占用"排序：单位货物占用的资金和舱位分别按该目的地的资金上限和空余舱位折算，
+    # 资金紧张时接近按每金币利润排序，舱位紧张时接近按每单位舱位利润排序
+    with np.errstate(divide="ignore", invalid="ignore"):
+        keys = np.where(amounts > 0, margins / (prices / budgets[:, None] + 1.0 / space), -np.inf)
+    order, take = _greedy_fill(keys, amounts, prices, budgets, space)
+    rows = np.arange(len(chosen))[:, None]
+    profit = np.where(take > 0, take * margins[rows, order], 0.0).sum(axis=1) - route_costs
+    # 航程长短不同，按每天的预期利润选择目的地
+    best = int(np.argmax(profit / travel_times))
+    if profit[best] <= 0:
+        return None
+    picked = np.flatnonzero(take[best] > 1e-9)
+    items = [(goods[i // len(QUALITY_ORDER)], QUALITY_ORDER[i % len(QUALITY_ORDER)], amount, float(prices[i]))
+             for i, amount in zip(order[best, picked].tolist(), take[best, picked].tolist())]
+    return CargoPlan(simulation.cities[destinations[best]], items, float(profit[best]))
+
+
+def _greedy_fill(keys: np.ndarray, amounts: np.ndarray, prices: np.ndarray, budgets: np.ndarray, space: float):
+    """
+    每行（目的地）按 keys 从高到低依次装货，资金或舱位用完时最后一项只装一部分，所有行一次完成
+    :param budgets: 每行的资金上限
+    :return: (每行的装货顺序, 按该顺序排列的装货量)
+    """
+    order = np.argsort(-keys, axis=1)
+    amount = amounts[np.arange(len(keys))[:, None], order]
+    price = prices[order]
+    cost = amount * price
+    spent_before = np.cumsum(cost, axis=1) - cost
+    used_before = np.cumsum(amount, axis=1) - amount
+    take = np.minimum(np.minimum(amount, (budgets[:, None] - spent_before) / price), space - used_before)
+    return order, np.maximum(take, 0.0)
+
+
+def _read_stock(city, goods: List[str]) -> np.ndarray:
+    """城市中这些商品的 商品×质量 库存"""
+    if city.market is not None:
+        market = city.market
+        return market.stock[[market.index[good] for good in goods]]
+    return np.array([[city.inventory_by_quality[good][quality] for quality in QUALITY_ORDER] for good in goods])
+
+
+def load_plan(ship, city, plan: CargoPlan, trade_map) -> bool:
+    """
+    按计划装货并出发前往目的地
+    :return: 装到货物并出发时返回True（目的地不可达时货物留在船上，由调用方另选港口）
+    """
+    loaded = 0.0
+    for good, quality, amount, price in plan.items:
+        loaded += ship.load_cargo(good, amount, price, quality)
+    if loaded <= 0:
+        return False
+    # 记录资金历史
+    ship.gold_history.append(ship.gold)
+    return ship.set_route(city, plan.destination, trade_map)
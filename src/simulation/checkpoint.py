@@ -0,0 +1,585 @@
+import heapq
+import json
+import os
+import random
+import struct
+import tempfile
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..city import City
+from ..fleet import FLEET_FIELDS
+from ..history import DEFAULT_HISTORY_DAYS, RingBuffer
+from ..map import TradeMap, _EDGE_ARRAYS
+from ..market import QUALITY_ORDER, QUALITY_INDEX
+from ..scenario import build_events, event_specs
+from ..ship import Ship
+from .scheduler import EventScheduler, PHASE_SHIP, PHASE_CITY_EVENT, PHASE_PIRATE
+
+# 文件格式：魔数、头信息长度（8字节小端）、JSON 头信息，之后是按 64 字节对齐的原始数组数据。
+# 头信息记录每个数组的类型、形状和相对数据区起点的偏移，读取时整个文件只做一次内存映射。
+MAGIC = b"TRADESIM"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_arrays(path: str, header: Dict, arrays: Dict[str, np.ndarray]):
+    """
+    把头信息和若干数组写入一个文件
+    先写入临时文件再替换原文件，写入中途崩溃不会破坏上一个检查点，
+    已经映射旧文件的进程也不受影响
+    """
+    layout = {}
+    contiguous = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        contiguous[name] = array
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    encoded = json.dumps(dict(header, arrays=layout), ensure_ascii=False).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(encoded))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(encoded)))
+        f.write(encoded)
+        for name, array in contiguous.items():
+            if array.nbytes:
+                f.seek(data_start + layout[name]["offset"])
+                f.write(array.data)
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_arrays(path: str, mode: str = "c") -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    读取 write_arrays 写入的文件
+    :param mode: 内存映射模式，默认 "c"（写时复制：修改只影响本进程，不写回文件）
+    :return: (头信息, {名称: 映射到文件的数组})
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是检查点文件: {path}")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length).decode("utf-8"))
+    data_start = _align(len(MAGIC) + 8 + length)
+    buffer = np.memmap(path, dtype=np.uint8, mode=mode)
+    arrays = {}
+    for name, spec in header.pop("arrays").items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        start = data_start + spec["offset"]
+        size = int(np.prod(shape)) * dtype.itemsize
+        arrays[name] = buffer[start:start + size].view(dtype).reshape(shape)
+    return header, arrays
+
+
+# ---- 随机数状态 ----
+
+def _python_random_state(state=None) -> List:
+    version, internal, gauss = state if state is not None else random.getstate()
+    return [version, list(internal), gauss]
+
+
+def _to_python_random_state(state: List) -> Tuple:
+    return state[0], tuple(state[1]), state[2]
+
+
+def _rng_state(rng: Optional[np.random.Generator]) -> Optional[Dict]:
+    return None if rng is None else rng.bit_generator.state
+
+
+def _restore_rng(rng: Optional[np.random.Generator], state: Optional[Dict]) -> Optional[np.random.Generator]:
+    """恢复生成器状态（原地修改已有生成器，使共享它的对象保持一致）"""
+    if state is None:
+        return rng
+    if rng is None or type(rng.bit_generator).__name__ != state["bit_generator"]:
+        rng = np.random.Generator(getattr(np.random, state["bit_generator"])())
+    rng.bit_generator.state = state
+    return rng
+
+
+# ---- 保存 ----
+
+class _Names:
+    """名称到编号的映射，用于把字典键保存为整数数组"""
+
+    def __init__(self, names: Optional[List[str]] = None):
+        self.names = list(names or [])
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+    def id(self, name: str) -> int:
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+
+def _save_ring(name: str, ring: RingBuffer, arrays: Dict) -> List[int]:
+    data, next_index, count = ring.get_state()
+    arrays[name] = data
+    return [next_index, count]
+
+
+def _restore_ring(name: str, ring: RingBuffer, arrays: Dict, state: List[int]):
+    ring.set_state(arrays[name], *state)
+
+
+def save_checkpoint(simulation, path: str):
+    """把模拟的全部状态写入一个检查点文件"""
+    arrays = {}
+    goods = _Names()
+    city_ids = {name: i for i, name in enumerate(simulation.city_names)}
+    header = {
+        "format": FORMAT_VERSION,
+        "simulation": _save_simulation(simulation, arrays),
+        "cities": [_save_city(f"city/{i}/", city, arrays, goods)
+                   for i, city in enumerate(simulation.cities.values())],
+        "ships": _save_ships(simulation, arrays, goods, city_ids),
+        "map": _save_map(simulation.trade_map, arrays),
+        "events": event_specs({"weather": simulation.weather_events, "pirate": simulation.pirate_events,
+                               "city": simulation.city_events}),
+        "ledger": _save_ledger(simulation.ledger, arrays),
+        "event_log": _save_event_log(simulation.event_log, arrays),
+    }
+    if simulation.market is not None:
+        header["market"] = _save_world(simulation.market, arrays)
+    scheduler = simulation._scheduler
+    if scheduler is not None and scheduler.resume_day == simulation.day:
+        header["scheduler"] = _save_scheduler(scheduler)
+    header["goods"] = goods.names
+    write_arrays(path, header, arrays)
+
+
+def _save_simulation(simulation, arrays: Dict) -> Dict:
+    arrays["simulation/currency_supply_history"] = np.asarray(simulation.currency_supply_history, dtype=float)
+    arrays["simulation/global_inflation_history"] = np.asarray(simulation.global_inflation_history, dtype=float)
+    streams = simulation.streams
+    return {
+        "day": simulation.day,
+        "currency_supply": simulation.currency_supply,
+        "global_inflation_rate": simulation.global_inflation_rate,
+        "options": {
+            "world_market": simulation.market is not None,
+            "history_days": simulation.market.history_days if simulation.market is not None else DEFAULT_HISTORY_DAYS,
+            "event_log_size": simulation.event_log.max_records,
+            "fleet": simulation.fleet is not None,
+            "route_neighbors": simulation.route_neighbors,
+            "destination_limit": simulation.destination_limit,
+            "destination_radius": simulation.destination_radius,
+            "batch_trading": simulation.batch_trading,
+            "cargo_planner": simulation.cargo_planner,
+            "strategy": simulation.strategy.name if simulation.strategy is not None else None,
+            "seed": int(streams.seed_sequence.entropy) if streams is not None else None,
+        },
+        "random_state": _python_random_state(),
+        "currency_rng": _rng_state(simulation._currency_rng),
+        "scheduler_rng": _rng_state(simulation._scheduler_rng),
+        "market_rng": _rng_state(simulation.market.rng) if simulation.market is not None else None,
+        "fleet_rng": _rng_state(simulation.fleet.rng) if simulation.fleet is not None else None,
+    }
+
+
+def _save_city(prefix: str, city: City, arrays: Dict, goods: _Names) -> Dict:
+    market = city.market
+    vectorized = market is not None and market.world is None
+    meta = {
+        "name": city.name,
+        "base_prices": city.base_prices,
+        "production": city.production,
+        "consumption": city.consumption,
+        "vectorized": vectorized,
+        "specialty_goods": list(city.specialty_goods),
+        "currency_name": city.currency_name,
+    }
+    if market is None:
+        meta["inflation_rate"] = city.inflation_rate
+        meta["currency_value"] = city.currency_value
+        arrays[prefix + "prices"] = np.array([city.current_prices[good] for good in city.base_prices], dtype=float)
+        # 库存字典按插入顺序保存为编号和数量数组
+        arrays[prefix + "inventory_goods"] = np.array([goods.id(good) for good in city.inventory], dtype=np.int32)
+        arrays[prefix + "inventory"] = np.array(list(city.inventory.values()), dtype=float)
+        stock = [(goods.id(good), QUALITY_INDEX[quality], amount)
+                 for good, qualities in city.inventory_by_quality.items()
+                 for quality, amount in qualities.items()]
+        arrays[prefix + "stock_keys"] = np.array([goods.id(good) for good in city.inventory_by_quality], dtype=np.int32)
+        arrays[prefix + "stock_goods"] = np.array([g for g, _, _ in stock], dtype=np.int32)
+        arrays[prefix + "stock_qualities"] = np.array([q for _, q, _ in stock], dtype=np.int8)
+        arrays[prefix + "stock_amounts"] = np.array([a for _, _, a in stock], dtype=float)
+        meta["rings"] = {name: _save_ring(prefix + name, getattr(city, name), arrays)
+                         for name in ("_price_rows", "_inventory_rows", "inflation_history", "currency_value_history")}
+    elif vectorized:
+        for name in ("price", "stock", "total", "inflation", "currency"):
+            arrays[prefix + name] = getattr(market, name)
+        meta["rings"] = {name: _save_ring(prefix + name, getattr(market, name), arrays)
+                         for name in ("_price_rows", "_inventory_rows", "inflation_history", "currency_history")}
+        meta["history_days"] = market.history_days
+        meta["rng"] = _rng_state(market.rng)
+    return meta
+
+
+_WORLD_ARRAYS = ("base_price", "price", "production", "consumption", "demand", "stock", "total",
+                 "specialty", "inflation", "currency")
+_WORLD_RINGS = ("_price_rows", "_inventory_rows", "_inflation_rows", "_currency_rows")
+
+
+def _save_world(world, arrays: Dict) -> Dict:
+    for name in _WORLD_ARRAYS:
+        arrays["market/" + name] = getattr(world, name)
+    return {"goods": world.goods,
+            "rings": {name: _save_ring("market/" + name, getattr(world, name), arrays) for name in _WORLD_RINGS}}
+
+
+def _city_name(city) -> Optional[str]:
+    if city is None:
+        return None
+    return city if isinstance(city, str) else city.name
+
+
+def _save_ships(simulation, arrays: Dict, goods: _Names, city_ids: Dict[str, int]) -> List[Dict]:
+    ships = list(simulation.ships.values())
+    fleet = simulation.fleet
+    if fleet is not None:
+        # 船队的城市下标与模拟的城市顺序一致
+        for name, _ in FLEET_FIELDS:
+            arrays["ships/" + name] = getattr(fleet, name)
+        arrays["ships/location"] = fleet.location
+        arrays["ships/destination"] = fleet.destination
+    else:
+        for name, dtype in FLEET_FIELDS:
+            arrays["ships/" + name] = np.array([getattr(ship, name) for ship in ships], dtype=dtype)
+        for name, attr in (("location", "current_city"), ("destination", "destination")):
+            arrays["ships/" + name] = np.array(
+                [city_ids.get(_city_name(getattr(ship, attr)), -1) for ship in ships], dtype=np.int32)
+
+    weather_ids = {id(event): i for i, event in enumerate(simulation.weather_events)}
+    arrays["ships/weather"] = np.array(
+        [weather_ids.get(id(ship.weather_events[0]), -1) if getattr(ship, "weather_events", None) else -1
+         for ship in ships], dtype=np.int32)
+    arrays["ships/original_speed"] = np.array([getattr(ship, "original_speed", np.nan) for ship in ships],
+                                              dtype=float)
+    # 货物按 (船, 商品, 质量, 数量) 保存，保持字典的插入顺序
+    cargo = [(row, goods.id(good), QUALITY_INDEX[quality], amount)
+             for row, ship in enumerate(ships)
+             for good, qualities in ship.cargo_by_quality.items()
+             for quality, amount in qualities.items()]
+    arrays["ships/cargo_ships"] = np.array([c[0] for c in cargo], dtype=np.int32)
+    arrays["ships/cargo_goods"] = np.array([c[1] for c in cargo], dtype=np.int32)
+    arrays["ships/cargo_qualities"] = np.array([c[2] for c in cargo], dtype=np.int8)
+    arrays["ships/cargo_amounts"] = np.array([c[3] for c in cargo], dtype=float)
+    totals = [(row, goods.id(good), amount) for row, ship in enumerate(ships) for good, amount in ship.cargo.items()]
+    arrays["ships/total_ships"] = np.array([t[0] for t in totals], dtype=np.int32)
+    arrays["ships/total_goods"] = np.array([t[1] for t in totals], dtype=np.int32)
+    arrays["ships/total_amounts"] = np.array([t[2] for t in totals], dtype=float)
+    return [{"name": ship.name, "quality_preference": ship.quality_preference,
+             "empty_goods": [good for good, qualities in ship.cargo_by_quality.items() if not qualities]}
+            for ship in ships]
+
+
+def _save_map(trade_map: TradeMap, arrays: Dict) -> Dict:
+    trade_map._ensure_graph()
+    arrays["map/coords"] = trade_map.coords()
+    arrays["map/indptr"] = trade_map.indptr
+    arrays["map/indices"] = trade_map.indices
+    for name in _EDGE_ARRAYS:
+        arrays["map/" + name] = getattr(trade_map, name)
+    return {"cities": trade_map.city_names, "epoch": trade_map.epoch, "rng": _rng_state(trade_map.rng)}
+
+
+def _save_ledger(ledger, arrays: Dict) -> Dict:
+    for name, column in ledger._columns.items():
+        arrays["ledger/" + name] = column[:len(ledger)]
+    return {"ships": ledger.ship_names, "goods": ledger.good_names, "cities": ledger.city_names}
+
+
+def _save_event_log(log, arrays: Dict) -> Dict:
+    for name, column in log._columns.items():
+        arrays["event_log/" + name] = column if log.max_records is not None else column[:log._next_seq]
+    return {
+        "next_seq": log._next_seq,
+        "first_seq": log._first_seq,
+        "texts": {str(seq): text for seq, text in log._texts.items()},
+        "enabled": sorted(log._enabled),
+        "sample_rates": {str(code): rate for code, rate in log._sample_rates.items()},
+        "sampler": _python_random_state(log._sampler.getstate()),
+    }
+
+
+def _save_scheduler(scheduler) -> Dict:
+    # 事项的对象引用按 key（船只或城市顺序）还原，海盗事项另存出发日
+    return {
+        "queue": [[day, phase, key, seq, kind, payload[1] if phase == PHASE_PIRATE else None]
+                  for day, phase, key, seq, kind, payload in scheduler._queue],
+        "voyages": {name: list(voyage) for name, voyage in scheduler._voyages.items()},
+        "seq": scheduler._seq,
+        "processed": scheduler.processed,
+        "resume_day": scheduler.resume_day,
+        "city_event_chance": scheduler.city_event_chance,
+        "pirate_chance": scheduler.pirate_chance,
+    }
+
+
+# ---- 恢复 ----
+
+def load_checkpoint(path: str, simulation_class, template=None):
+    """
+    从检查点文件恢复模拟
+    历史记录、账本、事件日志和航线数组直接使用映射到文件的数组（写时复制），
+    其余数组复制到新建的对象中；全局 random 的状态也一并恢复
+    :param template: 保存该检查点的模拟，给出时各城市的基础价格、产量、消费量字典和
+                     地图坐标与它共享而不重新创建（这些数据在模拟中不会被修改）
+    """
+    header, arrays = read_arrays(path)
+    if header.get("format") != FORMAT_VERSION:
+        raise ValueError(f"不支持的检查点版本: {header.get('format')}")
+    goods = header["goods"]
+    state = header["simulation"]
+    options = state["options"]
+
+    shared = template.cities if template is not None else {}
+    cities = [_restore_city(f"city/{i}/", meta, arrays, goods, shared.get(meta["name"]))
+              for i, meta in enumerate(header["cities"])]
+    ships = [Ship(meta["name"], float(capacity), float(speed))
+             for meta, capacity, speed in zip(header["ships"], arrays["ships/capacity"], arrays["ships/speed"])]
+    if not options["fleet"]:
+        _restore_ship_fields(ships, cities, arrays)
+    trade_map = _restore_map(header["map"], arrays, template.trade_map if template is not None else None)
+
+    simulation = simulation_class(cities, ships, trade_map=trade_map, events=build_events(header["events"]),
+                                  **options)
+    if simulation.fleet is not None:
+        fleet = simulation.fleet
+        for name, _ in FLEET_FIELDS:
+            np.copyto(getattr(fleet, name), arrays["ships/" + name])
+        np.copyto(fleet.location, arrays["ships/location"])
+        np.copyto(fleet.destination, arrays["ships/destination"])
+        _restore_rng(fleet.rng, state["fleet_rng"])
+    _restore_ship_extras(header["ships"], ships, simulation, arrays, goods)
+    if simulation.market is not None:
+        _restore_world(header["market"], simulation.market, arrays)
+        _restore_rng(simulation.market.rng, state["market_rng"])
+
+    simulation.day = state["day"]
+    simulation.currency_supply = state["currency_supply"]
+    simulation.global_inflation_rate = state["global_inflation_rate"]
+    simulation.currency_supply_history = arrays["simulation/currency_supply_history"].tolist()
+    simulation.global_inflation_history = arrays["simulation/global_inflation_history"].tolist()
+    simulation._currency_rng = _restore_rng(simulation._currency_rng, state["currency_rng"])
+    simulation._scheduler_rng = _restore_rng(None, state["scheduler_rng"])
+    trade_map.rng = _restore_rng(trade_map.rng, header["map"]["rng"])
+    _restore_ledger(header["ledger"], simulation.ledger, arrays)
+    _restore_event_log(header["event_log"], simulation.event_log, arrays)
+    if "scheduler" in header:
+        simulation._scheduler = _restore_scheduler(header["scheduler"], simulation)
+    simulation._sync_day()
+    simulation.price_index.invalidate()
+    random.setstate(_to_python_random_state(state["random_state"]))
+    return simulation
+
+
+def _restore_city(prefix: str, meta: Dict, arrays: Dict, goods: List[str], shared: Optional[City] = None) -> City:
+    # 分支从原模拟复制（而不是共享）这几个小字典，修改分支的城市设置不会影响原模拟和其他分支
+    base_prices, production, consumption = (
+        (dict(shared.base_prices), dict(shared.production), dict(shared.consumption)) if shared is not None
+        else (meta["base_prices"], meta["production"], meta["consumption"]))
+    city = City(meta["name"], base_prices, production, consumption,
+                vectorized=meta["vectorized"], history_days=meta.get("history_days", DEFAULT_HISTORY_DAYS))
+    city.specialty_goods = set(meta["specialty_goods"])
+    city.currency_name = meta["currency_name"]
+    if city.market is None and "rings" in meta:
+        city.inflation_rate = meta["inflation_rate"]
+        city.currency_value = meta["currency_value"]
+        for good, price in zip(city.base_prices, arrays[prefix + "prices"].tolist()):
+            city.current_prices[good] = price
+        city.inventory = defaultdict(float, zip((goods[g] for g in arrays[prefix + "inventory_goods"].tolist()),
+                                                arrays[prefix + "inventory"].tolist()))
+        stock = defaultdict(partial(defaultdict, float))
+        for g in arrays[prefix + "stock_keys"].tolist():
+            stock[goods[g]]
+        for g, q, amount in zip(arrays[prefix + "stock_goods"].tolist(), arrays[prefix + "stock_qualities"].tolist(),
+                                arrays[prefix + "stock_amounts"].tolist()):
+            stock[goods[g]][QUALITY_ORDER[q]] = amount
+        city.inventory_by_quality = stock
+        for name, ring_state in meta["rings"].items():
+            _restore_ring(prefix + name, getattr(city, name), arrays, ring_state)
+    elif city.market is not None:
+        market = city.market
+        for name in ("price", "stock", "total", "inflation", "currency"):
+            np.copyto(getattr(market, name), arrays[prefix + name])
+        for name, ring_state in meta["rings"].items():
+            _restore_ring(prefix + name, getattr(market, name), arrays, ring_state)
+        _restore_rng(market.rng, meta["rng"])
+    return city
+
+
+def _restore_ship_fields(ships: List[Ship], cities: List[City], arrays: Dict):
+    """未使用船队数组时逐船恢复数值属性和位置"""
+    columns = {name: arrays["ships/" + name].tolist() for name, _ in FLEET_FIELDS if name != "used_capacity"}
+    locations = arrays["ships/location"].tolist()
+    destinations = arrays["ships/destination"].tolist()
+    for row, ship in enumerate(ships):
+        for name, values in columns.items():
+            setattr(ship, name, values[row])
+        ship.current_city = cities[locations[row]] if locations[row] >= 0 else None
+        ship.destination = cities[destinations[row]] if destinations[row] >= 0 else None
+
+
+def _restore_ship_extras(metas: List[Dict], ships: List[Ship], simulation, arrays: Dict, goods: List[str]):
+    """恢复货物、质量偏好、天气事件和原始速度"""
+    for meta, ship in zip(metas, ships):
+        ship.quality_preference = meta["quality_preference"]
+        for good in meta["empty_goods"]:
+            ship.cargo_by_quality[good] = {}
+    for row, g, q, amount in zip(arrays["ships/cargo_ships"].tolist(), arrays["ships/cargo_goods"].tolist(),
+                                 arrays["ships/cargo_qualities"].tolist(), arrays["ships/cargo_amounts"].tolist()):
+        ships[row].cargo_by_quality.setdefault(goods[g], {})[QUALITY_ORDER[q]] = amount
+    for row, g, amount in zip(arrays["ships/total_ships"].tolist(), arrays["ships/total_goods"].tolist(),
+                              arrays["ships/total_amounts"].tolist()):
+        ships[row].cargo[goods[g]] = amount
+    for ship, weather, speed in zip(ships, arrays["ships/weather"].tolist(), arrays["ships/original_speed"].tolist()):
+        if not np.isnan(speed):
+            ship.original_speed = speed
+            ship.weather_events = [simulation.weather_events[weather]] if weather >= 0 else []
+
+
+def _restore_world(meta: Dict, world, arrays: Dict):
+    if meta["goods"] != world.goods:
+        raise ValueError("检查点中的商品列表与城市不一致")
+    for name in _WORLD_ARRAYS:
+        np.copyto(getattr(world, name), arrays["market/" + name])
+    for name, ring_state in meta["rings"].items():
+        _restore_ring("market/" + name, getattr(world, name), arrays, ring_state)
+
+
+def _restore_map(meta: Dict, arrays: Dict, shared: Optional[TradeMap] = None) -> TradeMap:
+    trade_map = TradeMap()
+    if shared is not None and shared.city_names == meta["cities"]:
+        # 坐标元组共享，只复制字典本身
+        trade_map.city_names = list(shared.city_names)
+        trade_map.city_index = dict(shared.city_index)
+        trade_map.city_coords = dict(shared.city_coords)
+    else:
+        for name, (x, y) in zip(meta["cities"], arrays["map/coords"].tolist()):
+            trade_map.add_city(name, x, y)
+    # 航线数组在更新时整体替换，可以直接使用映射的数组
+    trade_map.indptr = arrays["map/indptr"]
+    trade_map.indices = arrays["map/indices"]
+    for name in _EDGE_ARRAYS:
+        setattr(trade_map, name, arrays["map/" + name])
+    trade_map.epoch = meta["epoch"]
+    trade_map.rng = _restore_rng(None, meta["rng"])
+    return trade_map
+
+
+def _restore_ledger(meta: Dict, ledger, arrays: Dict):
+    size = len(arrays["ledger/day"])
+    if size:
+        # 空列无法按倍数扩容，保留新账本的初始列
+        ledger._columns = {name: arrays["ledger/" + name] for name in ledger._columns}
+    ledger._size = size
+    for names, ids, key in ((ledger.ship_names, ledger._ship_ids, "ships"),
+                            (ledger.good_names, ledger._good_ids, "goods"),
+                            (ledger.city_names, ledger._city_ids, "cities")):
+        names.clear()
+        ids.clear()
+        for name in meta[key]:
+            ledger._intern(names, ids, name)
+    ledger._rebuild_totals()
+
+
+def _restore_event_log(meta: Dict, log, arrays: Dict):
+    if len(arrays["event_log/day"]):
+        log._columns = {name: arrays["event_log/" + name] for name in log._columns}
+    log._next_seq = meta["next_seq"]
+    log._first_seq = meta["first_seq"]
+    log._texts = {int(seq): text for seq, text in meta["texts"].items()}
+    log._enabled = set(meta["enabled"])
+    log._sample_rates = {int(code): rate for code, rate in meta["sample_rates"].items()}
+    log._sampler.setstate(_to_python_random_state(meta["sampler"]))
+    # 索引在首次查询时由列数据重建
+    log._by_day.clear()
+    log._by_ship.clear()
+    log._by_city.clear()
+    log._indexed = False
+
+
+def _restore_scheduler(meta: Dict, simulation) -> EventScheduler:
+    scheduler = EventScheduler(simulation, rng=simulation._scheduler_rng,
+                               city_event_chance=meta["city_event_chance"], pirate_chance=meta["pirate_chance"])
+    ships = list(simulation.ships.values())
+    cities = list(simulation.cities.values())
+    for day, phase, key, seq, kind, departed in meta["queue"]:
+        if phase == PHASE_SHIP:
+            payload = ships[key]
+        elif phase == PHASE_CITY_EVENT:
+            payload = cities[key]
+        elif phase == PHASE_PIRATE:
+            payload = (ships[key], departed)
+        else:
+            payload = None
+        scheduler._queue.append((day, phase, key, seq, kind, payload))
+    heapq.heapify(scheduler._queue)
+    scheduler._voyages = {name: tuple(voyage) for name, voyage in meta["voyages"].items()}
+    scheduler._seq = meta["seq"]
+    scheduler.processed = meta["processed"]
+    scheduler.resume_day = meta["resume_day"]
+    simulation._scheduler_rng = scheduler.rng
+    return scheduler
+
+
+class Snapshot:
+    """
+    模拟某一时刻的只读快照，可从中创建任意多个互相独立的分支
+
+    快照只写一次文件；每个分支以写时复制方式映射同一文件，
+    未修改的历史、账本和事件日志页在各分支之间共享，第一次写入时才复制。
+    快照可以 pickle 后传给子进程（只传文件路径），子进程用 branch() 创建自己的分支。
+    """
+
+    def __init__(self, simulation, path: Optional[str] = None):
+        """
+        :param path: 快照文件路径，默认在临时目录中创建，close() 时删除
+        """
+        self.owned = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="tradesim-", suffix=".ckpt")
+            os.close(fd)
+        self.path = path
+        self.simulation_class = type(simulation)
+        self._template = simulation
+        save_checkpoint(simulation, path)
+
+    def branch(self):
+        """创建一个新分支（同一进程中各分支还共享全局 random，需要互相独立的随机数时请设置 seed）"""
+        return load_checkpoint(self.path, self.simulation_class, self._template)
+
+    def close(self):
+        """删除自动创建的快照文件（已创建的分支保留各自的映射，不受影响）"""
+        if self.owned:
+            self.owned = False
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # 子进程中的副本不持有文件，也不携带原模拟
+        return dict(self.__dict__, owned=False, _template=None)
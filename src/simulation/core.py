@@ -1,25 +1,99 @@
 import random
+import time
 from typing import List
 
 from ..city import City
+from ..market import WorldMarket
+from ..fleet import Fleet
+from ..ledger import TradeLedger
+from ..history import DEFAULT_HISTORY_DAYS
 from ..ship import Ship
 from ..map import TradeMap
+from ..rng import RandomStreams, CITY_JITTER, SHIP_DRAWS, SHIP_START_CITY, roll_choice
 from ..events import WeatherEvent, PirateEvent, CityEvent
-from .update import update_simulation
+from .update import update_simulation, trade_docked, DAY_PHASES
 from .trading import perform_trading_strategy
-from .visualization import plot_city_prices, plot_ship_gold, plot_map, plot_currency_history
+from .strategy import make_strategy
+from .price_index import PriceIndex
+from .scheduler import EventScheduler
+from .checkpoint import Snapshot, save_checkpoint, load_checkpoint
+from .streaming import StreamLayout, StreamWriter
+from .event_log import EventLog, EVENT_CURRENCY, EVENT_WEATHER, EVENT_PIRATE, EVENT_CITY
+# 绘图模块（matplotlib）在 plot_* 方法第一次调用时才导入，无界面运行时不加载；性能分析模块同样在启用时才导入
 
 class TradeSimulation:
-    def __init__(self, cities: List[City], ships: List[Ship], trade_map: TradeMap = None):
+    def __init__(self, cities: List[City], ships: List[Ship], trade_map: TradeMap = None,
+                 world_market: bool = False, history_days: int = DEFAULT_HISTORY_DAYS,
+                 event_log_size: int = None, fleet: bool = False, route_neighbors: int = None,
+                 destination_limit: int = None, destination_radius: float = None, seed: int = None,
+                 events: dict = None, batch_trading: bool = False, cargo_planner: bool = False,
+                 strategy=None):
+        """
+        :param cities: 城市列表
+        :param ships: 船只列表
+        :param trade_map: 贸易地图，默认按城市自动生成
+        :param world_market: 是否把所有城市放进一个世界市场矩阵，每天一次批量更新
+        :param history_days: 世界市场矩阵保留的历史天数（单独的城市在创建时设置）
+        :param event_log_size: 事件日志最多保留的条数，默认不限
+        :param fleet: 是否把船只状态放进船队数组，航行推进和到港按数组批量处理
+        :param route_neighbors: 自动生成地图时每个城市只与最近的若干城市直接通航，默认所有城市两两通航
+        :param destination_limit: 交易策略只考虑最近的若干个城市作为目的地
+        :param destination_radius: 交易策略只考虑一定直线距离内的城市作为目的地（半径内没有其他城市时用最近的一个）
+        :param seed: 随机种子。设置后所有随机性来自由它派生的独立随机数流（每个城市、船只、
+                     航线表、货币系统各一个），结果与实体的处理顺序无关；默认使用全局 random
+        :param events: 事件目录 {"weather"/"pirate"/"city": 事件对象列表}，未给出的类型使用默认目录
+        :param batch_trading: 是否集中交易：同一天停靠在同一城市的船只一起下单，城市按质量库存一次撮合，
+                              库存不足时按需求等比例分配（事件驱动模式下每次决策单独撮合）
+        :param cargo_planner: 是否用多商品装货规划代替单一商品交易：在资金和舱位限制下
+                              同时考虑所有商品和质量，选出预期利润最高的目的地和装货清单
+        :param strategy: 批量交易策略（TradeStrategy 对象或已登记的名称，如 "greedy"），设置后每天停靠的船只
+                         一次交给策略决策，代替逐船的交易策略和 cargo_planner；检查点只保存策略名称
+        """
         self.cities = {city.name: city for city in cities}
         self.ships = {ship.name: ship for ship in ships}
         self.day = 0
         self.city_names = [city.name for city in cities]
-        self.event_log = []
+        # 分层随机数流：城市和船只按日预抽随机数，其余子系统各用一个生成器
+        self.streams = RandomStreams(seed) if seed is not None else None
+        self._currency_rng = None
+        if self.streams is not None:
+            for city in cities:
+                # 世界市场的价格波动由矩阵的生成器抽样，城市流只需要前面几个随机数
+                width = CITY_JITTER if world_market else CITY_JITTER + len(city.base_prices)
+                city.draws = self.streams.daily(width, "city", city.name)
+                if city.market is not None:
+                    city.market.draws = city.draws
+            for ship in ships:
+                ship.draws = self.streams.daily(SHIP_DRAWS, "ship", ship.name)
+            self._currency_rng = self.streams.generator("currency")
+        # 事件调度器及其生成器在分段运行之间保持，未处理的事项随检查点保存
+        self._scheduler_rng = None
+        self._scheduler = None
+        self.profiler = None  # 启用性能分析时的 Profiler
+        # 结构化事件日志，文本在打印时才生成
+        self.event_log = EventLog(max_records=event_log_size)
+        # 所有船只共享的交易账本
+        self.ledger = TradeLedger()
+        for ship in ships:
+            ship.attach_ledger(self.ledger)
+        # 世界市场矩阵（启用后各城市是矩阵行的视图）
+        self.market = WorldMarket(cities, history_days, rng=self._generator("market")) if world_market else None
+        # 船队数组（启用后各船只的数值属性是数组元素的代理）
+        self.fleet = Fleet(ships, cities, rng=self._generator("fleet")) if fleet else None
+        # 各商品售价最高/最低城市的索引，供交易策略查询目的地
+        self.price_index = PriceIndex(cities)
+        self.route_neighbors = route_neighbors
+        self.destination_limit = destination_limit
+        self.destination_radius = destination_radius
+        self.batch_trading = batch_trading
+        self.cargo_planner = cargo_planner
+        self.strategy = make_strategy(strategy)
         
         # 初始化或使用提供的贸易地图
         if trade_map:
             self.trade_map = trade_map
+            if self.streams is not None:
+                trade_map.rng = self._generator("routes")
         else:
             self.trade_map = self._generate_map(cities)
         
@@ -29,11 +103,24 @@ class TradeSimulation:
         self.global_inflation_rate = 0.0  # 全局通货膨胀率
         self.global_inflation_history = [0.0]  # 全局通货膨胀率历史
             
-        self._init_events()
+        self._init_events(events or {})
+        self.event_log.bind(list(self.ships), self.city_names, {
+            EVENT_WEATHER: self.weather_events,
+            EVENT_PIRATE: self.pirate_events,
+            EVENT_CITY: self.city_events,
+        })
+    
+    def _generator(self, name: str):
+        """子系统的随机数生成器，未设置种子时为None（各子系统自行由全局 random 派生）"""
+        return self.streams.generator(name) if self.streams is not None else None
     
     def _generate_map(self, cities: List[City]) -> TradeMap:
         """生成贸易地图，设置城市坐标和距离"""
         trade_map = TradeMap()
+        trade_map.rng = self._generator("routes")
+        layout_rng = self._generator("map")
+        uniform = layout_rng.uniform if layout_rng is not None else random.uniform
+        rand = layout_rng.random if layout_rng is not None else random.random
         
         # 简单布局，将城市放在圆形布局上
         num_cities = len(cities)
@@ -43,18 +130,21 @@ class TradeSimulation:
         for i, city in enumerate(cities):
             # 计算圆形布局上的位置
             angle = 2 * 3.14159 * i / num_cities
-            x = center_x + radius * random.uniform(0.8, 1.2) * random.uniform(0.8, 1.2) * 1.5 * round(0.9 + 0.2*random.random(), 1)
-            y = center_y + radius * random.uniform(0.8, 1.2) * random.uniform(0.8, 1.2) * round(0.9 + 0.2*random.random(), 1)
+            x = center_x + radius * uniform(0.8, 1.2) * uniform(0.8, 1.2) * 1.5 * round(0.9 + 0.2*rand(), 1)
+            y = center_y + radius * uniform(0.8, 1.2) * uniform(0.8, 1.2) * round(0.9 + 0.2*rand(), 1)
             
             # 添加城市到地图
             trade_map.add_city(city.name, x, y)
         
         # 生成距离和航线状态
-        trade_map.generate_distances()
+        if self.route_neighbors is not None:
+            trade_map.generate_knn_routes(self.route_neighbors)
+        else:
+            trade_map.generate_distances()
         return trade_map
     
-    def _init_events(self):
-        """初始化随机事件列表"""
+    def _init_events(self, events: dict):
+        """初始化随机事件列表（场景提供的目录优先）"""
         self.weather_events = [
             WeatherEvent("暴风雨", "强烈的暴风雨减缓了船只的航行速度", 0.5, 3),
             WeatherEvent("大雾", "浓雾使船只不得不减速航行", 0.7, 2),
@@ -86,9 +176,19 @@ class TradeSimulation:
             CityEvent("药材短缺", "药材短缺导致价格飙升", 2.0, ["药材"]),
             CityEvent("香料战争", "香料战争导致香料价格波动剧烈", 1.8, ["香料", "香木"])
         ]
+        
+        self.weather_events = list(events.get("weather", self.weather_events))
+        self.pirate_events = list(events.get("pirate", self.pirate_events))
+        self.city_events = list(events.get("city", self.city_events))
     
     def update(self):
         """更新模拟状态"""
+        if self.profiler is not None:
+            self.profiler.run_day(DAY_PHASES)
+            self.day += 1
+            self._sync_day()
+            return
+        
         # 更新航线状态（每10天更新一次）
         if self.day % 10 == 0:
             self.trade_map.update_route_conditions()
@@ -98,64 +198,213 @@ class TradeSimulation:
             
         update_simulation(self)
         self.day += 1
+        self._sync_day()
+    
+    def _sync_day(self):
+        """把当前日期同步给账本和按日抽样的随机数流"""
+        self.ledger.day = self.day
+        if self.streams is not None:
+            self.streams.day = self.day
     
     def _update_currency_system(self):
         """更新货币系统"""
         # 每30天调整一次货币供应量
         if self.day % 30 == 0:
-            # 计算船只和城市的总财富
-            ships_wealth = sum(ship.gold for ship in self.ships.values())
-            
-            # 根据总财富和当前货币供应量之间的关系调整通货膨胀率
-            wealth_to_supply_ratio = ships_wealth / max(1, self.currency_supply)
-            
-            # 调整货币供应量
-            if wealth_to_supply_ratio > 0.5:  # 财富占比大，可能需要增加货币供应
-                supply_change = random.uniform(0.01, 0.03)  # 1%-3%的增长
-            else:  # 财富占比小，减少货币供应增长
-                supply_change = random.uniform(-0.01, 0.02)  # -1%到2%的变化
-                
-            # 应用随机因素，有小概率出现大幅增长或收缩
-            if random.random() < 0.05:  # 5%的概率
-                supply_change = random.uniform(-0.05, 0.08)  # 大幅波动
-                
-            # 更新货币供应量
-            self.currency_supply *= (1 + supply_change)
-            self.currency_supply_history.append(self.currency_supply)
-            
-            # 更新全局通货膨胀率
-            self.global_inflation_rate = supply_change
-            self.global_inflation_history.append(self.global_inflation_rate)
-            
-            # 记录货币系统变化
-            if supply_change > 0:
-                direction = "增加"
-            else:
-                direction = "减少"
-            self.event_log.append(f"第{self.day}天: 货币供应量{direction}了{abs(supply_change)*100:.1f}%, 新供应量: {self.currency_supply:.0f}")
+            self._adjust_currency_supply()
         
         # 将全局通货膨胀率传递给各个城市
+        self._blend_inflation()
+    
+    def _adjust_currency_supply(self):
+        """根据船只财富随机调整货币供应量和全局通货膨胀率"""
+        rng = self._currency_rng
+        uniform = rng.uniform if rng is not None else random.uniform
+        rand = rng.random if rng is not None else random.random
+        
+        # 计算船只和城市的总财富
+        ships_wealth = sum(ship.gold for ship in self.ships.values())
+        
+        # 根据总财富和当前货币供应量之间的关系调整通货膨胀率
+        wealth_to_supply_ratio = ships_wealth / max(1, self.currency_supply)
+        
+        # 调整货币供应量
+        if wealth_to_supply_ratio > 0.5:  # 财富占比大，可能需要增加货币供应
+            supply_change = uniform(0.01, 0.03)  # 1%-3%的增长
+        else:  # 财富占比小，减少货币供应增长
+            supply_change = uniform(-0.01, 0.02)  # -1%到2%的变化
+        
+        # 应用随机因素，有小概率出现大幅增长或收缩
+        if rand() < 0.05:  # 5%的概率
+            supply_change = uniform(-0.05, 0.08)  # 大幅波动
+        
+        # 更新货币供应量
+        self.currency_supply *= (1 + supply_change)
+        self.currency_supply_history.append(self.currency_supply)
+        
+        # 更新全局通货膨胀率
+        self.global_inflation_rate = supply_change
+        self.global_inflation_history.append(self.global_inflation_rate)
+        
+        # 记录货币系统变化
+        self.event_log.record(EVENT_CURRENCY, self.day, value=supply_change, value2=self.currency_supply)
+    
+    def _blend_inflation(self):
+        """城市通货膨胀率受全局影响，但保留各自特性"""
+        if self.market is not None:
+            self.market.blend_inflation(self.global_inflation_rate)
+            return
         for city in self.cities.values():
-            # 城市通货膨胀率受全局影响，但保留各自特性
             city.inflation_rate = 0.7 * city.inflation_rate + 0.3 * self.global_inflation_rate
     
     def perform_trading_strategy(self, ship):
         """执行交易策略"""
-        perform_trading_strategy(self, ship)
-        
-    def run_simulation(self, days: int):
-        """运行模拟"""
-        # 初始化船只位置和路线
-        self._init_ships()
+        if self.strategy is not None or self.batch_trading:
+            trade_docked(self, [ship])
+        else:
+            perform_trading_strategy(self, ship)
+    
+    def trade_docked(self, ships: List[Ship]):
+        """批量策略或集中交易模式下一次处理一批停靠的船只"""
+        trade_docked(self, ships)
         
-        for _ in range(days):
-            self.update()
+    def run_simulation(self, days: int, event_driven: bool = False, checkpoint_every: int = None,
+                       checkpoint_path: str = None, sinks: list = None, batch_days: int = 32):
+        """
+        运行模拟
+        :param event_driven: 是否用离散事件调度器运行，只在船只到港、需要决策或事件发生时处理
+        :param checkpoint_every: 每隔多少天自动保存一次检查点，默认不保存
+        :param checkpoint_path: 自动检查点的文件路径（每次覆盖）
+        :param sinks: 输出目标（streaming.Sink）列表，每天的价格、库存、船只位置和资金
+                      在运行过程中由后台线程分批写出
+        :param batch_days: 输出目标每批写入的天数
+        """
+        self._run(days, event_driven, checkpoint_every, checkpoint_path, sinks, batch_days, init_ships=True)
+    
+    def resume(self, days: int, event_driven: bool = False, checkpoint_every: int = None,
+               checkpoint_path: str = None, sinks: list = None, batch_days: int = 32):
+        """
+        从当前日期继续运行（不重新初始化船只），用于从检查点恢复后接着模拟
+        参数同 run_simulation
+        """
+        self._run(days, event_driven, checkpoint_every, checkpoint_path, sinks, batch_days, init_ships=False)
+    
+    def _run(self, days: int, event_driven: bool, checkpoint_every: int, checkpoint_path: str,
+             sinks: list, batch_days: int, init_ships: bool):
+        if checkpoint_every and not checkpoint_path:
+            raise ValueError("设置 checkpoint_every 时需要指定 checkpoint_path")
+        steps = self._run_days(days, event_driven, checkpoint_every, checkpoint_path, init_ships)
+        if not sinks:
+            for _ in steps:
+                pass
+            return
+        # 布局在初始化船只之前创建，第0天出发的事件也会写出
+        layout = StreamLayout(self)
+        with StreamWriter(layout, sinks, batch_days) as writer:
+            for _ in steps:
+                writer.write(layout.capture())
+    
+    def _run_days(self, days: int, event_driven: bool, checkpoint_every: int, checkpoint_path: str,
+                  init_ships: bool):
+        """逐日运行的生成器，每天结束时产出一次；run_simulation、resume 和 iter_days 共用"""
+        self._sync_day()
+        if init_ships:
+            # 初始化船只位置和路线
+            self._init_ships()
+        end = self.day + days
+        while self.day < end:
+            # 按检查点间隔分段运行，每段结束在间隔的整数倍日期上
+            stop = end
+            if checkpoint_every:
+                stop = min(end, (self.day // checkpoint_every + 1) * checkpoint_every)
+            if event_driven:
+                # 事件驱动模式不按阶段逐日执行，只记录每段在调度器中的耗时
+                elapsed = 0.0
+                start = time.perf_counter()
+                for _ in self._event_scheduler().run_days(stop - self.day):
+                    elapsed += time.perf_counter() - start
+                    yield
+                    start = time.perf_counter()
+                elapsed += time.perf_counter() - start
+                if self.profiler is not None:
+                    self.profiler.record("scheduler", elapsed)
+            else:
+                while self.day < stop:
+                    self.update()
+                    yield
+            if checkpoint_every and self.day % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_path)
+    
+    def enable_profiling(self) -> 'Profiler':
+        """
+        开始记录各阶段耗时、热点函数调用次数和交易决策耗时，用 disable_profiling 停止
+        :return: Profiler，可用 report() / format_report() 查看结果
+        """
+        from .profiling import Profiler
+        return Profiler(self).enable()
+    
+    def disable_profiling(self):
+        """停止性能分析（已记录的结果保留在 Profiler 中）"""
+        if self.profiler is not None:
+            self.profiler.disable()
+    
+    def iter_days(self, days: int, event_driven: bool = False, checkpoint_every: int = None,
+                  checkpoint_path: str = None, resume: bool = False):
+        """
+        逐日运行的生成器，每天结束时产出当天的状态（streaming.DayDelta）
+        :param resume: 为True时从当前日期继续（同 resume），否则先初始化船只（同 run_simulation）
+        其他参数同 run_simulation，结果与 run_simulation / resume 相同
+        """
+        if checkpoint_every and not checkpoint_path:
+            raise ValueError("设置 checkpoint_every 时需要指定 checkpoint_path")
+        # 布局在初始化船只之前创建，第0天出发的事件也会产出
+        layout = StreamLayout(self)
+        for _ in self._run_days(days, event_driven, checkpoint_every, checkpoint_path, init_ships=not resume):
+            yield layout.capture()
+    
+    def _event_scheduler(self) -> EventScheduler:
+        """
+        事件驱动模式的调度器，在分段运行之间保持：
+        从上一段结束的日期继续时沿用未处理的事项，事件日期不会在分段处重新抽样
+        """
+        if self._scheduler is None:
+            if self._scheduler_rng is None:
+                self._scheduler_rng = self._generator("scheduler")
+            self._scheduler = EventScheduler(self, rng=self._scheduler_rng)
+            self._scheduler_rng = self._scheduler.rng
+        return self._scheduler
+    
+    def save_checkpoint(self, path: str):
+        """把模拟的全部状态保存到一个文件，数组按内存映射可直接读取的布局存放"""
+        save_checkpoint(self, path)
+    
+    @classmethod
+    def load_checkpoint(cls, path: str) -> 'TradeSimulation':
+        """从 save_checkpoint 保存的文件恢复模拟，之后可用 resume 继续运行"""
+        return load_checkpoint(path, cls)
+    
+    def snapshot(self, path: str = None) -> Snapshot:
+        """
+        保存当前状态的快照，之后可用 snapshot.branch() 创建多个分支
+        :param path: 快照文件路径，默认使用临时文件
+        """
+        return Snapshot(self, path)
+    
+    def fork(self) -> 'TradeSimulation':
+        """
+        从当前状态创建一个独立分支，用于比较不同假设下的后续发展
+        分支复制城市的基础价格、生产和消费设置，大数组按写时复制映射，修改任何一方都不影响另一方
+        """
+        with self.snapshot() as snapshot:
+            return snapshot.branch()
             
     def _init_ships(self):
         """初始化船只状态"""
+        if self._scheduler is not None:
+            # 船只重新出发，调度器中未处理的事项不再有效
+            self._scheduler.resume_day = None
         for ship in self.ships.values():
             if not ship.current_city:
-                start_city = random.choice(list(self.cities.values()))
+                start_city = roll_choice(ship, SHIP_START_CITY, list(self.cities.values()))
                 ship.current_city = start_city
                 
             # 初始化船只的天气事件列表和原始速度
@@ -168,29 +417,43 @@ class TradeSimulation:
                 ship.gold_history.append(ship.gold)
             
         # 让船只在初始城市先做一次决策
+        if self.strategy is not None or self.batch_trading:
+            self.trade_docked(list(self.ships.values()))
+            return
         for ship in self.ships.values():
             if ship.current_city:
                 self.perform_trading_strategy(ship)
             
     def plot_city_prices(self, city_name: str):
         """绘制城市商品价格历史"""
+        from .visualization import plot_city_prices
         plot_city_prices(self, city_name)
     
     def plot_ship_gold(self, ship_name: str):
         """绘制船只资金历史"""
+        from .visualization import plot_ship_gold
         plot_ship_gold(self, ship_name)
     
     def plot_map(self):
         """绘制贸易地图"""
+        from .visualization import plot_map
         plot_map(self)
         
     def plot_currency_history(self):
         """绘制货币系统历史数据"""
+        from .visualization import plot_currency_history
         plot_currency_history(self)
         
-    def print_event_log(self):
-        """打印事件日志"""
-        for event in self.event_log:
+    def print_event_log(self, day: int = None, ship: str = None, city: str = None, codes=None):
+        """
+        打印事件日志，可按日期、船只、城市和事件类型筛选
+        :param codes: 事件类型编号列表（见 event_log 模块的 EVENT_* 常量）
+        """
+        if day is None and ship is None and city is None and codes is None:
+            events = self.event_log
+        else:
+            events = self.event_log.messages(day=day, ship=ship, city=city, codes=codes)
+        for event in events:
             print(event)
             
     def get_route_info(self, city_a: str, city_b: str) -> dict:
@@ -207,6 +470,10 @@ class TradeSimulation:
             'conditions': conditions
         }
     
+    def get_top_spreads(self, n: int = 10) -> List[dict]:
+        """获取全局价差最大的套利机会"""
+        return self.price_index.top_spreads(n)
+    
     def get_all_routes(self) -> List[dict]:
         """获取所有航线信息"""
         return [
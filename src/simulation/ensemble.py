@@ -0,0 +1,287 @@
+import os
+import pickle
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .core import TradeSimulation
+
+# 工作进程中常驻的场景和运行参数
+_WORKER = {}
+
+
+def collect_metrics(simulation: TradeSimulation) -> Dict[str, np.ndarray]:
+    """
+    默认的单次运行指标：各船最终资金、货币供应量、各城市通货膨胀率和价格路径
+    价格路径的键为 "prices/城市名"，形状为 (商品数, 天数)，商品按城市 base_prices 的顺序
+    """
+    metrics = {
+        "final_gold": np.array([ship.gold for ship in simulation.ships.values()], dtype=float),
+        "currency_supply": np.array(simulation.currency_supply_history, dtype=float),
+        "inflation": np.array([np.asarray(city.inflation_history, dtype=float)
+                               for city in simulation.cities.values()]),
+    }
+    for name, city in simulation.cities.items():
+        metrics[f"prices/{name}"] = np.array([np.asarray(city.price_history[good], dtype=float)
+                                              for good in city.base_prices])
+    return metrics
+
+
+class StreamingStats:
+    """
+    逐次累积一个指标的统计量，不保存全部样本
+
+    均值和方差用 Welford 算法更新。需要分布时，前 warmup 个样本先缓存，
+    之后按这些样本的范围为每个元素确定固定分箱，后续样本只累加直方图计数
+    （超出范围的计入两端的箱）；分位数由直方图插值得到。
+    """
+
+    def __init__(self, bins: int = 0, warmup: int = 16):
+        """
+        :param bins: 直方图箱数，0表示只统计均值、方差和极值
+        :param warmup: 确定分箱范围前缓存的样本数
+        """
+        self.bins = bins
+        self.warmup = max(1, warmup)
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+        self.min = None
+        self.max = None
+        self._buffer: List[np.ndarray] = []
+        self.edges = None   # (..., bins+1)
+        self.counts = None  # (..., bins)
+
+    def update(self, sample: np.ndarray):
+        """加入一个样本"""
+        sample = np.asarray(sample, dtype=float)
+        if self.count == 0:
+            self.mean = np.zeros_like(sample)
+            self._m2 = np.zeros_like(sample)
+            self.min = sample.copy()
+            self.max = sample.copy()
+        elif sample.shape != self.mean.shape:
+            raise ValueError(f"样本形状 {sample.shape} 与之前的 {self.mean.shape} 不一致")
+        self.count += 1
+        delta = sample - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (sample - self.mean)
+        np.minimum(self.min, sample, out=self.min)
+        np.maximum(self.max, sample, out=self.max)
+
+        if not self.bins:
+            return
+        if self.edges is None:
+            self._buffer.append(sample)
+            if len(self._buffer) >= self.warmup:
+                self._fix_bins()
+        else:
+            self._add_to_histogram(sample)
+
+    def _fix_bins(self):
+        samples = np.stack(self._buffer)
+        lo, hi = samples.min(axis=0), samples.max(axis=0)
+        # 留出一定余量，样本完全相同时也保证箱宽为正
+        pad = np.maximum((hi - lo) * 0.25, np.maximum(np.abs(lo), 1.0) * 1e-6)
+        steps = np.linspace(0.0, 1.0, self.bins + 1)
+        self.edges = (lo - pad)[..., None] + (hi - lo + 2 * pad)[..., None] * steps
+        self.counts = np.zeros(lo.shape + (self.bins,), dtype=np.int64)
+        for sample in self._buffer:
+            self._add_to_histogram(sample)
+        self._buffer = []
+
+    def _add_to_histogram(self, sample: np.ndarray):
+        lo = self.edges[..., 0]
+        width = self.edges[..., 1] - lo
+        index = np.clip(np.floor((sample - lo) / width), 0, self.bins - 1).astype(np.intp)
+        flat = self.counts.reshape(-1, self.bins)
+        flat[np.arange(flat.shape[0]), index.reshape(-1)] += 1
+
+    @property
+    def std(self) -> np.ndarray:
+        """样本标准差"""
+        if self.count < 2:
+            return np.zeros_like(self.mean)
+        return np.sqrt(self._m2 / (self.count - 1))
+
+    def quantile(self, q: float) -> np.ndarray:
+        """分位数（直方图插值的近似值；样本少于 warmup 时为精确值）"""
+        if not self.bins:
+            raise ValueError("未启用直方图，无法计算分位数")
+        if self.edges is None:
+            return np.quantile(np.stack(self._buffer), q, axis=0)
+        cumulative = np.cumsum(self.counts, axis=-1)
+        target = q * self.count
+        # 第一个累计数达到目标的箱，在箱内线性插值
+        index = np.minimum((cumulative < target).sum(axis=-1), self.bins - 1)
+        below = np.where(index > 0, np.take_along_axis(cumulative, np.maximum(index - 1, 0)[..., None], -1)[..., 0], 0)
+        in_bin = np.take_along_axis(self.counts, index[..., None], -1)[..., 0]
+        fraction = np.where(in_bin > 0, (target - below) / np.maximum(in_bin, 1), 0.5)
+        left = np.take_along_axis(self.edges, index[..., None], -1)[..., 0]
+        right = np.take_along_axis(self.edges, index[..., None] + 1, -1)[..., 0]
+        return np.clip(left + fraction * (right - left), self.min, self.max)
+
+    def histogram(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(分箱边界, 计数)"""
+        if self.edges is None and self._buffer:
+            self._fix_bins()
+        return self.edges, self.counts
+
+
+class EnsembleResult:
+    """集合运行的汇总结果 {指标名: StreamingStats}"""
+
+    def __init__(self, quantiles: Sequence[float]):
+        self.stats: Dict[str, StreamingStats] = {}
+        self.quantiles = tuple(quantiles)
+        self.runs = 0
+
+    def __getitem__(self, name: str) -> StreamingStats:
+        return self.stats[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.stats
+
+    def summary(self, name: str) -> Dict[str, np.ndarray]:
+        """某个指标的均值、标准差、极值和分位数"""
+        stats = self.stats[name]
+        result = {"mean": stats.mean, "std": stats.std, "min": stats.min, "max": stats.max}
+        if stats.bins:
+            for q in self.quantiles:
+                result[f"q{q:g}"] = stats.quantile(q)
+        return result
+
+
+def _init_worker(template: bytes, days: int, sim_kwargs: Dict, metrics: Callable, run_kwargs: Dict):
+    """工作进程初始化：保存序列化的场景，之后每次运行从中复制"""
+    _WORKER.update(template=template, days=days, sim_kwargs=sim_kwargs, metrics=metrics, run_kwargs=run_kwargs)
+
+
+def _run_batch(seeds: List[int]) -> List[Tuple[int, Dict[str, np.ndarray]]]:
+    """在工作进程中按种子运行若干次模拟，只返回指标"""
+    results = []
+    for seed in seeds:
+        results.append((seed, run_seed(seed, **_WORKER)))
+    return results
+
+
+def run_seed(seed: int, template: bytes, days: int, sim_kwargs: Dict, metrics: Callable,
+             run_kwargs: Dict) -> Dict[str, np.ndarray]:
+    """
+    用给定种子从场景模板运行一次模拟并计算指标
+    种子同时传给 TradeSimulation：模板中数组市场的随机数生成器状态是序列化时的副本，
+    只重置全局 random 时各次运行的价格路径完全相同
+    """
+    random.seed(seed)
+    cities, ships = pickle.loads(template)
+    simulation = TradeSimulation(cities, ships, seed=seed, **sim_kwargs)
+    simulation.run_simulation(days, **run_kwargs)
+    return metrics(simulation)
+
+
+class EnsembleRunner:
+    """
+    蒙特卡洛集合运行器
+
+    场景只构建一次并序列化为模板，常驻的工作进程在初始化时收到模板，
+    每个种子从模板复制一份城市和船只运行。工作进程只返回指标数组，
+    主进程边收边做流式汇总（均值、方差、直方图和分位数）。
+    """
+
+    def __init__(self, scenario: Callable[[], Tuple[list, list]], days: int = 365,
+                 workers: Optional[int] = None, sim_kwargs: Optional[Dict] = None,
+                 run_kwargs: Optional[Dict] = None, metrics: Callable = collect_metrics,
+                 histogram_bins: int = 32, histogram_metrics: Optional[Iterable[str]] = None,
+                 quantiles: Sequence[float] = (0.05, 0.5, 0.95), batch_size: int = 4):
+        """
+        :param scenario: 返回 (城市列表, 船只列表) 的函数，只在主进程调用一次
+        :param days: 每次运行的天数
+        :param workers: 工作进程数，默认为CPU核数；0表示在当前进程中顺序运行
+        :param sim_kwargs: 传给 TradeSimulation 的其他参数（不能含 seed，每次运行的种子由 run 给出）
+        :param run_kwargs: 传给 run_simulation 的其他参数（如 event_driven）
+        :param metrics: 单次运行指标函数 simulation -> {名称: 数组}，须可被 pickle（模块级函数）
+        :param histogram_bins: 直方图箱数
+        :param histogram_metrics: 需要直方图和分位数的指标名，默认只有 final_gold 和 inflation
+        :param batch_size: 每个任务运行的种子数，减少进程间通信次数
+        """
+        self.template = pickle.dumps(scenario())
+        self.days = days
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.sim_kwargs = dict(sim_kwargs or {})
+        if "seed" in self.sim_kwargs:
+            raise ValueError("sim_kwargs 不能包含 seed：每次运行的种子由 run 给出，固定种子会让所有运行完全相同")
+        self.run_kwargs = dict(run_kwargs or {})
+        self.metrics = metrics
+        self.histogram_bins = histogram_bins
+        self.histogram_metrics = set(histogram_metrics if histogram_metrics is not None
+                                     else ("final_gold", "inflation"))
+        self.quantiles = tuple(quantiles)
+        self.batch_size = max(1, batch_size)
+        self._pool = None
+
+    def _worker_args(self) -> Dict:
+        return dict(template=self.template, days=self.days, sim_kwargs=self.sim_kwargs,
+                    metrics=self.metrics, run_kwargs=self.run_kwargs)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            args = self._worker_args()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(args["template"], args["days"], args["sim_kwargs"], args["metrics"], args["run_kwargs"]))
+        return self._pool
+
+    def run(self, seeds: Iterable[int], result: Optional[EnsembleResult] = None) -> EnsembleResult:
+        """
+        运行一组种子，结果累积到 result（默认新建）
+        工作进程在多次 run 之间保持常驻，直到调用 close
+        """
+        result = result or EnsembleResult(self.quantiles)
+        seeds = list(seeds)
+        if self.workers == 0:
+            args = self._worker_args()
+            for seed in seeds:
+                self._accumulate(result, run_seed(seed, **args))
+            return result
+
+        pool = self._executor()
+        batches = [seeds[i:i + self.batch_size] for i in range(0, len(seeds), self.batch_size)]
+        pending = set()
+        # 同时在途的任务不超过工作进程数的两倍，主进程内存保持有界
+        for batch in batches:
+            if len(pending) >= 2 * self.workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                self._collect(result, done)
+            pending.add(pool.submit(_run_batch, batch))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            self._collect(result, done)
+        return result
+
+    def _collect(self, result: EnsembleResult, futures):
+        for future in futures:
+            for _, metrics in future.result():
+                self._accumulate(result, metrics)
+
+    def _accumulate(self, result: EnsembleResult, metrics: Dict[str, np.ndarray]):
+        for name, value in metrics.items():
+            stats = result.stats.get(name)
+            if stats is None:
+                bins = self.histogram_bins if name in self.histogram_metrics else 0
+                stats = result.stats[name] = StreamingStats(bins)
+            stats.update(value)
+        result.runs += 1
+
+    def close(self):
+        """关闭工作进程"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> 'EnsembleRunner':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,308 @@
+import bisect
+import random
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# 事件类型编号
+EVENT_MESSAGE = 0      # 自由文本
+EVENT_CURRENCY = 1     # 货币供应量调整：value=变化率，value2=新供应量
+EVENT_ARRIVAL = 2      # 船只抵达：ship, city
+EVENT_DEPARTURE = 3    # 船只出发：ship, city=出发城市, target=目的城市, value=预计天数
+EVENT_WEATHER = 4      # 航行天气：ship, ref=天气事件序号
+EVENT_SKILL_SAILING = 5
+EVENT_SKILL_TRADING = 6
+EVENT_PIRATE = 7       # 海盗袭击：ship, ref=海盗事件序号, value=损失金币
+EVENT_CITY = 8         # 城市事件：city, ref=城市事件序号
+
+EVENT_CATEGORIES = {
+    "message": EVENT_MESSAGE,
+    "currency": EVENT_CURRENCY,
+    "arrival": EVENT_ARRIVAL,
+    "departure": EVENT_DEPARTURE,
+    "weather": EVENT_WEATHER,
+    "skill_sailing": EVENT_SKILL_SAILING,
+    "skill_trading": EVENT_SKILL_TRADING,
+    "pirate": EVENT_PIRATE,
+    "city": EVENT_CITY,
+}
+
+# 单条事件（ship、city 为名称；出发事件的 ref 为目的城市编号，其余为事件目录中的序号）
+Event = namedtuple("Event", "seq day code ship city ref value value2")
+
+_COLUMNS = (
+    ("day", np.int32),
+    ("code", np.int8),
+    ("ship", np.int32),
+    ("city", np.int32),
+    ("ref", np.int32),
+    ("value", np.float64),
+    ("value2", np.float64),
+)
+
+
+class EventLog:
+    """
+    结构化事件日志
+
+    每条事件只保存类型编号、日期、船只/城市编号和数值负载，
+    中文描述在需要时才根据模板生成。支持按类别开关和抽样记录、
+    只保留最近若干条的有界模式，以及按日期、船只、城市的索引查询。
+    迭代日志时得到渲染好的文本，与旧版字符串列表用法兼容。
+    """
+
+    def __init__(self, max_records: Optional[int] = None, seed: Optional[int] = None):
+        """
+        :param max_records: 最多保留的事件条数，None表示不限
+        :param seed: 抽样使用的随机种子（抽样不影响模拟本身的随机数）
+        """
+        self.max_records = max_records
+        capacity = max_records or 1024
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _COLUMNS}
+        self._next_seq = 0   # 下一条事件的序号
+        self._first_seq = 0  # 仍保留的最早事件序号
+        self._texts: Dict[int, str] = {}
+        self._enabled = set(EVENT_CATEGORIES.values())
+        self._sample_rates: Dict[int, float] = {}
+        self._sampler = random.Random(seed)
+
+        # 索引 {键: [事件序号]}，序号递增；从检查点恢复后在首次查询时才重建
+        self._by_day: Dict[int, List[int]] = {}
+        self._by_ship: Dict[int, List[int]] = {}
+        self._by_city: Dict[int, List[int]] = {}
+        self._indexed = True
+
+        self.ship_names: List[str] = []
+        self.city_names: List[str] = []
+        self._ship_ids: Dict[str, int] = {}
+        self._city_ids: Dict[str, int] = {}
+        self._catalogs: Dict[int, list] = {}
+
+    def bind(self, ship_names: List[str], city_names: List[str], catalogs: Dict[int, list]):
+        """
+        设置编号对应的名称和事件目录
+        :param catalogs: {事件类型: 事件对象列表}，ref 是列表中的序号
+        """
+        self.ship_names = list(ship_names)
+        self.city_names = list(city_names)
+        self._ship_ids = {name: i for i, name in enumerate(self.ship_names)}
+        self._city_ids = {name: i for i, name in enumerate(self.city_names)}
+        self._catalogs = catalogs
+
+    # ---- 配置 ----
+
+    def enable(self, *codes: int):
+        """开启若干类别的记录"""
+        self._enabled.update(codes)
+
+    def disable(self, *codes: int):
+        """关闭若干类别的记录"""
+        self._enabled.difference_update(codes)
+
+    def set_sampling(self, code: int, rate: float):
+        """某类事件只按给定比例随机记录（1.0为全部记录）"""
+        if rate >= 1.0:
+            self._sample_rates.pop(code, None)
+        else:
+            self._sample_rates[code] = rate
+
+    def wants(self, code: int) -> bool:
+        """该类别是否开启（关闭时调用方可以跳过准备负载）"""
+        return code in self._enabled
+
+    # ---- 记录 ----
+
+    def record(self, code: int, day: int, ship: Optional[str] = None, city: Optional[str] = None,
+               ref: int = -1, value: float = 0.0, value2: float = 0.0,
+               target: Optional[str] = None) -> Optional[int]:
+        """
+        记录一条事件
+        :param target: 目的城市名，保存为 ref
+        :return: 事件序号，被过滤时返回None
+        """
+        if code not in self._enabled:
+            return None
+        rate = self._sample_rates.get(code)
+        if rate is not None and self._sampler.random() >= rate:
+            return None
+
+        if target is not None:
+            ref = self._city_ids.get(target, -1)
+        seq = self._next_seq
+        slot = self._slot_for_write(seq)
+        ship_id = self._ship_ids.get(ship, -1) if ship is not None else -1
+        city_id = self._city_ids.get(city, -1) if city is not None else -1
+        columns = self._columns
+        columns["day"][slot] = day
+        columns["code"][slot] = code
+        columns["ship"][slot] = ship_id
+        columns["city"][slot] = city_id
+        columns["ref"][slot] = ref
+        columns["value"][slot] = value
+        columns["value2"][slot] = value2
+        self._next_seq += 1
+
+        if not self._indexed:
+            return seq
+        self._by_day.setdefault(day, []).append(seq)
+        if ship_id >= 0:
+            self._by_ship.setdefault(ship_id, []).append(seq)
+        if city_id >= 0:
+            self._by_city.setdefault(city_id, []).append(seq)
+        return seq
+
+    def append(self, text: str, day: int = -1):
+        """记录一条自由文本（兼容旧版 event_log.append）"""
+        seq = self.record(EVENT_MESSAGE, day)
+        if seq is not None:
+            self._texts[seq] = text
+
+    def _slot_for_write(self, seq: int) -> int:
+        capacity = len(self._columns["day"])
+        if self.max_records is None:
+            if seq == capacity:
+                for name, column in self._columns.items():
+                    grown = np.zeros(2 * capacity, dtype=column.dtype)
+                    grown[:capacity] = column
+                    self._columns[name] = grown
+            return seq
+        # 有界模式：覆盖最旧的一条
+        slot = seq % self.max_records
+        if seq - self._first_seq >= self.max_records:
+            oldest = self._first_seq
+            self._texts.pop(oldest, None)
+            # 被覆盖的事件一定是各索引列表的第一项
+            if self._indexed:
+                for index, key in ((self._by_day, int(self._columns["day"][slot])),
+                                   (self._by_ship, int(self._columns["ship"][slot])),
+                                   (self._by_city, int(self._columns["city"][slot]))):
+                    seqs = index.get(key)
+                    if seqs and seqs[0] == oldest:
+                        seqs.pop(0)
+                        if not seqs:
+                            del index[key]
+            self._first_seq += 1
+        return slot
+
+    def clear(self):
+        """清空日志"""
+        self._first_seq = self._next_seq
+        self._texts.clear()
+        self._by_day.clear()
+        self._by_ship.clear()
+        self._by_city.clear()
+        self._indexed = True
+
+    def _rebuild_indexes(self):
+        """由列数据重建日期、船只、城市索引"""
+        seqs = np.arange(self._first_seq, self._next_seq)
+        slots = seqs if self.max_records is None else seqs % self.max_records
+        for index, name in ((self._by_day, "day"), (self._by_ship, "ship"), (self._by_city, "city")):
+            index.clear()
+            keys = self._columns[name][slots]
+            if not len(keys):
+                continue
+            order = np.argsort(keys, kind='stable')
+            bounds = np.flatnonzero(np.diff(keys[order])) + 1
+            for group in np.split(order, bounds):
+                key = int(keys[group[0]])
+                if name == "day" or key >= 0:
+                    index[key] = seqs[group].tolist()
+        self._indexed = True
+
+    # ---- 读取 ----
+
+    def __len__(self) -> int:
+        return self._next_seq - self._first_seq
+
+    def _slot(self, seq: int) -> int:
+        return seq if self.max_records is None else seq % self.max_records
+
+    def get(self, seq: int) -> Event:
+        """读取一条事件"""
+        if not self._first_seq <= seq < self._next_seq:
+            raise IndexError(seq)
+        slot = self._slot(seq)
+        columns = self._columns
+        ship = int(columns["ship"][slot])
+        city = int(columns["city"][slot])
+        return Event(seq, int(columns["day"][slot]), int(columns["code"][slot]),
+                     self.ship_names[ship] if ship >= 0 else None,
+                     self.city_names[city] if city >= 0 else None,
+                     int(columns["ref"][slot]), float(columns["value"][slot]), float(columns["value2"][slot]))
+
+    def query(self, day: Optional[int] = None, ship: Optional[str] = None, city: Optional[str] = None,
+              codes: Optional[Iterable[int]] = None) -> List[Event]:
+        """按日期、船只、城市和类别筛选事件（各条件同时满足）"""
+        if not self._indexed:
+            self._rebuild_indexes()
+        candidates = None
+        for index, key in ((self._by_day, day),
+                           (self._by_ship, self._ship_ids.get(ship, -2) if ship is not None else None),
+                           (self._by_city, self._city_ids.get(city, -2) if city is not None else None)):
+            if key is None:
+                continue
+            seqs = self._live(index, key)
+            if candidates is None:
+                candidates = seqs
+            else:
+                kept = set(candidates)
+                candidates = [s for s in seqs if s in kept]
+        if candidates is None:
+            candidates = range(self._first_seq, self._next_seq)
+        if codes is not None:
+            wanted = set(codes)
+            code_column = self._columns["code"]
+            candidates = [s for s in candidates if code_column[self._slot(s)] in wanted]
+        return [self.get(seq) for seq in candidates]
+
+    def _live(self, index: Dict[int, List[int]], key: int) -> List[int]:
+        """索引中仍保留的序号（顺便丢弃有界模式下已被覆盖的部分）"""
+        seqs = index.get(key)
+        if not seqs:
+            return []
+        if seqs[0] < self._first_seq:
+            del seqs[:bisect.bisect_left(seqs, self._first_seq)]
+        return list(seqs)
+
+    def render(self, event: Event) -> str:
+        """生成事件的中文描述"""
+        prefix = f"第{event.day}天: "
+        code = event.code
+        if code == EVENT_MESSAGE:
+            return self._texts.get(event.seq, "")
+        if code == EVENT_CURRENCY:
+            direction = "增加" if event.value > 0 else "减少"
+            return f"{prefix}货币供应量{direction}了{abs(event.value)*100:.1f}%, 新供应量: {event.value2:.0f}"
+        if code == EVENT_ARRIVAL:
+            return f"{prefix}{event.ship} 抵达 {event.city}"
+        if code == EVENT_DEPARTURE:
+            days = int(event.value) if float(event.value).is_integer() else event.value
+            return f"{prefix}{event.ship} 从 {event.city} 出发前往 {self.city_names[event.ref]}，预计航行时间: {days}天"
+        if code == EVENT_SKILL_SAILING:
+            return f"{prefix}{event.ship} 航海技能提升"
+        if code == EVENT_SKILL_TRADING:
+            return f"{prefix}{event.ship} 贸易技能提升"
+        catalog_event = self._catalogs[code][event.ref]
+        if code == EVENT_WEATHER:
+            return f"{prefix}{event.ship} 在航行途中遇到 {catalog_event.name} - {catalog_event.description}"
+        if code == EVENT_PIRATE:
+            return (f"{prefix}{event.ship} 在航行途中遭遇 {catalog_event.name} - {catalog_event.description}，"
+                    f"损失 {int(event.value)} 金币")
+        if code == EVENT_CITY:
+            return f"{prefix}{event.city} 发生 {catalog_event.name} - {catalog_event.description}"
+        return prefix
+
+    def messages(self, **filters) -> List[str]:
+        """按条件筛选并渲染事件文本，参数同 query"""
+        return [self.render(event) for event in self.query(**filters)]
+
+    def __iter__(self) -> Iterator[str]:
+        for seq in range(self._first_seq, self._next_seq):
+            yield self.render(self.get(seq))
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return self.render(self.get(self._first_seq + i))
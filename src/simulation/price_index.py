@@ -0,0 +1,217 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..city import City
+
+
+class PriceIndex:
+    """
+    按商品维护售价最高和最低的前k个城市
+
+    城市价格变化时通知索引：单个商品的改动（如城市事件）增量调整排名，
+    每日整体调价只把该城市标记为待刷新，下次查询时一次性重建。
+    查询"除某城市外售价最高的城市"只需读取排名的前两项。
+    """
+
+    def __init__(self, cities: List[City], k: int = 4):
+        """
+        :param cities: 城市列表
+        :param k: 每种商品保留的排名长度（至少为2，才能排除当前城市）
+        """
+        self.cities = list(cities)
+        self.city_names = [city.name for city in cities]
+        self.city_index = {name: i for i, name in enumerate(self.city_names)}
+        self.goods = []
+        for city in cities:
+            for good in city.base_prices:
+                if good not in self.goods:
+                    self.goods.append(good)
+        self.good_index = {good: i for i, good in enumerate(self.goods)}
+        self.k = max(2, min(k, len(cities)))
+
+        shape = (len(cities), len(self.goods))
+        self.prices = np.full(shape, np.nan)
+        # 城市是否交易该商品
+        self.listed = np.zeros(shape, dtype=bool)
+        for row, city in enumerate(cities):
+            for good in city.base_prices:
+                self.listed[row, self.good_index[good]] = True
+
+        # 排名 {商品列: 城市行号列表}，最高价在前 / 最低价在前
+        self.top = [[] for _ in self.goods]
+        self.bottom = [[] for _ in self.goods]
+        self._market_cols = {}
+        self._dirty_rows = set(range(len(cities)))
+
+        for city in cities:
+            city.price_index = self
+
+    # ---- 价格变化通知 ----
+
+    def invalidate(self, city_name: Optional[str] = None):
+        """城市整体调价后调用；不指定城市时表示所有城市都已调价"""
+        if city_name is None:
+            self._dirty_rows.update(range(len(self.cities)))
+        else:
+            self._dirty_rows.add(self.city_index[city_name])
+
+    def update(self, city_name: str, good: str, price: float):
+        """单个商品价格变化，增量调整该商品的排名"""
+        row = self.city_index[city_name]
+        col = self.good_index[good]
+        old_price = self.prices[row, col]
+        self.prices[row, col] = price
+        if self._dirty_rows or not self.listed[row, col]:
+            return  # 等待整体重建，或该城市不交易此商品
+        self._reposition(self.top[col], col, row, old_price, -1.0)
+        self._reposition(self.bottom[col], col, row, old_price, 1.0)
+
+    # ---- 查询 ----
+
+    def best_sell(self, good: str, exclude: Optional[str] = None) -> Optional[Tuple[float, str]]:
+        """
+        获取售价最高的城市
+        :param exclude: 排除的城市（通常是船只当前所在城市）
+        :return: (价格, 城市名)，没有其他城市交易该商品时返回None
+        """
+        col = self.good_index.get(good)
+        if col is None:
+            return None
+        self._refresh()
+        excluded = self.city_index.get(exclude, -1)
+        for row in self.top[col][:2]:
+            if row != excluded:
+                return float(self.prices[row, col]), self.city_names[row]
+        return None
+
+    def cheapest(self, good: str, exclude: Optional[str] = None) -> Optional[Tuple[float, str]]:
+        """获取售价最低的城市，返回 (价格, 城市名)"""
+        col = self.good_index.get(good)
+        if col is None:
+            return None
+        self._refresh()
+        excluded = self.city_index.get(exclude, -1)
+        for row in self.bottom[col][:2]:
+            if row != excluded:
+                return float(self.prices[row, col]), self.city_names[row]
+        return None
+
+    def best_sells_among(self, city_names: List[str]) -> Dict[str, Tuple[float, str]]:
+        """
+        只在给定城市中查找各商品售价最高的城市（一次矩阵运算）
+        :return: {商品: (价格, 城市名)}，这些城市都不交易的商品不出现
+        """
+        self._refresh()
+        rows = np.array([self.city_index[name] for name in city_names], dtype=np.intp)
+        if len(rows) == 0:
+            return {}
+        prices = np.where(self.listed[rows], self.prices[rows], -np.inf)
+        best = np.argmax(prices, axis=0)
+        best_prices = prices[best, np.arange(len(self.goods))]
+        return {
+            good: (float(best_prices[col]), self.city_names[rows[best[col]]])
+            for col, good in enumerate(self.goods) if np.isfinite(best_prices[col])
+        }
+
+    def price_rows(self, city_names: List[str]) -> np.ndarray:
+        """给定城市的当前价格矩阵（城市×商品，列顺序同 goods），不交易的商品为 nan"""
+        self._refresh()
+        rows = np.array([self.city_index[name] for name in city_names], dtype=np.intp)
+        return np.where(self.listed[rows], self.prices[rows], np.nan)
+
+    def price_matrix(self) -> np.ndarray:
+        """刷新后的价格矩阵（城市×商品，不复制，只读）；不交易的商品的值无意义，需配合 listed 使用"""
+        self._refresh()
+        return self.prices
+
+    def top_spreads(self, n: int = 10) -> List[Dict]:
+        """全局价差最大的n个套利机会（在最便宜的城市买入，在最贵的城市卖出）"""
+        self._refresh()
+        spreads = []
+        for col, good in enumerate(self.goods):
+            if not self.top[col] or not self.bottom[col]:
+                continue
+            sell_row = self.top[col][0]
+            buy_row = self.bottom[col][0]
+            if sell_row == buy_row:
+                continue
+            sell_price = float(self.prices[sell_row, col])
+            buy_price = float(self.prices[buy_row, col])
+            spreads.append({
+                'good': good,
+                'buy_city': self.city_names[buy_row],
+                'buy_price': buy_price,
+                'sell_city': self.city_names[sell_row],
+                'sell_price': sell_price,
+                'spread': sell_price - buy_price
+            })
+        spreads.sort(key=lambda x: x['spread'], reverse=True)
+        return spreads[:n]
+
+    # ---- 内部维护 ----
+
+    def _pull_row(self, row: int):
+        """从城市读取整行价格"""
+        city = self.cities[row]
+        if city.market is not None:
+            cached = self._market_cols.get(row)
+            if cached is None or cached[0] is not city.market:
+                cols = np.array([city.market.index.get(good, 0) for good in self.goods], dtype=np.intp)
+                cached = self._market_cols[row] = (city.market, cols)
+            self.prices[row] = city.market.price[cached[1]]
+        else:
+            prices = city.current_prices
+            self.prices[row] = [prices.get(good, np.nan) for good in self.goods]
+
+    def _refresh(self):
+        """刷新待更新的城市并重建全部排名"""
+        if not self._dirty_rows:
+            return
+        for row in self._dirty_rows:
+            self._pull_row(row)
+        self._dirty_rows.clear()
+
+        for ranks, sign in ((self.top, -1.0), (self.bottom, 1.0)):
+            keys = np.where(self.listed, sign * self.prices, np.inf)
+            if len(self.cities) > 4 * self.k:
+                # 候选取不差于第k名的全部城市（含并列），再按(价格, 行号)排序，与全量扫描一致
+                kth = np.partition(keys, self.k - 1, axis=0)[self.k - 1]
+                candidates = (keys <= kth) & np.isfinite(keys)
+                for col in range(len(self.goods)):
+                    rows = np.flatnonzero(candidates[:, col])
+                    ranks[col] = rows[np.argsort(keys[rows, col], kind='stable')][:self.k].tolist()
+                continue
+            order = np.argsort(keys, axis=0, kind='stable')[:self.k]
+            valid = np.isfinite(np.take_along_axis(keys, order, axis=0))
+            for col in range(len(self.goods)):
+                ranks[col] = order[valid[:, col], col].tolist()
+
+    def _rebuild_good(self, ranks: List[int], col: int, sign: float):
+        """重新扫描单个商品的排名"""
+        keys = np.where(self.listed[:, col], sign * self.prices[:, col], np.inf)
+        order = np.argsort(keys, kind='stable')[:self.k]
+        ranks[:] = [int(row) for row in order if np.isfinite(keys[row])]
+
+    def _reposition(self, ranks: List[int], col: int, row: int, old_price: float, sign: float):
+        """价格变化后调整单个城市在排名中的位置"""
+        key = sign * self.prices[row, col]
+        full = len(ranks) == self.k
+        worst = None
+        if ranks:
+            last = ranks[-1]
+            worst = (sign * (old_price if last == row else self.prices[last, col]), last)
+        if row in ranks:
+            ranks.remove(row)
+            # 榜外城市都不优于原来的末位，新值仍不差于末位时无需扫描
+            if full and worst is not None and (key, row) > worst:
+                self._rebuild_good(ranks, col, sign)
+                return
+        elif full and (key, row) >= worst:
+            return
+        elif full:
+            ranks.pop()
+        position = 0
+        while position < len(ranks) and (sign * self.prices[ranks[position], col], ranks[position]) < (key, row):
+            position += 1
+        ranks.insert(position, row)
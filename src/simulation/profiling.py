@@ -0,0 +1,247 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 需要统计调用次数的热点函数：(模块路径, 对象名, 属性名)，对象名为空表示模块级函数
+COUNTED_CALLS = [
+    ("src.city", "City", "trade"),
+    ("src.ship", "Ship", "load_cargo"),
+    ("src.ship", "Ship", "unload_cargo"),
+    ("src.simulation.trading", "", "_find_best_trade"),
+]
+
+
+def _resolve(module: str, owner: str):
+    """找到被统计函数所在的模块或类"""
+    __import__(module)
+    target = sys.modules[module]
+    return getattr(target, owner) if owner else target
+
+
+class Profiler:
+    """
+    模拟逐日循环的计时和计数
+    - 每个阶段（航线、货币、城市、船只、事件）的累计耗时和每天耗时
+    - 热点函数的调用次数（见 COUNTED_CALLS）
+    - 交易决策耗时的直方图，按2的幂（纳秒）分桶：逐船模式每艘船一次，
+      批量策略和集中交易模式每批停靠船只一次
+
+    未启用时模拟中没有任何计时代码：enable() 才把计时的日更新和计数包装装上，disable() 还原。
+    计数包装替换的是类和模块上的函数，启用期间同一进程中的其他模拟也会被计数。
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.phase_days: Dict[str, List[float]] = {}  # 阶段 -> 每天耗时（秒）
+        self.day_times: List[float] = []  # 每天总耗时（秒）
+        self.calls = Counter()
+        self.decision_buckets = Counter()  # 决策耗时 bit_length -> 次数
+        self.decision_count = 0
+        self.decision_ships = 0  # 决策涉及的船只数（批量模式下多于决策次数）
+        self.decision_total_ns = 0
+        self.decision_max_ns = 0
+        self._patched: List[Tuple[object, str, Callable]] = []
+
+    def enable(self) -> 'Profiler':
+        """装上计时和计数包装"""
+        if self.simulation.profiler is not None:
+            raise RuntimeError("该模拟已启用性能分析")
+        self.simulation.profiler = self
+        for module, owner, name in COUNTED_CALLS:
+            target = _resolve(module, owner)
+            original = getattr(target, name)
+            setattr(target, name, self._counted(original, f"{owner or module.rsplit('.', 1)[-1]}.{name}"))
+            self._patched.append((target, name, original))
+        # 实例属性覆盖类方法，逐船、船队和事件调度三种模式都经过它；批量模式每批经过 trade_docked
+        simulation = self.simulation
+        simulation.perform_trading_strategy = self._timed_decision(simulation.perform_trading_strategy)
+        simulation.trade_docked = self._timed_batch(simulation.trade_docked)
+        return self
+
+    def disable(self):
+        """还原所有包装"""
+        for target, name, original in reversed(self._patched):
+            setattr(target, name, original)
+        self._patched.clear()
+        self.simulation.__dict__.pop("perform_trading_strategy", None)
+        self.simulation.__dict__.pop("trade_docked", None)
+        self.simulation.profiler = None
+
+    def __enter__(self) -> 'Profiler':
+        return self.enable()
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def _counted(self, function: Callable, key: str) -> Callable:
+        calls = self.calls
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            calls[key] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def _timed_decision(self, function: Callable) -> Callable:
+        clock = time.perf_counter_ns
+
+        def wrapper(ship):
+            start = clock()
+            function(ship)
+            self._record_decision(clock() - start, 1)
+        return wrapper
+
+    def _timed_batch(self, function: Callable) -> Callable:
+        clock = time.perf_counter_ns
+
+        def wrapper(ships):
+            if not ships:
+                return function(ships)
+            start = clock()
+            function(ships)
+            self._record_decision(clock() - start, len(ships))
+        return wrapper
+
+    def _record_decision(self, elapsed: int, ships: int):
+        self.decision_buckets[elapsed.bit_length()] += 1
+        self.decision_count += 1
+        self.decision_ships += ships
+        self.decision_total_ns += elapsed
+        if elapsed > self.decision_max_ns:
+            self.decision_max_ns = elapsed
+
+    def run_day(self, phases):
+        """
+        依次执行一天的各阶段并分别计时
+        :param phases: [(阶段名, 以模拟为参数的函数)]
+        """
+        clock = time.perf_counter
+        simulation = self.simulation
+        day_start = last = clock()
+        for name, phase in phases:
+            phase(simulation)
+            now = clock()
+            self.phase_days.setdefault(name, []).append(now - last)
+            last = now
+        self.day_times.append(last - day_start)
+
+    def record(self, name: str, seconds: float):
+        """记录一段不按天划分的耗时（如事件驱动模式的整段运行）"""
+        self.phase_days.setdefault(name, []).append(seconds)
+
+    def decision_histogram(self) -> List[Dict]:
+        """决策耗时直方图：[{"min_ns", "max_ns", "count"}]，区间左闭右开"""
+        return [{"min_ns": 1 << (bits - 1) if bits else 0, "max_ns": 1 << bits, "count": count}
+                for bits, count in sorted(self.decision_buckets.items())]
+
+    def report(self) -> Dict:
+        """汇总结果（可直接写成 JSON）"""
+        phases = {}
+        for name, samples in self.phase_days.items():
+            total = sum(samples)
+            phases[name] = {"total": total, "calls": len(samples), "mean": total / len(samples),
+                            "max": max(samples)}
+        return {
+            "days": len(self.day_times),
+            "total": sum(self.day_times),
+            "phases": phases,
+            "calls": dict(self.calls),
+            "decisions": {
+                "count": self.decision_count,
+                "ships": self.decision_ships,
+                "mean_ns": self.decision_total_ns / self.decision_count if self.decision_count else 0.0,
+                "max_ns": self.decision_max_ns,
+                "histogram": self.decision_histogram(),
+            },
+        }
+
+    def format_report(self) -> str:
+        """可读的文本摘要"""
+        report = self.report()
+        lines = [f"性能分析：{report['days']}天，逐日更新共 {report['total']:.3f}秒"]
+        for name, phase in report["phases"].items():
+            lines.append(f"  {name:10} 累计 {phase['total']:8.3f}秒  每次平均 {phase['mean'] * 1000:8.3f}毫秒"
+                         f"  最长 {phase['max'] * 1000:8.3f}毫秒")
+        lines.append("调用次数：")
+        for name, count in sorted(report["calls"].items()):
+            lines.append(f"  {name:32} {count}")
+        decisions = report["decisions"]
+        lines.append(f"交易决策：{decisions['count']}次（{decisions['ships']}艘次），平均 {decisions['mean_ns'] / 1000:.1f}微秒，"
+                     f"最长 {decisions['max_ns'] / 1000:.1f}微秒")
+        for bucket in decisions["histogram"]:
+            lines.append(f"  [{bucket['min_ns'] / 1000:>10.1f}, {bucket['max_ns'] / 1000:>10.1f}) 微秒  {bucket['count']}")
+        return "\n".join(lines)
+
+
+class StackSampler:
+    """
+    采样线程：定时抓取目标线程的调用栈，输出 flamegraph.pl / speedscope 可读的折叠栈格式
+    每行 "外层;...;内层 次数"
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'StackSampler':
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_run(run: Callable[[], None], output_dir: str, simulation=None,
+                interval: float = 0.005) -> Optional[Profiler]:
+    """
+    在 cProfile 和栈采样下执行 run，并把结果写到 output_dir：
+    profile.pstats（可用 pstats / snakeviz 查看）、profile.collapsed（折叠栈，用于火焰图）
+    以及给定模拟时的 profile.json（阶段耗时、调用次数和决策耗时直方图）
+    :return: 给定模拟时返回其 Profiler
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    profiler = Profiler(simulation).enable() if simulation is not None else None
+    sampler = StackSampler(interval).start()
+    stats = cProfile.Profile()
+    try:
+        stats.runcall(run)
+    finally:
+        sampler.stop()
+        if profiler is not None:
+            profiler.disable()
+    stats.dump_stats(os.path.join(output_dir, "profile.pstats"))
+    sampler.write(os.path.join(output_dir, "profile.collapsed"))
+    if profiler is not None:
+        with open(os.path.join(output_dir, "profile.json"), "w", encoding="utf-8") as f:
+            json.dump(profiler.report(), f, ensure_ascii=False, indent=2)
+    return profiler
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# 一张图表：文件名（不含扩展名）、图表类型和绘图数据（只含绘制需要的数组和数值）
+ChartJob = namedtuple("ChartJob", "name kind data")
+
+# 图表类型 -> (visualization 中的取数函数, 绘图函数)
+CHART_KINDS = {
+    "city_prices": ("city_prices_data", "draw_city_prices"),
+    "ship_gold": ("ship_gold_data", "draw_ship_gold"),
+    "trade_map": ("trade_map_data", "draw_trade_map"),
+    "currency_supply": ("currency_supply_data", "draw_currency_supply"),
+    "global_inflation": ("global_inflation_data", "draw_global_inflation"),
+    "city_currency_values": ("city_currency_data", "draw_city_currency"),
+}
+
+# 输出目录中记录各图表数据哈希的文件
+CACHE_FILE = ".chart_hashes.json"
+
+
+def chart_jobs(simulation, cities: Optional[Iterable[str]] = None,
+               ships: Optional[Iterable[str]] = None) -> List[ChartJob]:
+    """
+    生成一次模拟的全部图表任务
+    :param cities: 绘制价格历史的城市，默认全部
+    :param ships: 绘制资金历史的船只，默认全部
+    """
+    from . import visualization
+    jobs = []
+    for city_name in (simulation.cities if cities is None else cities):
+        if city_name in simulation.cities:
+            jobs.append(ChartJob(f"city_prices_{city_name}", "city_prices",
+                                 visualization.city_prices_data(simulation, city_name)))
+    for ship_name in (simulation.ships if ships is None else ships):
+        if ship_name in simulation.ships:
+            jobs.append(ChartJob(f"ship_gold_{ship_name}", "ship_gold",
+                                 visualization.ship_gold_data(simulation, ship_name)))
+    for kind in ("trade_map", "currency_supply", "global_inflation", "city_currency_values"):
+        jobs.append(ChartJob(kind, kind, getattr(visualization, CHART_KINDS[kind][0])(simulation)))
+    return jobs
+
+
+def _feed(digest, value):
+    """把绘图数据按结构写入哈希（数组按字节，字典按键排序）"""
+    if isinstance(value, np.ndarray):
+        digest.update(f"a{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, dict):
+        digest.update(f"d{len(value)}".encode())
+        for key in sorted(value, key=str):
+            _feed(digest, key)
+            _feed(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"l{len(value)}".encode())
+        for item in value:
+            _feed(digest, item)
+    else:
+        digest.update(f"s{value!r}".encode())
+
+
+def job_hash(job: ChartJob, image_format: str) -> str:
+    """图表数据的哈希，数据和格式都不变时无需重新绘制"""
+    digest = hashlib.sha1()
+    _feed(digest, (job.kind, image_format, job.data))
+    return digest.hexdigest()
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(job: ChartJob, path: str) -> str:
+    """在当前进程中绘制一张图表并保存"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from . import visualization
+
+    getattr(visualization, CHART_KINDS[job.kind][1])(**job.data)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def _load_cache(output_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(output_dir, CACHE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_charts(jobs: List[ChartJob], output_dir: str, image_format: str = "png",
+                  workers: Optional[int] = None, use_cache: bool = True) -> Dict[str, bool]:
+    """
+    绘制并保存图表
+    各任务分发到进程池中用 Agg 后端绘制，每个工作进程只收到该图表的数据。
+    输出目录中记录每张图表的数据哈希，数据未变且文件仍在的图表直接跳过。
+    :param workers: 进程数，默认CPU核数；0表示在当前进程中依次绘制
+    :param use_cache: 是否跳过数据未变化的图表
+    :return: {图表名: 是否重新绘制}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cache = _load_cache(output_dir) if use_cache else {}
+    hashes = {}
+    pending = []
+    for job in jobs:
+        path = os.path.join(output_dir, f"{job.name}.{image_format}")
+        hashes[path] = job_hash(job, image_format)
+        if cache.get(os.path.basename(path)) != hashes[path] or not os.path.exists(path):
+            pending.append((job, path))
+
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    workers = min(workers, len(pending))
+    if workers <= 1:
+        for job, path in pending:
+            _render(job, path)
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            list(pool.map(_render, *zip(*pending), chunksize=max(1, len(pending) // (4 * workers))))
+
+    # 只有全部绘制成功后才更新哈希记录
+    cache.update({os.path.basename(path): digest for path, digest in hashes.items()})
+    with open(os.path.join(output_dir, CACHE_FILE), "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=0)
+    rendered = {job.name for job, _ in pending}
+    return {job.name: job.name in rendered for job in jobs}
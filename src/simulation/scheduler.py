@@ -0,0 +1,197 @@
+import heapq
+import math
+import random
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .update import update_markets, arrive_ship, apply_city_event, apply_pirate_event
+
+# 同一天内的处理顺序：航线刷新 → 货币调整 → （城市日更新）→ 船只 → 城市事件 → 海盗
+PHASE_ROUTES = 0
+PHASE_CURRENCY = 1
+PHASE_SHIP = 2
+PHASE_CITY_EVENT = 3
+PHASE_PIRATE = 4
+
+# 船只事项
+SHIP_ARRIVAL = 0
+SHIP_DECISION = 1
+
+ROUTE_REFRESH_DAYS = 10
+CURRENCY_DAYS = 30
+
+
+class EventScheduler:
+    """
+    离散事件调度器
+
+    用优先队列保存按日期排序的待办事项：船只到港和停靠船只的决策、每10天的航线刷新、
+    每30天的货币调整，以及预先抽样的城市事件和海盗袭击日期。航行中的船只在出发时
+    就确定了到港日期，途中不再逐日处理；城市在下一个事项之前补上跳过的每日更新。
+
+    随机事件的日期由调度器自己的随机数生成器抽样，与逐日模式的概率相同，
+    但抽样顺序不同，因此同一种子下两种模式的结果不逐条一致。
+    航行途中船只的 days_in_transit 不逐日递增，只在运行结束时同步。
+    """
+
+    def __init__(self, simulation, rng: Optional[np.random.Generator] = None,
+                 city_event_chance: float = 0.1, pirate_chance: float = 0.05):
+        """
+        :param simulation: TradeSimulation 实例
+        :param rng: 抽样事件日期的随机数生成器，默认由全局 random 派生种子
+        :param city_event_chance: 每个城市每天发生城市事件的概率
+        :param pirate_chance: 航行中的船只每天遭遇海盗的概率
+        """
+        self.simulation = simulation
+        self.rng = rng or np.random.default_rng(random.getrandbits(64))
+        self.city_event_chance = city_event_chance
+        self.pirate_chance = pirate_chance
+        self.ship_order = {name: i for i, name in enumerate(simulation.ships)}
+        self.city_order = {name: i for i, name in enumerate(simulation.cities)}
+        self._queue = []
+        self._seq = 0
+        self._market_day = simulation.day  # 下一个尚未执行城市日更新的日期
+        # 航行中的船只 {船名: (出发日, 到港日)}
+        self._voyages: Dict[str, Tuple[int, int]] = {}
+        self.processed = 0  # 已处理的事项数
+        # 上一次运行结束的日期：从这一天继续运行时沿用未处理的事项，结果与不分段运行相同
+        self.resume_day: Optional[int] = None
+
+    def schedule(self, day: int, phase: int, key: int, kind: int, payload):
+        """加入一个事项，同一天同一阶段内按 key（船只或城市顺序）处理"""
+        heapq.heappush(self._queue, (day, phase, key, self._seq, kind, payload))
+        self._seq += 1
+
+    # ---- 运行 ----
+
+    def run(self, days: int):
+        """从当前日期起运行若干天"""
+        for _ in self.run_days(days):
+            pass
+
+    def run_days(self, days: int):
+        """
+        逐日运行的生成器，每天的事项处理完、城市更新到当天结束后产出一次，结果与 run 相同
+        航行中船只的 days_in_transit 仍只在最后同步。
+        从上一次运行结束的日期继续时沿用未处理的事项（不重新抽样事件日期）；
+        期间模拟被其他方式推进过（日期不同）时丢弃旧事项，按当前状态重新生成
+        """
+        simulation = self.simulation
+        start = simulation.day
+        end = start + days
+        self._market_day = start
+        if self.resume_day != start:
+            self._queue.clear()
+            self._voyages.clear()
+            self._prime(start)
+        self.resume_day = None
+
+        for stop in range(start + 1, end + 1):
+            while self._queue and self._queue[0][0] < stop:
+                day, phase, key, _, kind, payload = heapq.heappop(self._queue)
+                self._advance_to(day, phase)
+                self._dispatch(day, phase, kind, payload)
+                self.processed += 1
+            self._advance_to(stop, PHASE_ROUTES)
+            yield
+
+        self._sync_transit(end)
+        self.resume_day = end
+
+    def _prime(self, start: int):
+        """根据当前状态生成初始事项"""
+        simulation = self.simulation
+        self.schedule(self._next_multiple(start, ROUTE_REFRESH_DAYS), PHASE_ROUTES, 0, 0, None)
+        self.schedule(self._next_multiple(start, CURRENCY_DAYS), PHASE_CURRENCY, 0, 0, None)
+
+        for name, ship in simulation.ships.items():
+            if ship.in_transit:
+                # 已航行 days_in_transit 天，视作在 start-1 天结束时的状态
+                remaining = max(1, math.ceil(ship.travel_time - ship.days_in_transit))
+                self._schedule_voyage(ship, start - 1 - ship.days_in_transit, start - 1 + remaining, start)
+            elif ship.current_city:
+                self.schedule(start, PHASE_SHIP, self.ship_order[name], SHIP_DECISION, ship)
+
+        for name, city in simulation.cities.items():
+            self._schedule_city_event(city, start)
+
+    @staticmethod
+    def _next_multiple(day: int, period: int) -> int:
+        return -(-day // period) * period
+
+    def _advance_to(self, day: int, phase: int):
+        """把模拟日期推进到 day，并补上此前（以及当天船只阶段之前）跳过的城市日更新"""
+        simulation = self.simulation
+        while self._market_day < day or (self._market_day == day and phase >= PHASE_SHIP):
+            self._set_day(self._market_day)
+            simulation._blend_inflation()
+            update_markets(simulation)
+            self._market_day += 1
+        self._set_day(day)
+
+    def _set_day(self, day: int):
+        self.simulation.day = day
+        self.simulation._sync_day()
+
+    # ---- 事项处理 ----
+
+    def _dispatch(self, day: int, phase: int, kind: int, payload):
+        simulation = self.simulation
+        if phase == PHASE_ROUTES:
+            simulation.trade_map.update_route_conditions()
+            self.schedule(day + ROUTE_REFRESH_DAYS, PHASE_ROUTES, 0, 0, None)
+        elif phase == PHASE_CURRENCY:
+            simulation._adjust_currency_supply()
+            self.schedule(day + CURRENCY_DAYS, PHASE_CURRENCY, 0, 0, None)
+        elif phase == PHASE_SHIP:
+            self._dispatch_ship(day, kind, payload)
+        elif phase == PHASE_CITY_EVENT:
+            apply_city_event(simulation, payload, int(self.rng.integers(len(simulation.city_events))))
+            self._schedule_city_event(payload, day + 1)
+        elif phase == PHASE_PIRATE:
+            ship, departed = payload
+            # 只处理仍在同一次航行中的船只
+            if ship.in_transit and self._voyages.get(ship.name, (None,))[0] == departed:
+                apply_pirate_event(simulation, ship, int(self.rng.integers(len(simulation.pirate_events))))
+
+    def _dispatch_ship(self, day: int, kind: int, ship):
+        simulation = self.simulation
+        if kind == SHIP_ARRIVAL:
+            del self._voyages[ship.name]
+            arrive_ship(simulation, ship)
+            # 与逐日模式一致，到港当天不做决策
+            self.schedule(day + 1, PHASE_SHIP, self.ship_order[ship.name], SHIP_DECISION, ship)
+            return
+
+        if ship.in_transit or not ship.current_city:
+            return
+        simulation.perform_trading_strategy(ship)
+        if ship.in_transit:
+            self._schedule_voyage(ship, day, day + max(1, math.ceil(ship.travel_time)), day)
+        else:
+            self.schedule(day + 1, PHASE_SHIP, self.ship_order[ship.name], SHIP_DECISION, ship)
+
+    def _schedule_voyage(self, ship, departed: int, arrival: int, first_day: int):
+        """
+        登记一次航行：到港事项和途中预先抽样的海盗袭击
+        :param arrival: 到港日期
+        :param first_day: 第一个可能遭遇海盗的日期
+        """
+        order = self.ship_order[ship.name]
+        self._voyages[ship.name] = (departed, arrival)
+        self.schedule(arrival, PHASE_SHIP, order, SHIP_ARRIVAL, ship)
+        days = arrival - first_day
+        if days > 0:
+            for offset in np.flatnonzero(self.rng.random(days) < self.pirate_chance).tolist():
+                self.schedule(first_day + offset, PHASE_PIRATE, order, 0, (ship, departed))
+
+    def _schedule_city_event(self, city, first_day: int):
+        """按几何分布抽样城市下一次事件的日期"""
+        day = first_day + int(self.rng.geometric(self.city_event_chance)) - 1
+        self.schedule(day, PHASE_CITY_EVENT, self.city_order[city.name], 0, city)
+
+    def _sync_transit(self, end: int):
+        """运行结束时同步航行中船只的已航行天数，便于之后以逐日模式继续运行"""
+        for name, (departed, _) in self._voyages.items():
+            self.simulation.ships[name].days_in_transit = end - 1 - departed
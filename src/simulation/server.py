@@ -0,0 +1,327 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from .streaming import DayDelta, StreamLayout, _event_dict, _finite, delta_dict
+
+# 握手时与客户端密钥拼接的固定串（RFC 6455）
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_TEXT = 0x1
+WS_CLOSE = 0x8
+WS_PING = 0x9
+WS_PONG = 0xA
+# 客户端发来的单帧上限（只处理关闭和 ping，不需要更大的帧）
+WS_MAX_FRAME = 1 << 16
+# 等待请求头的秒数
+REQUEST_TIMEOUT = 10.0
+
+
+def _changes(previous: np.ndarray, current: np.ndarray) -> Dict:
+    """两天之间变化的单元格：按行展平的下标和新值（nan 写为 null）"""
+    same = (previous == current) | (np.isnan(previous) & np.isnan(current))
+    cells = np.flatnonzero(~same)
+    return {"cells": cells.tolist(), "values": _finite(current.ravel()[cells])}
+
+
+def delta_message(previous: DayDelta, current: DayDelta) -> Dict:
+    """
+    相对前一天的增量：价格和库存只含变化的单元格，船只只含位置、目的地、航行状态或资金有变化的，
+    以及当天的全部事件
+    """
+    moved = np.flatnonzero((previous.ship_city != current.ship_city)
+                           | (previous.ship_destination != current.ship_destination)
+                           | (previous.ship_in_transit != current.ship_in_transit)
+                           | (previous.ship_gold != current.ship_gold))
+    return {
+        "type": "delta",
+        "day": current.day,
+        "prices": _changes(previous.prices, current.prices),
+        "inventory": _changes(previous.inventory, current.inventory),
+        "ships": {
+            "index": moved.tolist(),
+            "city": current.ship_city[moved].tolist(),
+            "destination": current.ship_destination[moved].tolist(),
+            "in_transit": current.ship_in_transit[moved].tolist(),
+            "gold": current.ship_gold[moved].tolist(),
+        },
+        "events": [_event_dict(event) for event in current.events],
+    }
+
+
+def snapshot_message(delta: DayDelta) -> Dict:
+    """某一天的完整状态（新连接和跟不上的客户端收到它）"""
+    return {"type": "snapshot", **delta_dict(delta)}
+
+
+def _ws_frame(payload: bytes, opcode: int = WS_TEXT) -> bytes:
+    """服务端发出的帧（不加掩码、不分片）"""
+    length = len(payload)
+    if length < 126:
+        head = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return head + payload
+
+
+class LiveServer:
+    """
+    边运行边推送的模拟服务（只用标准库的 asyncio）
+
+    模拟按 tick 逐日推进，每一天在工作线程中计算并编码成 JSON，事件循环只负责网络读写，
+    推送不会阻塞模拟，模拟也不会阻塞连接。每天的增量只编码一次，保留最近 history 天；
+    每个客户端按自己的速度读取：跟得上时逐日收到增量，落后超过保留的天数时
+    （或刚连接时）合并为一次最新的完整快照，之后继续接收增量。
+
+    - GET /events：Server-Sent Events，事件名为消息类型
+    - GET /ws：WebSocket，每条消息是一个文本帧
+    - GET /：元数据（城市、商品、船只的顺序）和当前日期
+
+    消息都是 JSON：先是 {"type": "header", ...}，之后是 "snapshot" / "delta"，运行结束时是 "end"。
+    增量中价格和库存单元格的下标按 城市×商品 展平，顺序同 header。
+    """
+
+    def __init__(self, simulation, days: int, tick: float = 0.0, event_driven: bool = False,
+                 history: int = 16, resume: bool = False):
+        """
+        :param days: 运行天数
+        :param tick: 每个模拟日至少间隔的秒数，0表示尽快运行
+        :param history: 保留的增量天数，落后更多的客户端改为收到快照
+        :param resume: 从当前日期继续（同 TradeSimulation.resume），否则先初始化船只
+        """
+        self.simulation = simulation
+        self.tick = tick
+        self.header = {"type": "header", **StreamLayout(simulation).header()}
+        self._days = simulation.iter_days(days, event_driven=event_driven, resume=resume)
+        self._latest: Optional[DayDelta] = None
+        self._history: Deque[Tuple[int, str]] = deque(maxlen=max(1, history))
+        self._snapshot: Optional[Tuple[int, asyncio.Future]] = None
+        self._changed = asyncio.Event()
+        self._pumps: Set[asyncio.Task] = set()
+        self.finished = False
+
+    @property
+    def day(self) -> Optional[int]:
+        """最近推送的日期"""
+        return self._latest.day if self._latest is not None else None
+
+    @property
+    def clients(self) -> int:
+        return len(self._pumps)
+
+    # ---- 模拟 ----
+
+    def _step(self):
+        """在工作线程中推进一天，并编码相对前一天的增量"""
+        current = next(self._days, None)
+        if current is None:
+            return None
+        encoded = None
+        if self._latest is not None:
+            encoded = json.dumps(delta_message(self._latest, current), ensure_ascii=False)
+        return current, encoded
+
+    async def run(self):
+        """运行模拟直到结束，每天结束后通知所有客户端"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            result = await asyncio.to_thread(self._step)
+            if result is None:
+                break
+            current, encoded = result
+            if encoded is not None:
+                self._history.append((current.day, encoded))
+            self._latest = current
+            self._notify()
+            if self.tick > 0:
+                await asyncio.sleep(max(0.0, self.tick - (loop.time() - start)))
+        self.finished = True
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def snapshot(self) -> Tuple[int, str]:
+        """最新一天的快照，同一天只在工作线程中编码一次"""
+        latest = self._latest
+        if self._snapshot is None or self._snapshot[0] != latest.day:
+            task = asyncio.ensure_future(asyncio.to_thread(
+                lambda: json.dumps(snapshot_message(latest), ensure_ascii=False)))
+            self._snapshot = (latest.day, task)
+        day, task = self._snapshot
+        return day, await asyncio.shield(task)
+
+    async def finish(self, linger: float = 5.0):
+        """等客户端收完剩余消息，超过 linger 秒仍未收完的直接断开"""
+        if self._pumps:
+            _, pending = await asyncio.wait(set(self._pumps), timeout=linger)
+            for task in pending:
+                task.cancel()
+
+    # ---- 客户端 ----
+
+    async def _pump(self, send: Callable[[str, str], Awaitable[None]]):
+        """按客户端自己的速度推送消息，send(类型, JSON文本) 等待写入缓冲区排空"""
+        await send("header", json.dumps(self.header, ensure_ascii=False))
+        last_day = None
+        while True:
+            changed = self._changed
+            if self._latest is not None and (last_day is None or last_day < self._latest.day):
+                pending = [entry for entry in self._history if entry[0] > last_day] if last_day is not None else []
+                if pending and pending[0][0] == last_day + 1:
+                    for day, text in pending:
+                        await send("delta", text)
+                        last_day = day
+                else:
+                    # 刚连接，或落后超过保留的增量：合并为一次快照
+                    last_day, text = await self.snapshot()
+                    await send("snapshot", text)
+                continue
+            if self.finished:
+                await send("end", json.dumps({"type": "end", "day": last_day}))
+                return
+            await changed.wait()
+
+    async def _stream(self, send: Callable[[str, str], Awaitable[None]], closed: Awaitable[None]):
+        """推送直到结束或客户端断开"""
+        pump = asyncio.ensure_future(self._pump(send))
+        watch = asyncio.ensure_future(closed)
+        self._pumps.add(pump)
+        try:
+            done, _ = await asyncio.wait({pump, watch}, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled():
+                    task.exception()  # 客户端断开引起的错误不再抛出
+        finally:
+            pump.cancel()
+            watch.cancel()
+            self._pumps.discard(pump)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """asyncio.start_server 的连接处理函数"""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+            lines = request.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                name, sep, value = line.partition(":")
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            path = target.split("?", 1)[0]
+            if method != "GET":
+                await self._respond(writer, "405 Method Not Allowed", {"error": "只支持 GET"})
+            elif path == "/events":
+                await self._serve_sse(reader, writer)
+            elif path == "/ws":
+                await self._serve_websocket(reader, writer, headers)
+            elif path == "/":
+                await self._respond(writer, "200 OK", {**self.header, "type": "status", "day": self.day,
+                                                       "finished": self.finished, "clients": self.clients})
+            else:
+                await self._respond(writer, "404 Not Found", {"error": f"未知路径 {path}"})
+        except (ConnectionError, ValueError, TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str, body: Dict):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(payload)}\r\nAccess-Control-Allow-Origin: *\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + payload)
+        await writer.drain()
+
+    async def _serve_sse(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                     b"Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n")
+
+        async def send(kind: str, text: str):
+            writer.write(f"event: {kind}\ndata: {text}\n\n".encode("utf-8"))
+            await writer.drain()
+
+        async def closed():
+            while await reader.read(4096):
+                pass
+
+        await self._stream(send, closed())
+
+    async def _serve_websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               headers: Dict[str, str]):
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            await self._respond(writer, "400 Bad Request", {"error": "需要 WebSocket 握手"})
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("latin-1")).digest()).decode("ascii")
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1"))
+
+        async def send(kind: str, text: str):
+            writer.write(_ws_frame(text.encode("utf-8")))
+            await writer.drain()
+
+        await self._stream(send, self._read_websocket(reader, writer))
+        if not writer.is_closing():
+            writer.write(_ws_frame(struct.pack("!H", 1000), WS_CLOSE))
+
+    @staticmethod
+    async def _read_websocket(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """读取客户端的帧直到关闭：回应 ping，其余消息忽略"""
+        try:
+            while True:
+                first, second = await reader.readexactly(2)
+                opcode = first & 0x0F
+                length = second & 0x7F
+                if length == 126:
+                    (length,) = struct.unpack("!H", await reader.readexactly(2))
+                elif length == 127:
+                    (length,) = struct.unpack("!Q", await reader.readexactly(8))
+                if length > WS_MAX_FRAME:
+                    return
+                mask = await reader.readexactly(4) if second & 0x80 else b""
+                payload = await reader.readexactly(length)
+                if mask:
+                    payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+                if opcode == WS_CLOSE:
+                    return
+                if opcode == WS_PING:
+                    writer.write(_ws_frame(payload, WS_PONG))
+        except asyncio.IncompleteReadError:
+            return
+
+
+async def serve(simulation, days: int, host: str = "127.0.0.1", port: int = 8765, tick: float = 0.0,
+                event_driven: bool = False, history: int = 16, linger: float = 5.0,
+                on_ready: Callable[[Tuple], None] = None) -> LiveServer:
+    """
+    启动服务并运行模拟，结束后等客户端收完消息再关闭
+    :param on_ready: 开始监听后以实际地址 (host, port) 调用（port=0 时由系统分配端口）
+    其他参数同 LiveServer
+    """
+    live = LiveServer(simulation, days, tick=tick, event_driven=event_driven, history=history)
+    server = await asyncio.start_server(live.handle, host, port)
+    async with server:
+        if on_ready is not None:
+            on_ready(server.sockets[0].getsockname()[:2])
+        await live.run()
+        await live.finish(linger)
+    return live
+
+
+def run_server(simulation, days: int, **kwargs) -> LiveServer:
+    """同步入口：在新的事件循环中执行 serve"""
+    return asyncio.run(serve(simulation, days, **kwargs))
@@ -0,0 +1,273 @@
+from typing import Dict, List, Optional, Type, Union
+
+import numpy as np
+
+from ..market import QUALITY_ORDER
+from ..rng import SHIP_DESTINATION, roll_choice
+from .auction import BuyOrder, _match
+from .cargo import QUALITY_FACTORS, _read_stock, plan_cargo
+from .trading import _destination_candidates, _sell_all_cargo
+
+# 各船只偏好加分的质量（与 _find_best_trade 一致）
+_QUALITY_BONUS = np.isin(QUALITY_ORDER, ("精良", "极品"))
+_PRICE_BONUS = np.isin(QUALITY_ORDER, ("粗糙", "普通"))
+
+
+class DockedShips:
+    """
+    一批停靠船只的数组视图，交给批量交易策略做决策（货物已全部卖出）
+
+    船只属性是与 ships 对齐的数组；价格是价格索引的 城市×商品 矩阵（不复制，只读），
+    行顺序同 city_names，列顺序同 goods，配合 listed 判断城市是否交易该商品。
+    船只按所在港口分组：port[i] 是第 i 艘船所在港口在 ports 中的下标，
+    港口的库存、候选目的地和航线表按需查询。
+    """
+
+    def __init__(self, simulation, ships: List, candidates: Dict[str, List[str]]):
+        """
+        :param candidates: {港口名: 候选目的地城市名列表}
+        """
+        index = simulation.price_index
+        self.simulation = simulation
+        self.ships = list(ships)
+        self.goods = index.goods
+        self.city_names = index.city_names
+        self.prices = index.price_matrix()
+        self.listed = index.listed
+
+        ports: Dict[str, int] = {}
+        self.port = np.array([ports.setdefault(ship.current_city.name, len(ports)) for ship in self.ships],
+                             dtype=np.intp)
+        self.ports = [simulation.cities[name] for name in ports]
+        self.port_rows = np.array([index.city_index[name] for name in ports], dtype=np.intp)
+        self.destination_names = [candidates[name] for name in ports]
+
+        self.gold = np.array([ship.gold for ship in self.ships], dtype=float)
+        self.capacity = np.array([ship.capacity for ship in self.ships], dtype=float)
+        self.space = self.capacity - np.array([ship.used_capacity for ship in self.ships], dtype=float)
+        self.speed = np.array([ship.speed * ship.sailing_skill for ship in self.ships], dtype=float)
+        self.size = np.array([ship.size for ship in self.ships], dtype=float)
+        self.trading_skill = np.array([ship.trading_skill for ship in self.ships], dtype=float)
+        self.prefers_quality = np.array([ship.quality_preference == "质量" for ship in self.ships], dtype=bool)
+        self.prefers_price = np.array([ship.quality_preference == "价格" for ship in self.ships], dtype=bool)
+        self._stock: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ships)
+
+    def members(self, port: int) -> np.ndarray:
+        """停靠在第 port 个港口的船只下标"""
+        return np.flatnonzero(self.port == port)
+
+    def candidates(self, port: int) -> np.ndarray:
+        """港口的候选目的地（城市行号）"""
+        index = self.simulation.price_index
+        return np.array([index.city_index[name] for name in self.destination_names[port]], dtype=np.intp)
+
+    def stock(self, port: int) -> np.ndarray:
+        """港口的 商品×质量 库存（列顺序同 goods，不交易的商品为0）"""
+        stock = self._stock.get(port)
+        if stock is None:
+            cols = np.flatnonzero(self.listed[self.port_rows[port]])
+            stock = np.zeros((len(self.goods), len(QUALITY_ORDER)))
+            stock[cols] = _read_stock(self.ports[port], [self.goods[col] for col in cols])
+            self._stock[port] = stock
+        return stock
+
+    def route_costs(self, port: int, rows: np.ndarray, size: float) -> np.ndarray:
+        """从港口到各目的地（城市行号）的航线成本"""
+        return self.simulation.trade_map.route_costs_from(
+            self.ports[port].name, [self.city_names[row] for row in rows.tolist()], size)
+
+    def travel_times(self, port: int, rows: np.ndarray, speed: float) -> np.ndarray:
+        """从港口到各目的地（城市行号）的航行时间（天）"""
+        return self.simulation.trade_map.travel_times_from(
+            self.ports[port].name, [self.city_names[row] for row in rows.tolist()], speed)
+
+
+class TradeDecisions:
+    """
+    批量交易策略的结果
+    - destination：每艘船的目的地城市行号（同 DockedShips.city_names），-1 表示随机选择下一个城市
+    - 买单：ship / good / quality / amount 四个对齐的数组，分别是船只下标、商品列、质量下标（同 QUALITY_ORDER）
+      和数量，按当前价格买入。一艘船可以有多张买单，也可以没有（空船前往目的地）；
+      有买单但一件都没有装上的船只随机选择下一个城市
+    """
+
+    def __init__(self, destination: np.ndarray, ship=None, good=None, quality=None, amount=None):
+        self.destination = np.asarray(destination, dtype=np.intp)
+        self.ship = np.asarray(ship if ship is not None else [], dtype=np.intp)
+        self.good = np.asarray(good if good is not None else [], dtype=np.intp)
+        self.quality = np.asarray(quality if quality is not None else [], dtype=np.intp)
+        self.amount = np.asarray(amount if amount is not None else [], dtype=float)
+
+
+class TradeStrategy:
+    """
+    批量交易策略：每天一次收到所有停靠的船只（DockedShips），返回 TradeDecisions
+    子类实现 decide，用 register_strategy 登记名称后可以按名称创建（命令行和检查点恢复都按名称）
+    """
+    name: Optional[str] = None
+
+    def decide(self, view: DockedShips) -> TradeDecisions:
+        raise NotImplementedError
+
+
+# 策略名称 -> 策略类
+STRATEGIES: Dict[str, Type[TradeStrategy]] = {}
+
+
+def register_strategy(cls: Type[TradeStrategy]) -> Type[TradeStrategy]:
+    """登记策略类（可用作装饰器）"""
+    STRATEGIES[cls.name] = cls
+    return cls
+
+
+def make_strategy(strategy: Union[str, TradeStrategy, None]) -> Optional[TradeStrategy]:
+    """按名称创建策略，已经是策略对象或为None时原样返回"""
+    if strategy is None or isinstance(strategy, TradeStrategy):
+        return strategy
+    cls = STRATEGIES.get(strategy)
+    if cls is None:
+        raise ValueError(f"未知的交易策略: {strategy}（可选 {', '.join(sorted(STRATEGIES))}）")
+    return cls()
+
+
+@register_strategy
+class GreedyStrategy(TradeStrategy):
+    """
+    参考实现：与逐船的 perform_trading_strategy 相同的规则
+    每个港口一次算出各商品在候选目的地中的最高售价，所有船只对 商品×质量 的利润率评分
+    （按船只的质量偏好加分）取最高者，用50%的资金买入，前往该商品售价最高的城市
+    """
+    name = "greedy"
+
+    def __init__(self, budget_share: float = 0.5):
+        self.budget_share = budget_share
+
+    def decide(self, view: DockedShips) -> TradeDecisions:
+        destination = np.full(len(view), -1, dtype=np.intp)
+        adjust = np.ones((len(view), len(QUALITY_ORDER)))
+        adjust[np.ix_(view.prefers_quality, _QUALITY_BONUS)] = 1.2
+        adjust[np.ix_(view.prefers_price, _PRICE_BONUS)] = 1.1
+        orders = []
+        for port in range(len(view.ports)):
+            members = view.members(port)
+            rows = view.candidates(port)
+            if not len(rows):
+                continue
+            row = view.port_rows[port]
+            cols = np.flatnonzero(view.listed[row])
+            # 各商品在候选目的地中的最高售价和对应城市
+            sell = np.where(view.listed[rows][:, cols], view.prices[rows][:, cols], -np.inf)
+            best = sell.argmax(axis=0)
+            max_price = sell[best, np.arange(len(cols))]
+            buy = view.prices[row, cols][:, None] * QUALITY_FACTORS
+            usable = (view.stock(port)[cols] > 0) & (buy > 0) & np.isfinite(max_price)[:, None]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = np.where(usable, max_price[:, None] / buy, 0.0)
+            scores = (ratio[None] * adjust[members][:, None, :]).reshape(len(members), -1)
+            pick = scores.argmax(axis=1)
+            trading = scores[np.arange(len(members)), pick] > 0
+            members, pick = members[trading], pick[trading]
+            good, quality = np.divmod(pick, len(QUALITY_ORDER))
+            price = buy[good, quality]
+            destination[members] = rows[best[good]]
+            amount = np.minimum(view.gold[members] * self.budget_share / price, view.space[members])
+            orders.append((members, cols[good], quality, amount))
+        if not orders:
+            return TradeDecisions(destination)
+        return TradeDecisions(destination, *(np.concatenate(column) for column in zip(*orders)))
+
+
+@register_strategy
+class CargoPlannerStrategy(TradeStrategy):
+    """多商品装货规划（plan_cargo）逐船规划，包装成批量策略"""
+    name = "planner"
+
+    def decide(self, view: DockedShips) -> TradeDecisions:
+        simulation = view.simulation
+        index = simulation.price_index
+        destination = np.full(len(view), -1, dtype=np.intp)
+        ship_ids, goods, qualities, amounts = [], [], [], []
+        for i, ship in enumerate(view.ships):
+            port = view.port[i]
+            plan = plan_cargo(simulation, ship, view.ports[port], view.destination_names[port])
+            if plan is None:
+                continue
+            destination[i] = index.city_index[plan.destination.name]
+            for good, quality, amount, _ in plan.items:
+                ship_ids.append(i)
+                goods.append(index.good_index[good])
+                qualities.append(QUALITY_ORDER.index(quality))
+                amounts.append(amount)
+        return TradeDecisions(destination, ship_ids, goods, qualities, amounts)
+
+
+def run_strategy(simulation, ships: List):
+    """
+    用模拟的批量策略处理一批停靠的船只
+    1. 卖出全部货物（集中交易模式下卖出的货物加入城市库存）
+    2. 策略一次对所有船只做决策
+    3. 执行买单（集中交易模式下按港口与库存撮合），有目的地的船只出发，其余随机选择下一个城市
+    """
+    candidates: Dict[str, List[str]] = {}
+    docked = []
+    for ship in ships:
+        city = ship.current_city
+        if not city:
+            continue
+        if city.name not in candidates:
+            candidates[city.name] = _destination_candidates(simulation, city)
+        if candidates[city.name]:  # 只有一个城市时不做任何事
+            docked.append(ship)
+    if not docked:
+        return
+
+    sold: Dict[str, List] = {}
+    for ship in docked:
+        if simulation.batch_trading:
+            port_sold = sold.setdefault(ship.current_city.name, [])
+            for good, qualities in ship.cargo_by_quality.items():
+                port_sold.extend((good, quality, amount) for quality, amount in qualities.items() if amount > 0)
+        _sell_all_cargo(ship, ship.current_city)
+
+    view = DockedShips(simulation, docked, candidates)
+    decisions = simulation.strategy.decide(view)
+    goods = [view.goods[col] for col in decisions.good.tolist()]
+    qualities = [QUALITY_ORDER[q] for q in decisions.quality.tolist()]
+    prices = [view.ships[i].current_city.get_quality_price(good, quality)
+              for i, good, quality in zip(decisions.ship.tolist(), goods, qualities)]
+
+    fills = decisions.amount
+    if simulation.batch_trading:
+        fills = np.zeros(len(decisions.amount))
+        order_port = view.port[decisions.ship]
+        for port, city in enumerate(view.ports):
+            picked = np.flatnonzero(order_port == port)
+            orders = [BuyOrder(view.ships[decisions.ship[k]], goods[k], qualities[k], decisions.amount[k], prices[k])
+                      for k in picked.tolist()]
+            matched = _match(city, sold.get(city.name, []), orders)
+            if len(picked):
+                fills[picked] = matched
+
+    ship_orders: Dict[int, List[int]] = {}
+    for k, i in enumerate(decisions.ship.tolist()):
+        ship_orders.setdefault(i, []).append(k)
+    trade_map = simulation.trade_map
+    for i, ship in enumerate(view.ships):
+        city = ship.current_city
+        loaded = 0.0
+        for k in ship_orders.get(i, ()):
+            if fills[k] > 0 and prices[k] > 0:
+                loaded += ship.load_cargo(goods[k], float(fills[k]), prices[k], qualities[k])
+        target = int(decisions.destination[i])
+        if target >= 0 and (loaded > 0 or i not in ship_orders):
+            if loaded > 0:
+                # 记录资金历史
+                ship.gold_history.append(ship.gold)
+            if ship.set_route(city, simulation.cities[view.city_names[target]], trade_map):
+                continue
+        # 没有买到货物或目的地不可达时随机选择下一个城市
+        next_city_name = roll_choice(ship, SHIP_DESTINATION, view.destination_names[view.port[i]])
+        ship.set_route(city, simulation.cities[next_city_name], trade_map)
@@ -0,0 +1,343 @@
+import csv
+import json
+import os
+import queue
+import threading
+from collections import namedtuple
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# 一天结束时的状态：
+# prices / inventory 为 城市×商品 矩阵（城市不交易的商品为 nan / 0），
+# ship_city / ship_destination 为城市下标（-1表示无），ship_in_transit / ship_gold 按船只排列，
+# events 为当天新记录的事件（EventLog.Event）
+DayDelta = namedtuple("DayDelta", "day prices inventory ship_city ship_destination ship_in_transit ship_gold events")
+
+
+class StreamLayout:
+    """
+    每日状态的行列顺序，以及从模拟中取出这些数组的方法
+    城市和船只按模拟中的顺序，商品按价格索引中的顺序
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.city_names = list(simulation.cities)
+        self.goods = list(simulation.price_index.goods)
+        self.ship_names = list(simulation.ships)
+        self.city_index = {name: i for i, name in enumerate(self.city_names)}
+        good_index = {good: i for i, good in enumerate(self.goods)}
+
+        # 数组市场的城市：(行号, 布局中的列, 市场中的下标)，世界市场一次取出整个矩阵
+        self._market_rows = []
+        self._world_cols = None
+        market = simulation.market
+        if market is not None:
+            self._world_cols = np.array([market.index[good] for good in self.goods])
+        else:
+            for row, city in enumerate(simulation.cities.values()):
+                if city.market is not None:
+                    goods = [good for good in city.market.priced_goods if good in good_index]
+                    self._market_rows.append((row, np.array([good_index[good] for good in goods], dtype=np.intp),
+                                              np.array([city.market.index[good] for good in goods], dtype=np.intp)))
+        self._market_row_set = {row for row, _, _ in self._market_rows}
+        self._next_seq = simulation.event_log._next_seq
+
+    def header(self) -> Dict:
+        """写在输出开头的元数据"""
+        return {"cities": self.city_names, "goods": self.goods, "ships": self.ship_names}
+
+    def _city_arrays(self):
+        simulation = self.simulation
+        shape = (len(self.city_names), len(self.goods))
+        if self._world_cols is not None:
+            market = simulation.market
+            listed = simulation.price_index.listed
+            return (np.where(listed, market.price[:, self._world_cols], np.nan),
+                    np.where(listed, market.total[:, self._world_cols], 0.0))
+        prices = np.full(shape, np.nan)
+        inventory = np.zeros(shape)
+        for row, cols, index in self._market_rows:
+            market = simulation.cities[self.city_names[row]].market
+            prices[row, cols] = market.price[index]
+            inventory[row, cols] = market.total[index]
+        for row, city in enumerate(simulation.cities.values()):
+            if row in self._market_row_set:
+                continue
+            price_row = prices[row]
+            inventory_row = inventory[row]
+            for col, good in enumerate(self.goods):
+                price = city.current_prices.get(good)
+                if price is not None:
+                    price_row[col] = price
+                    inventory_row[col] = city.inventory.get(good, 0.0)
+        return prices, inventory
+
+    def _ship_arrays(self):
+        simulation = self.simulation
+        fleet = simulation.fleet
+        if fleet is not None:
+            # 船队中的城市下标换算为布局中的下标
+            lookup = np.array([self.city_index.get(city.name, -1) for city in fleet.cities] + [-1], dtype=np.int32)
+            return lookup[fleet.location], lookup[fleet.destination], fleet.in_transit.copy(), fleet.gold.copy()
+        n = len(self.ship_names)
+        city = np.full(n, -1, dtype=np.int32)
+        destination = np.full(n, -1, dtype=np.int32)
+        in_transit = np.zeros(n, dtype=bool)
+        gold = np.zeros(n)
+        for i, ship in enumerate(simulation.ships.values()):
+            for array, place in ((city, ship.current_city), (destination, ship.destination)):
+                if place is not None:
+                    array[i] = self.city_index.get(place if isinstance(place, str) else place.name, -1)
+            in_transit[i] = ship.in_transit
+            gold[i] = ship.gold
+        return city, destination, in_transit, gold
+
+    def _new_events(self) -> list:
+        event_log = self.simulation.event_log
+        start = max(self._next_seq, event_log._first_seq)
+        self._next_seq = event_log._next_seq
+        return [event_log.get(seq) for seq in range(start, event_log._next_seq)]
+
+    def capture(self) -> DayDelta:
+        """取出当前状态（数组都是副本，之后模拟继续运行也不会改变它们）"""
+        prices, inventory = self._city_arrays()
+        return DayDelta(self.simulation.day - 1, prices, inventory, *self._ship_arrays(), self._new_events())
+
+
+def _event_dict(event) -> Dict:
+    return {"code": event.code, "ship": event.ship, "city": event.city, "ref": event.ref,
+            "value": event.value, "value2": event.value2}
+
+
+def _finite(values: np.ndarray) -> list:
+    """数组转为 JSON 列表，nan 写为 null"""
+    return [None if value != value else value for value in values.tolist()]
+
+
+def delta_dict(delta: DayDelta) -> Dict:
+    """一天的完整状态转为可写成 JSON 的字典"""
+    return {
+        "day": delta.day,
+        "prices": [_finite(row) for row in delta.prices],
+        "inventory": delta.inventory.tolist(),
+        "ship_city": delta.ship_city.tolist(),
+        "ship_destination": delta.ship_destination.tolist(),
+        "ship_in_transit": delta.ship_in_transit.tolist(),
+        "ship_gold": delta.ship_gold.tolist(),
+        "events": [_event_dict(event) for event in delta.events],
+    }
+
+
+class Sink:
+    """
+    输出目标的基类：open 收到布局元数据，write 收到按日排列的一批 DayDelta，close 在运行结束时调用
+    这些方法都在后台写入线程中执行
+    """
+
+    def open(self, header: Dict):
+        pass
+
+    def write(self, batch: List[DayDelta]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(Sink):
+    """JSON Lines：第一行是元数据，之后每天一行"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def open(self, header: Dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+    def write(self, batch: List[DayDelta]):
+        lines = [json.dumps(delta_dict(delta), ensure_ascii=False) for delta in batch]
+        self._file.write("\n".join(lines) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CsvSink(Sink):
+    """
+    目录中的 CSV 文件：prices.csv、inventory.csv（每天每城市一行，商品为列）、
+    ships.csv（每天每艘船一行）和 events.csv
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._files = {}
+        self._writers = {}
+        self._header = None
+
+    def open(self, header: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        self._header = header
+        columns = {
+            "prices": ["day", "city"] + header["goods"],
+            "inventory": ["day", "city"] + header["goods"],
+            "ships": ["day", "ship", "city", "destination", "in_transit", "gold"],
+            "events": ["day", "code", "ship", "city", "ref", "value", "value2"],
+        }
+        for name, row in columns.items():
+            f = self._files[name] = open(os.path.join(self.directory, f"{name}.csv"), "w", encoding="utf-8", newline="")
+            self._writers[name] = csv.writer(f)
+            self._writers[name].writerow(row)
+
+    def write(self, batch: List[DayDelta]):
+        cities = self._header["cities"]
+        ships = self._header["ships"]
+        writers = self._writers
+        for delta in batch:
+            day = delta.day
+            for name, matrix in (("prices", delta.prices), ("inventory", delta.inventory)):
+                writers[name].writerows([day, city] + ["" if value != value else value for value in row]
+                                        for city, row in zip(cities, matrix.tolist()))
+            writers["ships"].writerows(
+                [day, ship, cities[city] if city >= 0 else "", cities[target] if target >= 0 else "", int(moving), gold]
+                for ship, city, target, moving, gold in zip(ships, delta.ship_city.tolist(),
+                                                            delta.ship_destination.tolist(),
+                                                            delta.ship_in_transit.tolist(), delta.ship_gold.tolist()))
+            writers["events"].writerows([day, event.code, event.ship or "", event.city or "", event.ref,
+                                         event.value, event.value2] for event in delta.events)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        self._writers.clear()
+
+
+class NpyChunkSink(Sink):
+    """
+    目录中的 .npy 分块文件：每批写一组 prices_XXXXX.npy、inventory_XXXXX.npy（天×城市×商品）、
+    ship_city / ship_destination / ship_in_transit / ship_gold_XXXXX.npy（天×船只）和 days_XXXXX.npy，
+    元数据写入 header.json。事件不是数值数组，不写入该格式。
+    """
+
+    FIELDS = ("prices", "inventory", "ship_city", "ship_destination", "ship_in_transit", "ship_gold")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._chunk = 0
+
+    def open(self, header: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "header.json"), "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False, indent=2)
+
+    def write(self, batch: List[DayDelta]):
+        suffix = f"{self._chunk:05d}.npy"
+        np.save(os.path.join(self.directory, f"days_{suffix}"), np.array([delta.day for delta in batch]))
+        for field in self.FIELDS:
+            np.save(os.path.join(self.directory, f"{field}_{suffix}"),
+                    np.stack([getattr(delta, field) for delta in batch]))
+        self._chunk += 1
+
+    @staticmethod
+    def load(directory: str, field: str) -> np.ndarray:
+        """按顺序读取并拼接某个字段的全部分块"""
+        chunks = sorted(name for name in os.listdir(directory)
+                        if name.startswith(field + "_") and name[len(field) + 1:-4].isdigit())
+        return np.concatenate([np.load(os.path.join(directory, name)) for name in chunks])
+
+
+class StreamWriter:
+    """
+    把每日状态分批交给后台线程写入各输出目标
+    队列有上限，写入跟不上时模拟会等待，内存中最多保留 batch_days × max_pending 天的数据
+    """
+
+    def __init__(self, layout: StreamLayout, sinks: Iterable[Sink], batch_days: int = 32, max_pending: int = 4):
+        """
+        :param batch_days: 每批的天数
+        :param max_pending: 等待写入的最大批数
+        """
+        self.layout = layout
+        self.sinks = list(sinks)
+        self.batch_days = batch_days
+        self._batch = []
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = None
+
+    def __enter__(self) -> 'StreamWriter':
+        header = self.layout.header()
+        for sink in self.sinks:
+            sink.open(header)
+        self._thread = threading.Thread(target=self._run, name="stream-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if self._error is not None:
+                continue  # 出错后丢弃剩余数据，让主线程不被阻塞
+            try:
+                for sink in self.sinks:
+                    sink.write(batch)
+            except BaseException as error:
+                self._error = error
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError("写入模拟输出失败") from self._error
+
+    def write(self, delta: DayDelta):
+        """加入一天的状态，攒满一批后交给写入线程"""
+        self._check()
+        self._batch.append(delta)
+        if len(self._batch) >= self.batch_days:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def close(self):
+        """写出剩余数据，等待写入线程结束并关闭所有输出"""
+        if self._thread is None:
+            return
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for sink in self.sinks:
+            sink.close()
+        self._check()
+
+
+# 输出格式 -> Sink 类（参数为文件或目录路径）
+SINK_FORMATS = {
+    "jsonl": JsonLinesSink,
+    "csv": CsvSink,
+    "npy": NpyChunkSink,
+}
+
+
+def make_sink(spec: str) -> Sink:
+    """
+    按 "格式:路径" 创建输出目标，例如 jsonl:run.jsonl、csv:out/csv、npy:out/chunks
+    :raises ValueError: 未知格式
+    """
+    kind, sep, path = spec.partition(":")
+    if not sep or kind not in SINK_FORMATS or not path:
+        raise ValueError(f"无法识别的输出目标 {spec!r}，格式应为 {'/'.join(SINK_FORMATS)}:路径")
+    return SINK_FORMATS[kind](path)
@@ -1,5 +1,7 @@
-import random
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List
+
+from ..rng import SHIP_DESTINATION, roll_choice
+from .cargo import load_plan, plan_cargo
 
 def perform_trading_strategy(simulation, ship):
     """简单的交易策略：低价买入高价卖出，考虑商品质量"""
@@ -7,10 +9,20 @@ def perform_trading_strategy(simulation, ship):
         return
     
     current_city = ship.current_city
-    other_cities = [name for name in simulation.city_names if name != current_city.name]
+    other_cities = _destination_candidates(simulation, current_city)
     if not other_cities: # 如果只有一个城市
         return
     
+    if simulation.cargo_planner:
+        # 多商品装货规划：卖出后按资金和舱位一次规划整船货物
+        _sell_all_cargo(ship, current_city)
+        plan = plan_cargo(simulation, ship, current_city, other_cities)
+        if plan is not None and load_plan(ship, current_city, plan, simulation.trade_map):
+            return
+        next_city_name = roll_choice(ship, SHIP_DESTINATION, other_cities)
+        ship.set_route(current_city, simulation.cities[next_city_name], simulation.trade_map)
+        return
+    
     # 寻找当前城市最适合购买并转卖到其他城市的商品
     best_buy, best_destination, best_quality = _find_best_trade(simulation, ship, current_city, other_cities)
     
@@ -22,9 +34,26 @@ def perform_trading_strategy(simulation, ship):
         return # 完成交易决策，等待航行
 
     # 如果没有找到好的买入机会，或者没有装载任何货物，随机选择下一个目的地
-    next_city_name = random.choice(other_cities)
+    next_city_name = roll_choice(ship, SHIP_DESTINATION, other_cities)
     ship.set_route(current_city, simulation.cities[next_city_name], simulation.trade_map)
     
+def _destination_candidates(simulation, current_city) -> List[str]:
+    """
+    候选目的地：默认是所有其他城市；
+    设置了 destination_limit / destination_radius 时只考虑最近的若干城市或一定距离内的城市，
+    半径内没有其他港口时退回最近的一个城市，船只不会一直停在孤立的港口。
+    只保留经航线可以到达的城市
+    """
+    trade_map = simulation.trade_map
+    if simulation.destination_limit is not None:
+        candidates = trade_map.nearest_cities(current_city.name, simulation.destination_limit)
+    elif simulation.destination_radius is not None:
+        candidates = (trade_map.cities_within(current_city.name, simulation.destination_radius)
+                      or trade_map.nearest_cities(current_city.name, 1))
+    else:
+        candidates = [name for name in simulation.city_names if name != current_city.name]
+    return trade_map.reachable_cities(current_city.name, candidates)
+
 def _find_best_trade(simulation, ship, current_city, other_cities) -> Tuple[str, object, str]:
     """
     寻找最佳交易商品、目的地和质量
@@ -35,6 +64,9 @@ def _find_best_trade(simulation, ship, current_city, other_cities) -> Tuple[str,
     best_buy_score = 0
     best_destination = None
     best_quality = "普通"
+    # 限定了候选目的地时，一次算出候选城市中各商品的最高售价
+    limited = simulation.destination_limit is not None or simulation.destination_radius is not None
+    candidate_best = simulation.price_index.best_sells_among(other_cities) if limited else None
     
     for good in current_city.current_prices:
         # 获取当前城市中所有可用质量的商品
@@ -42,6 +74,16 @@ def _find_best_trade(simulation, ship, current_city, other_cities) -> Tuple[str,
         
         if not available_qualities:  # 没有库存，跳过
             continue
+        
+        # 从价格索引查询其他城市中的最高价和对应的城市
+        # 假设在其他城市能以普通质量卖出（保守估计）
+        if candidate_best is not None:
+            best_sell = candidate_best.get(good)
+        else:
+            best_sell = simulation.price_index.best_sell(good, exclude=current_city.name)
+        if best_sell is None:
+            continue
+        max_price, dest_city_name = best_sell
             
         # 遍历每种可用质量
         for quality, amount in available_qualities.items():
@@ -52,20 +94,6 @@ def _find_best_trade(simulation, ship, current_city, other_cities) -> Tuple[str,
             buy_price = current_city.get_quality_price(good, quality)
             if buy_price <= 0:
                 continue
-                
-            # 在其他城市寻找最高价和对应的城市
-            potential_destinations = []
-            for city_name in other_cities:
-                city = simulation.cities[city_name]
-                # 假设在其他城市能以普通质量卖出（保守估计）
-                # 实际上，应该查询能获得的最高价格
-                sell_price = city.current_prices[good]
-                potential_destinations.append((sell_price, city_name))
-            
-            if not potential_destinations:
-                continue
-                
-            max_price, dest_city_name = max(potential_destinations, key=lambda x: x[0])
             
             # 计算利润率而不是绝对利润
             profit_ratio = max_price / buy_price if buy_price > 0 else 0
@@ -123,7 +151,7 @@ def _execute_trade(ship, current_city, best_buy, best_destination, best_quality,
         if loaded_amount > 0:
             # 记录资金历史
             ship.gold_history.append(ship.gold)
-            ship.set_route(current_city, best_destination, trade_map)
-            return True
+            # 目的地不可达时由调用方另选港口
+            return ship.set_route(current_city, best_destination, trade_map)
             
     return False 
\ No newline at end of file
@@ -1,27 +1,104 @@
-import random
 from typing import Optional
 
+import numpy as np
+
+from ..rng import (SHIP_SKILL_ROLL, SHIP_SKILL_KIND, SHIP_WEATHER_ROLL, SHIP_WEATHER_PICK, SHIP_PIRATE_ROLL,
+                   SHIP_PIRATE_PICK, CITY_EVENT_ROLL, CITY_EVENT_PICK, roll, roll_index)
+from .auction import batch_trade
+from .strategy import run_strategy
+from .event_log import (EVENT_ARRIVAL, EVENT_DEPARTURE, EVENT_WEATHER, EVENT_SKILL_SAILING,
+                        EVENT_SKILL_TRADING, EVENT_PIRATE, EVENT_CITY)
+
 def update_simulation(simulation):
     """更新模拟的状态，包括船只位置、城市价格等"""
     # 更新城市价格
-    for city in simulation.cities.values():
-        city.update_prices()
-        city.update_quality_distribution()
-        city.record_price_history()
+    update_markets(simulation)
 
     # 更新船只状态和位置
-    for ship_name, ship in simulation.ships.items():
-        if ship.in_transit:
-            # 船只在航行中，更新位置
-            update_ship_in_transit(simulation, ship)
-        else:
-            # 船只在港口，决定下一步行动
-            if ship.current_city:
-                simulation.perform_trading_strategy(ship)
+    update_ships(simulation)
             
     # 随机触发事件
     trigger_random_events(simulation)
 
+def update_routes(simulation):
+    """更新航线状态（每10天更新一次）"""
+    if simulation.day % 10 == 0:
+        simulation.trade_map.update_route_conditions()
+
+def update_currency(simulation):
+    """更新货币系统"""
+    simulation._update_currency_system()
+
+def update_ships(simulation):
+    """航行中的船只前进，停靠的船只做交易决策"""
+    if simulation.fleet is not None:
+        update_fleet(simulation)
+    elif simulation.strategy is not None or simulation.batch_trading:
+        # 批量策略或集中交易：先推进航行中的船只，再一次处理今天开始时停靠的船只
+        docked = []
+        for ship in simulation.ships.values():
+            if ship.in_transit:
+                update_ship_in_transit(simulation, ship)
+            elif ship.current_city:
+                docked.append(ship)
+        simulation.trade_docked(docked)
+    else:
+        for ship_name, ship in simulation.ships.items():
+            if ship.in_transit:
+                # 船只在航行中，更新位置
+                update_ship_in_transit(simulation, ship)
+            else:
+                # 船只在港口，决定下一步行动
+                if ship.current_city:
+                    simulation.perform_trading_strategy(ship)
+
+def trade_docked(simulation, ships):
+    """一次处理一批停靠的船只：设置了批量策略时交给策略，否则按港口集中撮合"""
+    if simulation.strategy is not None:
+        run_strategy(simulation, ships)
+    else:
+        batch_trade(simulation, ships)
+
+def update_markets(simulation):
+    """推进所有城市一天的价格、库存和货币"""
+    if simulation.market is not None:
+        # 世界市场矩阵一次推进全部城市
+        simulation.market.step()
+        simulation.price_index.invalidate()
+    else:
+        for city in simulation.cities.values():
+            city.update_prices()
+            city.update_quality_distribution()
+            city.update_currency()
+            city.record_price_history()
+
+def update_fleet(simulation):
+    """船队数组模式：批量推进航行中的船只，再让停靠的船只做决策"""
+    fleet = simulation.fleet
+    # 今天开始时停靠的船只（今天到港的船只明天才做决策，与逐船更新一致）
+    docked = fleet.docked()
+    arrived = fleet.advance_transit()
+    rolls = None
+    if simulation.streams is not None:
+        # 每艘到港船只当天预抽的随机数，结果与逐船更新一致
+        rolls = np.array([fleet.ships[row].draws.row()[SHIP_SKILL_ROLL:SHIP_SKILL_KIND + 1]
+                          for row in arrived.tolist()]).reshape(-1, 2)
+    sailing_rows, trading_rows = fleet.roll_skill_ups(arrived, rolls=rolls)
+
+    for row in arrived.tolist():
+        ship = fleet.ships[row]
+        ship.gold_history.append(ship.gold)
+        simulation.event_log.record(EVENT_ARRIVAL, simulation.day, ship=ship.name, city=ship.current_city.name)
+    for rows, code in ((sailing_rows, EVENT_SKILL_SAILING), (trading_rows, EVENT_SKILL_TRADING)):
+        for row in rows.tolist():
+            simulation.event_log.record(code, simulation.day, ship=fleet.ships[row].name)
+
+    if simulation.strategy is not None or simulation.batch_trading:
+        simulation.trade_docked([fleet.ships[row] for row in docked.tolist()])
+        return
+    for row in docked.tolist():
+        simulation.perform_trading_strategy(fleet.ships[row])
+
 def update_ship_in_transit(simulation, ship):
     """更新正在航行中的船只状态"""
     # 增加航行天数
@@ -29,30 +106,32 @@ def update_ship_in_transit(simulation, ship):
     
     # 检查是否到达目的地
     if ship.days_in_transit >= ship.travel_time:
-        # 到达目的地
-        destination = ship.destination
-        destination_name = destination.name if hasattr(destination, 'name') else destination
-        ship.current_city = simulation.cities[destination_name] if isinstance(destination, str) else destination
-        ship.destination = None
-        ship.days_in_transit = 0
-        ship.travel_time = 0
-        ship.in_transit = False
-        
-        # 记录资金历史
-        ship.gold_history.append(ship.gold)
-        
-        # 记录事件
-        log_entry = f"第{simulation.day}天: {ship.name} 抵达 {destination_name if isinstance(destination, str) else destination.name}"
-        simulation.event_log.append(log_entry)
-        
-        # 随机增加航海或贸易技能（10%几率）
-        if random.random() < 0.1:
-            if random.random() < 0.5:
-                ship.improve_sailing_skill()
-                simulation.event_log.append(f"第{simulation.day}天: {ship.name} 航海技能提升")
-            else:
-                ship.improve_trading_skill()
-                simulation.event_log.append(f"第{simulation.day}天: {ship.name} 贸易技能提升")
+        arrive_ship(simulation, ship)
+
+def arrive_ship(simulation, ship):
+    """船只抵达目的地：更新位置、记录资金和事件，并随机提升技能"""
+    destination = ship.destination
+    destination_name = destination.name if hasattr(destination, 'name') else destination
+    ship.current_city = simulation.cities[destination_name] if isinstance(destination, str) else destination
+    ship.destination = None
+    ship.days_in_transit = 0
+    ship.travel_time = 0
+    ship.in_transit = False
+    
+    # 记录资金历史
+    ship.gold_history.append(ship.gold)
+    
+    # 记录事件
+    simulation.event_log.record(EVENT_ARRIVAL, simulation.day, ship=ship.name, city=destination_name)
+    
+    # 随机增加航海或贸易技能（10%几率）
+    if roll(ship, SHIP_SKILL_ROLL) < 0.1:
+        if roll(ship, SHIP_SKILL_KIND) < 0.5:
+            ship.improve_sailing_skill()
+            simulation.event_log.record(EVENT_SKILL_SAILING, simulation.day, ship=ship.name)
+        else:
+            ship.improve_trading_skill()
+            simulation.event_log.record(EVENT_SKILL_TRADING, simulation.day, ship=ship.name)
 
 def set_ship_route(simulation, ship, destination_name):
     """设置船只新的航行路线"""
@@ -62,12 +141,14 @@ def set_ship_route(simulation, ship, destination_name):
     # 计算航行时间和成本
     travel_time, route_cost = calculate_travel_params(simulation, ship, ship.current_city.name, destination_name)
     
-    # 设置船只航行状态
-    ship.set_route(ship.current_city, simulation.cities[destination_name], simulation.trade_map)
+    # 设置船只航行状态（沿用上面算好的航行时间，不再重复计算），目的地不可达时不出发
+    if not ship.set_route(ship.current_city, simulation.cities[destination_name], simulation.trade_map,
+                          travel_time):
+        return False
     
     # 记录事件
-    log_entry = f"第{simulation.day}天: {ship.name} 从 {ship.current_city.name} 出发前往 {destination_name}，预计航行时间: {travel_time}天"
-    simulation.event_log.append(log_entry)
+    simulation.event_log.record(EVENT_DEPARTURE, simulation.day, ship=ship.name, city=ship.current_city.name,
+                                target=destination_name, value=travel_time)
     
     return True
 
@@ -93,13 +174,13 @@ def apply_weather_events(simulation, ship):
     ship.weather_events = []
     
     # 50%的概率触发天气事件
-    if random.random() < 0.5:
-        weather_event = random.choice(simulation.weather_events)
+    if roll(ship, SHIP_WEATHER_ROLL) < 0.5:
+        event_ref = roll_index(ship, SHIP_WEATHER_PICK, len(simulation.weather_events))
+        weather_event = simulation.weather_events[event_ref]
         ship.weather_events.append(weather_event)
         
         # 记录事件
-        log_entry = f"第{simulation.day}天: {ship.name} 在航行途中遇到 {weather_event.name} - {weather_event.description}"
-        simulation.event_log.append(log_entry)
+        simulation.event_log.record(EVENT_WEATHER, simulation.day, ship=ship.name, ref=event_ref)
         
         return weather_event.speed_multiplier
     
@@ -110,28 +191,43 @@ def trigger_random_events(simulation):
     # 对每个城市触发事件
     for city_name, city in simulation.cities.items():
         # 10%的概率触发城市事件
-        if random.random() < 0.1:
-            event = random.choice(simulation.city_events)
-            affected_goods = event.affected_goods if event.affected_goods else list(city.base_prices.keys())
-            
-            # 应用事件效果
-            for good in affected_goods:
-                if good in city.base_prices:
-                    city.modify_price_multiplier(good, event.price_modifier)
-            
-            # 记录事件
-            log_entry = f"第{simulation.day}天: {city_name} 发生 {event.name} - {event.description}"
-            simulation.event_log.append(log_entry)
+        if roll(city, CITY_EVENT_ROLL) < 0.1:
+            apply_city_event(simulation, city, roll_index(city, CITY_EVENT_PICK, len(simulation.city_events)))
     
     # 对每个在航行中的船只可能触发海盗事件
     for ship_name, ship in simulation.ships.items():
-        if ship.in_transit and random.random() < 0.05:  # 5%的概率
-            pirate_event = random.choice(simulation.pirate_events)
-            
-            # 计算海盗造成的损失
-            gold_loss = int(ship.gold * pirate_event.steal_percent)
-            ship.gold -= gold_loss
-            
-            # 记录事件
-            log_entry = f"第{simulation.day}天: {ship.name} 在航行途中遭遇 {pirate_event.name} - {pirate_event.description}，损失 {gold_loss} 金币"
-            simulation.event_log.append(log_entry) 
\ No newline at end of file
+        if ship.in_transit and roll(ship, SHIP_PIRATE_ROLL) < 0.05:  # 5%的概率
+            apply_pirate_event(simulation, ship, roll_index(ship, SHIP_PIRATE_PICK, len(simulation.pirate_events)))
+
+def apply_city_event(simulation, city, event_ref: int):
+    """对城市应用城市事件目录中的第 event_ref 个事件"""
+    event = simulation.city_events[event_ref]
+    affected_goods = event.affected_goods if event.affected_goods else list(city.base_prices.keys())
+    
+    # 应用事件效果
+    for good in affected_goods:
+        if good in city.base_prices:
+            city.modify_price_multiplier(good, event.price_modifier)
+    
+    # 记录事件
+    simulation.event_log.record(EVENT_CITY, simulation.day, city=city.name, ref=event_ref)
+
+def apply_pirate_event(simulation, ship, event_ref: int):
+    """航行中的船只遭遇海盗事件目录中的第 event_ref 个事件"""
+    pirate_event = simulation.pirate_events[event_ref]
+    
+    # 计算海盗造成的损失
+    gold_loss = int(ship.gold * pirate_event.steal_percent)
+    ship.gold -= gold_loss
+    
+    # 记录事件
+    simulation.event_log.record(EVENT_PIRATE, simulation.day, ship=ship.name, ref=event_ref, value=gold_loss)
+
+# 一天更新的各阶段，按顺序执行，与 TradeSimulation.update 一致（性能分析时逐阶段计时）
+DAY_PHASES = (
+    ("routes", update_routes),
+    ("currency", update_currency),
+    ("markets", update_markets),
+    ("ships", update_ships),
+    ("events", trigger_random_events),
+)
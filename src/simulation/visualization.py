@@ -1,11 +1,15 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
-def plot_city_prices(simulation, city_name: str):
-    """绘制城市商品价格历史"""
-    if city_name not in simulation.cities:
-        return
-    
+# 配置matplotlib支持中文显示（导入绘图模块时设置一次）
+plt.rcParams['font.sans-serif'] = ['SimHei']  # 用来正常显示中文标签
+plt.rcParams['axes.unicode_minus'] = False    # 用来正常显示负号
+
+# 每种图表分为两步：*_data 从模拟中取出绘图需要的数组（可以 pickle 后交给其他进程），
+# draw_* 只根据这些数据在当前图形上绘制；plot_* 两步一起执行
+
+def city_prices_data(simulation, city_name: str) -> dict:
+    """城市价格历史图的数据：价格波动最大的6种商品的价格序列"""
     city = simulation.cities[city_name]
     
     # 选择价格波动较大的商品进行展示
@@ -16,11 +20,13 @@ def plot_city_prices(simulation, city_name: str):
     
     # 按价格波动排序，只展示波动最大的6种商品
     top_goods = sorted(price_volatility.items(), key=lambda x: x[1], reverse=True)[:6]
-    top_goods = [good for good, _ in top_goods]
-    
+    return {"city_name": city_name,
+            "series": {good: np.asarray(city.price_history[good], dtype=float) for good, _ in top_goods}}
+
+def draw_city_prices(city_name: str, series: dict):
+    """绘制城市商品价格历史"""
     plt.figure(figsize=(12, 6))
-    for good in top_goods:
-        prices = city.price_history[good]
+    for good, prices in series.items():
         if len(prices) > 1:  # 确保有足够的数据点
             plt.plot(prices, label=good)
     
@@ -30,6 +36,12 @@ def plot_city_prices(simulation, city_name: str):
     plt.legend()
     plt.grid(True)
 
+def plot_city_prices(simulation, city_name: str):
+    """绘制城市商品价格历史"""
+    if city_name not in simulation.cities:
+        return
+    draw_city_prices(**city_prices_data(simulation, city_name))
+
 def plot_city_quality_distribution(city):
     """绘制城市商品质量分布"""
     plt.figure(figsize=(14, 8))
@@ -73,32 +85,39 @@ def plot_city_quality_distribution(city):
     plt.grid(axis='y', linestyle='--', alpha=0.7)
     plt.show()
 
-def plot_ship_gold(simulation, ship_name: str):
-    """绘制船只资金历史"""
-    if ship_name not in simulation.ships:
-        return
-    
+def ship_gold_data(simulation, ship_name: str) -> dict:
+    """船只资金历史图的数据：资金序列和航线标记 (天数, 资金, 说明)"""
     ship = simulation.ships[ship_name]
+    gold = np.asarray(ship.gold_history, dtype=float)
     
+    # 事件标记
+    events = [t for t in ship.trade_history if t["type"] == "route"]
+    markers = []
+    for i, event in enumerate(events):
+        if i > 0 and i < len(gold):
+            day = events[i-1]["day"] if "day" in events[i-1] else i * 10  # 估计天数
+            markers.append((day, float(gold[i]), f"{event['from']}->{event['to']}"))
+    return {"ship_name": ship_name, "gold": gold, "markers": markers}
+
+def draw_ship_gold(ship_name: str, gold: np.ndarray, markers: list):
+    """绘制船只资金历史"""
     plt.figure(figsize=(10, 6))
-    plt.plot(ship.gold_history)
+    plt.plot(gold)
     plt.title(f"{ship_name}的资金历史")
     plt.xlabel("天数")
     plt.ylabel("金币")
     plt.grid(True)
     
     # 添加事件标记
-    events = [t for t in ship.trade_history if t["type"] == "route"]
-    
-    for i, event in enumerate(events):
-        if i > 0 and i < len(ship.gold_history):
-            try:
-                day = events[i-1]["day"] if "day" in events[i-1] else i * 10  # 估计天数
-                plt.axvline(x=day, color='r', linestyle='--', alpha=0.3)
-                plt.text(day, ship.gold_history[i], f"{event['from']}->{event['to']}", 
-                         fontsize=8, rotation=45, ha='right')
-            except (IndexError, KeyError):
-                pass  # 忽略数据不完整的情况
+    for day, value, label in markers:
+        plt.axvline(x=day, color='r', linestyle='--', alpha=0.3)
+        plt.text(day, value, label, fontsize=8, rotation=45, ha='right')
+
+def plot_ship_gold(simulation, ship_name: str):
+    """绘制船只资金历史"""
+    if ship_name not in simulation.ships:
+        return
+    draw_ship_gold(**ship_gold_data(simulation, ship_name))
 
 def plot_ship_trading_history(ship):
     """绘制船只交易历史和质量偏好"""
@@ -157,49 +176,53 @@ def plot_ship_trading_history(ship):
     plt.tight_layout()
     plt.show()
 
-def plot_map(simulation):
+def trade_map_data(simulation) -> dict:
+    """贸易地图的数据：城市坐标和航线 (x1, y1, x2, y2, 危险度, 海况, 距离)"""
+    trade_map = simulation.trade_map
+    routes = []
+    for (city_a, city_b), conditions in trade_map.route_conditions.items():
+        if city_a in trade_map.city_coords and city_b in trade_map.city_coords:
+            x1, y1 = trade_map.city_coords[city_a]
+            x2, y2 = trade_map.city_coords[city_b]
+            routes.append((x1, y1, x2, y2, conditions.get('危险度', 0), conditions.get('海况', 0),
+                           trade_map.get_distance(city_a, city_b)))
+    return {"coords": dict(trade_map.city_coords), "routes": routes}
+
+def draw_trade_map(coords: dict, routes: list):
     """绘制贸易地图"""
     plt.figure(figsize=(12, 10))
     
     # 绘制城市节点
-    for city_name, (x, y) in simulation.trade_map.city_coords.items():
+    for city_name, (x, y) in coords.items():
         plt.scatter(x, y, s=200, alpha=0.7)
         plt.text(x, y+5, city_name, ha='center', fontsize=10)
     
     # 绘制航线
-    for (city_a, city_b), conditions in simulation.trade_map.route_conditions.items():
-        if city_a in simulation.trade_map.city_coords and city_b in simulation.trade_map.city_coords:
-            x1, y1 = simulation.trade_map.city_coords[city_a]
-            x2, y2 = simulation.trade_map.city_coords[city_b]
-            
-            # 根据航线状态调整线条样式
-            danger_level = conditions.get('危险度', 0)
-            sea_condition = conditions.get('海况', 0)
-            
-            line_width = 1 + (1 - danger_level) * 2  # 危险程度越高，线越细
-            
-            # 根据海况选择线条样式
-            if sea_condition > 0.6:  # 风暴频发
-                line_style = ':'  # 暴风雨用点线
-                color = 'blue'
-            elif sea_condition > 0.4:  # 波涛汹涌
-                line_style = '--'  # 雾用虚线
-                color = 'gray'
-            elif sea_condition < 0.2:  # 海面平静
-                line_style = '-'  # 好天气用实线
-                color = 'green'
-            else:
-                line_style = '-'
-                color = 'black'
-            
-            plt.plot([x1, x2], [y1, y2], linestyle=line_style, 
-                     linewidth=line_width, color=color, alpha=0.5)
-            
-            # 添加距离标记
-            distance = simulation.trade_map.get_distance(city_a, city_b)
-            mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
-            plt.text(mid_x, mid_y, f"{distance:.1f}", fontsize=8, 
-                     ha='center', va='center', bbox=dict(facecolor='white', alpha=0.7))
+    for x1, y1, x2, y2, danger_level, sea_condition, distance in routes:
+        # 根据航线状态调整线条样式
+        line_width = 1 + (1 - danger_level) * 2  # 危险程度越高，线越细
+        
+        # 根据海况选择线条样式
+        if sea_condition > 0.6:  # 风暴频发
+            line_style = ':'  # 暴风雨用点线
+            color = 'blue'
+        elif sea_condition > 0.4:  # 波涛汹涌
+            line_style = '--'  # 雾用虚线
+            color = 'gray'
+        elif sea_condition < 0.2:  # 海面平静
+            line_style = '-'  # 好天气用实线
+            color = 'green'
+        else:
+            line_style = '-'
+            color = 'black'
+        
+        plt.plot([x1, x2], [y1, y2], linestyle=line_style, 
+                 linewidth=line_width, color=color, alpha=0.5)
+        
+        # 添加距离标记
+        mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
+        plt.text(mid_x, mid_y, f"{distance:.1f}", fontsize=8, 
+                 ha='center', va='center', bbox=dict(facecolor='white', alpha=0.7))
     
     plt.title("贸易地图")
     plt.axis('equal')  # 保持比例
@@ -211,30 +234,54 @@ def plot_map(simulation):
     plt.plot([], [], color='gray', linestyle='--', label='大雾')
     plt.legend(loc='best')
 
-def plot_currency_history(simulation):
-    """绘制货币系统历史数据"""
-    # 绘制货币供应量历史
+def plot_map(simulation):
+    """绘制贸易地图"""
+    draw_trade_map(**trade_map_data(simulation))
+
+def currency_supply_data(simulation) -> dict:
+    """货币供应量历史图的数据"""
+    return {"history": np.asarray(simulation.currency_supply_history, dtype=float)}
+
+def draw_currency_supply(history: np.ndarray):
+    """绘制货币供应量历史"""
     plt.figure(figsize=(10, 6))
-    plt.plot(simulation.currency_supply_history)
+    plt.plot(history)
     plt.title("货币供应量历史")
     plt.xlabel("天数")
     plt.ylabel("供应量")
     plt.grid(True)
-    
-    # 绘制全局通货膨胀率历史
+
+def global_inflation_data(simulation) -> dict:
+    """全局通货膨胀率历史图的数据"""
+    return {"history": np.asarray(simulation.global_inflation_history, dtype=float)}
+
+def draw_global_inflation(history: np.ndarray):
+    """绘制全局通货膨胀率历史"""
     plt.figure(figsize=(10, 6))
-    plt.plot(simulation.global_inflation_history)
+    plt.plot(history)
     plt.title("全局通货膨胀率历史")
     plt.xlabel("天数")
     plt.ylabel("通货膨胀率")
     plt.grid(True)
-    
-    # 绘制各城市货币价值历史
+
+def city_currency_data(simulation) -> dict:
+    """各城市货币价值图的数据"""
+    return {"series": {city_name: np.asarray(city.currency_value_history, dtype=float)
+                       for city_name, city in simulation.cities.items()}}
+
+def draw_city_currency(series: dict):
+    """绘制各城市货币价值历史"""
     plt.figure(figsize=(12, 6))
-    for city_name, city in simulation.cities.items():
-        plt.plot(city.currency_value_history, label=city_name)
+    for city_name, history in series.items():
+        plt.plot(history, label=city_name)
     plt.title("各城市货币价值变化")
     plt.xlabel("天数")
     plt.ylabel("货币价值(相对标准)")
     plt.legend()
-    plt.grid(True) 
\ No newline at end of file
+    plt.grid(True)
+
+def plot_currency_history(simulation):
+    """绘制货币系统历史数据（货币供应量、全局通货膨胀率、各城市货币价值三张图）"""
+    draw_currency_supply(**currency_supply_data(simulation))
+    draw_global_inflation(**global_inflation_data(simulation))
+    draw_city_currency(**city_currency_data(simulation))
@@ -0,0 +1,200 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class SpatialGrid:
+    """
+    均匀网格空间索引
+
+    把平面划分为边长相同的方格，点按所在方格编号排序保存。
+    半径查询只检查与查询圆相交的方格，k近邻查询从所在方格向外逐圈扩展，
+    在点分布大致均匀时单次查询的期望代价与总点数无关。
+    """
+
+    def __init__(self, coords: np.ndarray, cell_size: Optional[float] = None, points_per_cell: float = 2.0):
+        """
+        :param coords: 点坐标 (n, 2)
+        :param cell_size: 方格边长，默认使每格平均约有 points_per_cell 个点
+        """
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        n = len(self.coords)
+        self.origin = self.coords.min(axis=0) if n else np.zeros(2)
+        extent = (self.coords.max(axis=0) - self.origin) if n else np.ones(2)
+        if cell_size is None:
+            area = max(float(extent[0] * extent[1]), 1e-12)
+            cell_size = np.sqrt(area * points_per_cell / max(n, 1)) or 1.0
+        self.cell_size = float(cell_size)
+        self.shape = (np.floor(extent / self.cell_size).astype(np.int64) + 1) if n else np.ones(2, dtype=np.int64)
+
+        cells = self._cells(self.coords)
+        keys = cells[:, 0] * self.shape[1] + cells[:, 1]
+        self.order = np.argsort(keys, kind='stable')
+        self._keys = keys[self.order]
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        cells = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.shape - 1)
+
+    def _gather(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """方格范围 [lo, hi]（含）内所有点的编号"""
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, self.shape - 1)
+        if np.any(hi < lo):
+            return np.zeros(0, dtype=np.int64)
+        # 每一列方格在排序后的数组中是连续的一段
+        rows = np.arange(lo[0], hi[0] + 1)
+        starts = np.searchsorted(self._keys, rows * self.shape[1] + lo[1], side='left')
+        ends = np.searchsorted(self._keys, rows * self.shape[1] + hi[1], side='right')
+        if len(starts) == 1:
+            return self.order[starts[0]:ends[0]]
+        return np.concatenate([self.order[s:e] for s, e in zip(starts, ends)])
+
+    def radius(self, point, r: float) -> np.ndarray:
+        """距离 point 不超过 r 的点编号（按距离从近到远）"""
+        point = np.asarray(point, dtype=float)
+        candidates = self._gather(self._cells(point - r), self._cells(point + r))
+        d2 = ((self.coords[candidates] - point) ** 2).sum(axis=1)
+        inside = d2 <= r * r
+        candidates, d2 = candidates[inside], d2[inside]
+        return candidates[np.argsort(d2, kind='stable')]
+
+    def knn(self, point, k: int, exclude: int = -1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        距离 point 最近的 k 个点
+        :param exclude: 排除的点编号（如查询点本身）
+        :return: (点编号, 距离)，按距离从近到远
+        """
+        point = np.asarray(point, dtype=float)
+        n = len(self.coords) - (1 if 0 <= exclude < len(self.coords) else 0)
+        k = min(k, n)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        center = self._cells(point)
+        ring = 0
+        while True:
+            candidates = self._gather(center - ring, center + ring)
+            if exclude >= 0:
+                candidates = candidates[candidates != exclude]
+            covers_all = np.all(center - ring <= 0) and np.all(center + ring >= self.shape - 1)
+            if len(candidates) >= k:
+                d2 = ((self.coords[candidates] - point) ** 2).sum(axis=1)
+                kth = np.partition(d2, k - 1)[k - 1]
+                # 已检查区域之外的点到查询点的距离不小于查询点到区域边界的距离
+                lo_edge = self.origin + (center - ring) * self.cell_size
+                hi_edge = self.origin + (center + ring + 1) * self.cell_size
+                margin = max(0.0, min((point - lo_edge).min(), (hi_edge - point).min()))
+                if covers_all or kth <= margin * margin:
+                    nearest = np.argsort(d2, kind='stable')[:k]
+                    return candidates[nearest], np.sqrt(d2[nearest])
+            elif covers_all:
+                return np.zeros(0, dtype=np.int64), np.zeros(0)
+            ring += 1
+
+    def knn_graph(self, k: int, symmetric: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k近邻图：每个点连向最近的 k 个点
+        :param symmetric: 是否补上反方向的边（任一方是另一方的近邻即相连）
+        :return: (起点编号, 终点编号)
+        """
+        n = len(self.coords)
+        k = min(k, n - 1)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # 方格太小时按方格分批的开销占主导，改用每格约 2k 个点的网格
+        grid = self
+        if n / (self.shape[0] * self.shape[1]) < k:
+            grid = SpatialGrid(self.coords, points_per_cell=2 * k)
+        src, dst = grid._knn_pairs(k)
+        if symmetric:
+            keys = np.unique(np.concatenate([src * n + dst, dst * n + src]))
+            src, dst = keys // n, keys % n
+        return src, dst
+
+    def _knn_pairs(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """按方格分批求每个点的 k 个近邻（k 小于点数）"""
+        src, dst = [], []
+        n = len(self.coords)
+        # 同一方格内的点一起查询：候选为周围若干圈方格中的点
+        bounds = np.flatnonzero(np.append(True, self._keys[1:] != self._keys[:-1]))
+        # 初始圈数：使候选区域平均约有 4k 个点，大多数点无需再扩大范围
+        points_per_cell = n / (self.shape[0] * self.shape[1])
+        first_ring = max(1, int(np.ceil((np.sqrt(4 * k / max(points_per_cell, 1e-12)) - 1) / 2)))
+        for start, end in zip(bounds, np.append(bounds[1:], n)):
+            members = self.order[start:end]
+            center = self._cells(self.coords[members[0]])
+            ring = first_ring
+            while True:
+                candidates = self._gather(center - ring, center + ring)
+                covers_all = np.all(center - ring <= 0) and np.all(center + ring >= self.shape - 1)
+                if len(candidates) > k or covers_all:
+                    break
+                ring += 1
+            points = self.coords[members]
+            d2 = ((points[:, None, :] - self.coords[candidates][None, :, :]) ** 2).sum(axis=2)
+            d2[members[:, None] == candidates[None, :]] = np.inf
+            nearest = np.argsort(d2, axis=1, kind='stable')[:, :k]
+            kth = np.take_along_axis(d2, nearest[:, -1:], axis=1)[:, 0]
+            lo_edge = self.origin + (center - ring) * self.cell_size
+            hi_edge = self.origin + (center + ring + 1) * self.cell_size
+            margin = np.minimum((points - lo_edge).min(axis=1), (hi_edge - points).min(axis=1))
+            exact = covers_all | (kth <= margin * margin)
+            src.append(np.repeat(members[exact], k))
+            dst.append(candidates[nearest[exact]].ravel())
+            # 边界附近的点单独扩大范围查询
+            for i in members[~exact].tolist():
+                neighbors, _ = self.knn(self.coords[i], k, exclude=i)
+                src.append(np.full(len(neighbors), i, dtype=np.int64))
+                dst.append(neighbors)
+        return np.concatenate(src), np.concatenate(dst)
+
+    def connect(self, src: np.ndarray, dst: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        补上使图连通的边（k近邻图在点成簇分布时常常不连通）：
+        在更大的近邻图中按距离从短到长选取连接不同分量的边（Kruskal），
+        候选边不足以连通时把近邻数加倍，直到只剩一个分量
+        :return: 加上新边（双向）后的 (起点编号, 终点编号)，原图已连通时原样返回
+        """
+        n = len(self.coords)
+        parent = _components(n, src, dst).tolist()
+        components = len(set(parent))
+        extra = []
+        k = 8
+        while components > 1:
+            a, b = self.knn_graph(k, symmetric=False)
+            d2 = ((self.coords[a] - self.coords[b]) ** 2).sum(axis=1)
+            for e in np.argsort(d2, kind='stable').tolist():
+                i, j = int(a[e]), int(b[e])
+                ri, rj = _find(parent, i), _find(parent, j)
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+                    extra.extend(((i, j), (j, i)))
+                    components -= 1
+                    if components == 1:
+                        break
+            k *= 2
+        if not extra:
+            return src, dst
+        extra = np.array(extra, dtype=np.int64)
+        return np.concatenate([src, extra[:, 0]]), np.concatenate([dst, extra[:, 1]])
+
+
+def _find(parent: list, i: int) -> int:
+    """并查集查找（路径减半）"""
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _components(n: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """无向图的连通分量（并查集），返回每个点所在分量中编号最小的点"""
+    parent = list(range(n))
+    for a, b in zip(src.tolist(), dst.tolist()):
+        ra, rb = _find(parent, a), _find(parent, b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([_find(parent, i) for i in range(n)], dtype=np.int64)
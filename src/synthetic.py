@@ -0,0 +1,84 @@
+import argparse
+import math
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .city import City
+from .ship import Ship
+from .scenario import compile_scenario, write_scenario
+
+
+def synthetic_scenario(num_cities: int, num_ships: int, num_goods: int, seed: int = 0,
+                       coords: bool = True, production_share: float = 0.2,
+                       consumption_share: float = 0.3) -> Dict:
+    """
+    按规模生成随机场景数据（与场景文件的结构相同），可以有成千上万个港口和商品
+    城市的基础价格服从对数正态分布，每个城市生产、消费一部分商品；
+    船只的容量和速度在示例场景的范围内随机选取
+    :param seed: 随机种子，相同参数和种子生成相同的场景
+    :param coords: 是否生成城市坐标（港口均匀分布在与城市数相称的正方形海域中）
+    :param production_share: 每个城市生产的商品比例
+    :param consumption_share: 每个城市消费的商品比例
+    """
+    rng = np.random.default_rng(seed)
+    goods = [f"商品{i}" for i in range(num_goods)]
+    reference = rng.lognormal(mean=math.log(80), sigma=1.0, size=num_goods)
+
+    cities = []
+    for i in range(num_cities):
+        prices = np.maximum(1.0, reference * rng.uniform(0.7, 1.3, num_goods))
+        produced = rng.random(num_goods) < production_share
+        consumed = rng.random(num_goods) < consumption_share
+        cities.append({
+            "name": f"城市{i}",
+            "base_prices": dict(zip(goods, prices.tolist())),
+            "production": {good: amount for good, amount, keep in
+                           zip(goods, rng.uniform(10, 200, num_goods).tolist(), produced) if keep},
+            "consumption": {good: amount for good, amount, keep in
+                            zip(goods, rng.uniform(5, 180, num_goods).tolist(), consumed) if keep},
+        })
+    if coords:
+        # 坐标使用单独的随机数流，是否生成坐标不影响其他数据
+        side = 100 * math.sqrt(max(num_cities, 1))
+        for city, (x, y) in zip(cities, np.random.default_rng([seed, 1]).uniform(0, side, (num_cities, 2)).tolist()):
+            city["x"], city["y"] = x, y
+
+    capacities = rng.integers(10, 26, num_ships) * 10
+    speeds = rng.integers(1, 6, num_ships)
+    # 船名以"号"结尾的偏好低价，其余偏好高质量，两种各占一半
+    ships = [{"name": f"商船{i}" + ("号" if i % 2 == 0 else ""), "capacity": int(capacity), "speed": int(speed)}
+             for i, (capacity, speed) in enumerate(zip(capacities, speeds))]
+    return {"name": f"synthetic-{num_cities}x{num_goods}x{num_ships}-{seed}", "goods": goods,
+            "cities": cities, "ships": ships}
+
+
+def synthetic_world(num_cities: int, num_ships: int, num_goods: int, seed: int = 0,
+                    vectorized: bool = False) -> Tuple[List[City], List[Ship]]:
+    """
+    按规模生成一个随机世界，用于基准测试和压力测试（不带坐标，由模拟自动布局）
+    会用 seed 重置全局 random（城市在创建时用它选择特产）
+    :param vectorized: 城市是否使用数组市场引擎
+    :return: (城市列表, 船只列表)
+    """
+    scenario = compile_scenario(synthetic_scenario(num_cities, num_ships, num_goods, seed, coords=False))
+    random.seed(seed)
+    return scenario.build(vectorized)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成随机场景文件")
+    parser.add_argument("--cities", type=int, default=1000, help="港口数")
+    parser.add_argument("--ships", type=int, default=200, help="船只数")
+    parser.add_argument("--goods", type=int, default=500, help="商品数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--no-coords", action="store_true", help="不生成坐标，由模拟自动布局")
+    parser.add_argument("-o", "--output", required=True, help="输出的 JSON 场景文件")
+    args = parser.parse_args(argv)
+    write_scenario(synthetic_scenario(args.cities, args.ships, args.goods, args.seed, coords=not args.no_coords),
+                   args.output)
+
+
+if __name__ == "__main__":
+    main()
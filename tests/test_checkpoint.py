@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+from src.simulation.core import TradeSimulation
+from src.synthetic import synthetic_world
+
+
+def _simulation() -> TradeSimulation:
+    cities, ships = synthetic_world(6, 8, 6, seed=2)
+    return TradeSimulation(cities, ships, seed=2)
+
+
+def _state(simulation: TradeSimulation):
+    return ([(ship.gold, ship.current_city.name if ship.current_city else None, ship.days_in_transit)
+             for ship in simulation.ships.values()],
+            [dict(city.current_prices) for city in simulation.cities.values()],
+            len(simulation.event_log), len(simulation.ledger))
+
+
+def test_event_driven_resume_matches_uninterrupted_run():
+    expected = _simulation()
+    expected.run_simulation(60, event_driven=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sim.ckpt")
+        chunked = _simulation()
+        chunked.run_simulation(60, event_driven=True, checkpoint_every=25, checkpoint_path=path)
+        assert _state(chunked) == _state(expected)
+
+        first = _simulation()
+        first.run_simulation(30, event_driven=True)
+        first.save_checkpoint(path)
+        restored = TradeSimulation.load_checkpoint(path)
+        restored.resume(30, event_driven=True)
+        assert _state(restored) == _state(expected)
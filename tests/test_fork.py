@@ -0,0 +1,41 @@
+from src.simulation.core import TradeSimulation
+from src.synthetic import synthetic_world
+
+
+def _simulation(vectorized: bool = False) -> TradeSimulation:
+    cities, ships = synthetic_world(5, 4, 6, seed=1, vectorized=vectorized)
+    simulation = TradeSimulation(cities, ships, seed=1)
+    simulation.run_simulation(5)
+    return simulation
+
+
+def test_branch_city_settings_do_not_leak_into_parent():
+    for vectorized in (False, True):
+        parent = _simulation(vectorized)
+        city = parent.cities["城市1"]
+        base_prices, production, consumption = dict(city.base_prices), dict(city.production), dict(city.consumption)
+
+        branch = parent.fork()
+        other = parent.fork()
+        changed = branch.cities["城市1"]
+        changed.production.clear()
+        changed.consumption["商品0"] = 12345.0
+        changed.base_prices["商品0"] = 9999.0
+
+        for untouched in (parent, other):
+            assert untouched.cities["城市1"].base_prices == base_prices
+            assert untouched.cities["城市1"].production == production
+            assert untouched.cities["城市1"].consumption == consumption
+
+
+def test_branch_run_leaves_parent_state_untouched():
+    parent = _simulation()
+    gold = [ship.gold for ship in parent.ships.values()]
+    day = parent.day
+
+    branch = parent.fork()
+    branch.cities["城市1"].production.clear()
+    branch.resume(5)
+
+    assert parent.day == day
+    assert [ship.gold for ship in parent.ships.values()] == gold
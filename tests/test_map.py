@@ -0,0 +1,55 @@
+import math
+
+import numpy as np
+
+from src.map import TradeMap
+from src.simulation.core import TradeSimulation
+from src.synthetic import synthetic_world
+
+
+def test_knn_routes_connect_every_port():
+    for seed in range(3):
+        cities, ships = synthetic_world(30, 10, 5, seed=seed)
+        simulation = TradeSimulation(cities, ships, seed=seed, route_neighbors=1)
+        trade_map = simulation.trade_map
+        distance, _ = trade_map.shortest_path_tree(trade_map.city_names[0], metric='distance')
+        assert np.isfinite(distance).all()
+
+        simulation.run_simulation(120)
+        assert all(math.isfinite(ship.gold) for ship in simulation.ships.values())
+
+
+def test_unreachable_destination_is_rejected():
+    cities, ships = synthetic_world(6, 6, 5, seed=4)
+    trade_map = TradeMap()
+    for i, city in enumerate(cities):
+        trade_map.add_city(city.name, float(i % 3) * 10, float(i // 3) * 100)
+    for a, b in ((0, 1), (1, 2), (3, 4), (4, 5)):
+        trade_map.add_route(cities[a].name, cities[b].name)
+    simulation = TradeSimulation(cities, ships, trade_map=trade_map, seed=4)
+    names = [city.name for city in cities]
+    assert trade_map.reachable_cities(names[0], names) == names[:3]
+
+    ship = next(iter(simulation.ships.values()))
+    gold = ship.gold
+    assert not ship.set_route(cities[0], cities[5], trade_map)
+    assert ship.gold == gold and not ship.in_transit
+
+    simulation.run_simulation(60)
+    assert all(math.isfinite(ship.gold) and math.isfinite(ship.travel_time)
+               for ship in simulation.ships.values())
+
+
+def test_event_driven_ships_keep_sailing_on_disconnected_map():
+    cities, ships = synthetic_world(6, 6, 5, seed=4)
+    trade_map = TradeMap()
+    for i, city in enumerate(cities):
+        trade_map.add_city(city.name, float(i % 3) * 10, float(i // 3) * 100)
+    for a, b in ((0, 1), (1, 2), (3, 4), (4, 5)):
+        trade_map.add_route(cities[a].name, cities[b].name)
+    simulation = TradeSimulation(cities, ships, trade_map=trade_map, seed=4)
+    simulation.run_simulation(60, event_driven=True)
+    for name, (departed, arrival) in simulation._scheduler._voyages.items():
+        assert departed < arrival
+        assert simulation.ships[name].in_transit
+    assert all(math.isfinite(ship.travel_time) for ship in simulation.ships.values())
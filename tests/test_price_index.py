@@ -0,0 +1,17 @@
+import numpy as np
+
+from src.simulation.price_index import PriceIndex
+from src.synthetic import synthetic_world
+
+
+def test_refresh_breaks_ties_by_lowest_row():
+    cities, _ = synthetic_world(40, 6, 1, seed=5)
+    for i, city in enumerate(cities):
+        for good in city.current_prices:
+            city.current_prices[good] = float(i % 3)
+    index = PriceIndex(cities, k=3)
+    index._refresh()
+    for col in range(len(index.goods)):
+        for ranks, sign in ((index.top, -1.0), (index.bottom, 1.0)):
+            keys = np.where(index.listed[:, col], sign * index.prices[:, col], np.inf)
+            assert ranks[col] == np.argsort(keys, kind='stable')[:index.k].tolist()
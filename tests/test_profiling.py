@@ -0,0 +1,15 @@
+from src.simulation.core import TradeSimulation
+from src.synthetic import synthetic_world
+
+
+def test_batch_trading_records_calls_and_decision_latency():
+    cities, ships = synthetic_world(5, 6, 6, seed=1)
+    simulation = TradeSimulation(cities, ships, seed=1, batch_trading=True)
+    profiler = simulation.enable_profiling()
+    simulation.run_simulation(20)
+    simulation.disable_profiling()
+    report = profiler.report()
+    assert report["calls"].get("trading._find_best_trade", 0) > 0
+    assert report["decisions"]["count"] > 0
+    assert report["decisions"]["ships"] >= report["decisions"]["count"]
+    assert "trade_docked" not in simulation.__dict__
@@ -0,0 +1,20 @@
+import zlib
+
+import numpy as np
+
+from src.rng import CITY_JITTER, RandomStreams
+from src.simulation.core import TradeSimulation
+from src.synthetic import synthetic_world
+
+
+def test_names_with_equal_crc32_get_distinct_streams():
+    assert zlib.crc32(b"plumless") == zlib.crc32(b"buckeroo")
+    streams = RandomStreams(1)
+    assert not np.array_equal(streams.generator("city", "plumless").random(4),
+                              streams.generator("city", "buckeroo").random(4))
+
+
+def test_world_market_city_streams_skip_price_jitter():
+    cities, ships = synthetic_world(4, 3, 5, seed=1)
+    simulation = TradeSimulation(cities, ships, seed=1, world_market=True)
+    assert all(city.draws.width == CITY_JITTER for city in simulation.cities.values())
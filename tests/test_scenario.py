@@ -0,0 +1,34 @@
+import copy
+
+from src.scenario import read_scenario, validate_scenario
+
+
+def _rejects(data, where: str):
+    try:
+        validate_scenario(data)
+    except ValueError as error:
+        assert where in str(error), error
+    else:
+        raise AssertionError(f"{where} 未被拒绝")
+
+
+def test_validate_scenario_rejects_unknown_keys_goods_and_event_values():
+    base = read_scenario("scenarios/mediterranean.toml")
+    validate_scenario(base)
+
+    cases = [
+        (lambda data: data.update(citys=[]), "场景: 未知字段 citys"),
+        (lambda data: data["cities"][0].update(base_price={}), ".cities[0]"),
+        (lambda data: data["ships"][1].update(sped=3), ".ships[1]"),
+        (lambda data: data["cities"][1]["production"].update(玻璃制品=5), ".cities[1].production"),
+        (lambda data: data["cities"][2]["consumption"].update(木材=5), ".cities[2].consumption"),
+        (lambda data: data["cities"][1]["specialties"].append("玻璃制品"), ".cities[1].specialties"),
+        (lambda data: data["events"]["weather"][0].update(speed_modifier="0.5"), ".events.weather[0].speed_modifier"),
+        (lambda data: data["events"]["weather"][0].update(duration=2.5), ".events.weather[0].duration"),
+        (lambda data: data["events"]["pirate"][0].update(steal_percent=30), ".events.pirate[0].steal_percent"),
+        (lambda data: data["events"]["city"][0].update(price_modifier=-1), ".events.city[0].price_modifier"),
+    ]
+    for change, where in cases:
+        data = copy.deepcopy(base)
+        change(data)
+        _rejects(data, where)
@@ -0,0 +1,12 @@
+from src.simulation.core import TradeSimulation
+from src.synthetic import synthetic_world
+
+
+def test_planner_strategy_with_batch_trading():
+    # 装货规划每艘船可能下多笔买单，撮合时要按买单所属的船只取船
+    for event_driven in (False, True):
+        cities, ships = synthetic_world(4, 12, 8, seed=2)
+        simulation = TradeSimulation(cities, ships, seed=2, strategy="planner", batch_trading=True)
+        simulation.run_simulation(40, event_driven=event_driven)
+        assert simulation.day == 40
+        assert any(len(ship.gold_history) > 1 for ship in simulation.ships.values())
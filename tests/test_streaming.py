@@ -0,0 +1,37 @@
+from src.simulation.core import TradeSimulation
+from src.simulation.event_log import EVENT_MESSAGE
+from src.simulation.streaming import Sink
+from src.simulation.strategy import GreedyStrategy
+from src.synthetic import synthetic_world
+
+
+class _ListSink(Sink):
+    def __init__(self):
+        self.days = []
+
+    def write(self, batch):
+        self.days.extend(batch)
+
+
+class _LoggingStrategy(GreedyStrategy):
+    """每次决策都记一条事件，第0天初始化船只时也会记录"""
+
+    def decide(self, view):
+        view.simulation.event_log.record(EVENT_MESSAGE, view.simulation.day, value=len(view.ships))
+        return super().decide(view)
+
+
+def _simulation() -> TradeSimulation:
+    cities, ships = synthetic_world(5, 4, 6, seed=1)
+    return TradeSimulation(cities, ships, seed=1, strategy=_LoggingStrategy())
+
+
+def test_stream_includes_events_from_ship_initialization():
+    simulation = _simulation()
+    sink = _ListSink()
+    simulation.run_simulation(3, sinks=[sink])
+    assert sum(len(delta.events) for delta in sink.days) == len(simulation.event_log)
+
+    simulation = _simulation()
+    events = sum(len(delta.events) for delta in simulation.iter_days(3))
+    assert events == len(simulation.event_log)
@@ -0,0 +1,10 @@
+from src.simulation.core import TradeSimulation
+from src.synthetic import synthetic_world
+
+
+def test_empty_destination_radius_falls_back_to_nearest_city():
+    for options in ({}, {"strategy": "greedy"}):
+        cities, ships = synthetic_world(6, 4, 5, seed=3)
+        simulation = TradeSimulation(cities, ships, seed=3, destination_radius=1e-9, **options)
+        simulation.run_simulation(10)
+        assert any(ship.in_transit or len(ship.gold_history) > 1 for ship in simulation.ships.values())